@@ -0,0 +1,274 @@
+"""
+Microbenchmarks for ingestion and retrieval scaling.
+
+Synthetic corpora are built on the fakes of `tests/conftest.py`: every
+document is a `FakePdf` whose pages hold exactly one chunk of generated text,
+and embeddings come from a `FakeEmbedder` that returns seeded random vectors
+of a realistic dimension. Each corpus size runs in a fresh process, so the
+reported peak RSS belongs to that size only.
+
+Measured per corpus size:
+- ingestion: cold start (extract, chunk, embed, write the index), in chunks/s
+- cache load: warm start from the persisted index
+- retrieval: per-query latency percentiles (p50/p95/p99)
+- peak resident memory of the process
+
+Usage:
+    python -m benchmarks.bench_retriever --sizes 1000,10000,100000 --output results.json
+    python -m benchmarks.bench_retriever --baseline results.json
+
+With --baseline, timings and memory are compared against a previous results
+file and the process exits with status 1 if any metric regressed by more than
+--tolerance.
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+import numpy as np
+from rag.retriever import Retriever
+from tests.conftest import FakeEmbedder, FakePdf
+
+CHUNK_SIZE = 500
+PAGES_PER_DOC = 1000
+VOCABULARY = np.array([f"term{i}" for i in range(5000)])
+
+# Metrics compared against a baseline, where higher values are regressions
+COMPARED_METRICS = [
+    ("ingest_seconds",),
+    ("load_seconds",),
+    ("query_ms", "p50"),
+    ("query_ms", "p95"),
+    ("query_ms", "p99"),
+    ("peak_rss_mb",),
+]
+
+
+class SyntheticEmbedder(FakeEmbedder):
+    """
+    FakeEmbedder returning seeded random unit-scale vectors of `dim` dimensions.
+    Batches are generated with one vectorized call, so embedding is not the
+    bottleneck of the benchmark.
+    """
+    def __init__(self, dim=768):
+        self.dim = dim
+        self.model = f"synthetic-{dim}"
+
+    def embed(self, text: str):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dim, dtype=np.float32)
+
+    def embed_many(self, texts, batch_size=None):
+        seed = zlib.crc32("".join(texts[:1]).encode("utf-8")) + len(texts)
+        return np.random.default_rng(seed).standard_normal((len(texts), self.dim), dtype=np.float32)
+
+
+def synthetic_pdf_reader(path):
+    """
+    Simulate PdfReader(path) for a synthetic document written by `make_corpus`.
+    The file holds the number of pages; page texts are derived from the path.
+    """
+    n_pages = int(Path(path).read_text(encoding="utf-8").split()[1])
+    rng = np.random.default_rng(zlib.crc32(str(path).encode("utf-8")))
+    pages = []
+    for _ in range(n_pages):
+        text = " ".join(VOCABULARY[rng.integers(0, len(VOCABULARY), CHUNK_SIZE // 8)])
+        pages.append(text[:CHUNK_SIZE].ljust(CHUNK_SIZE))
+    return FakePdf(pages)
+
+
+def make_corpus(directory: Path, n_chunks: int):
+    """
+    Write the placeholder files of a corpus of `n_chunks` one-chunk pages.
+
+    :return: Paths of the documents.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for doc, start in enumerate(range(0, n_chunks, PAGES_PER_DOC)):
+        path = directory / f"doc{doc}.pdf"
+        path.write_text(f"pages {min(PAGES_PER_DOC, n_chunks - start)} doc{doc}", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def percentiles(samples_ms) -> dict:
+    """
+    :return: p50/p95/p99 of latency samples in milliseconds.
+    """
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+def run_benchmark(n_chunks: int, dim: int = 768, n_queries: int = 200, top_k: int = 3,
+                  **retriever_kwargs) -> dict:
+    """
+    Benchmark ingestion, cache loading and retrieval on one synthetic corpus.
+
+    :param n_chunks: Number of chunks in the corpus.
+    :param dim: Embedding dimension.
+    :param n_queries: Number of timed queries.
+    :param top_k: Number of results per query.
+    :param retriever_kwargs: Extra `Retriever` options, e.g. ann or retrieval.
+    :return: Measurements of this corpus size.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        kwargs = dict(
+            embedder=SyntheticEmbedder(dim),
+            pdf_reader=synthetic_pdf_reader,
+            docs_paths=make_corpus(tmp / "docs", n_chunks),
+            chunk_size=CHUNK_SIZE,
+            overlap_ratio=0.0,
+            embed_batch_size=1024,
+            storage_dir=str(tmp / "storage"),
+            **retriever_kwargs,
+        )
+
+        start = time.perf_counter()
+        Retriever(**kwargs)
+        ingest_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        retriever = Retriever(**kwargs)
+        load_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        questions = [
+            " ".join(VOCABULARY[rng.integers(0, len(VOCABULARY), 8)]) for _ in range(n_queries)
+        ]
+        retriever.retrieve(questions[0], top_k)  # warm up
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            retriever.retrieve(question, top_k)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        return {
+            "chunks": len(retriever.documents),
+            "ingest_seconds": round(ingest_seconds, 4),
+            "ingest_chunks_per_second": round(n_chunks / ingest_seconds, 1),
+            "load_seconds": round(load_seconds, 4),
+            "query_ms": percentiles(samples),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+def run_suite(sizes, **options) -> dict:
+    """
+    Run `run_benchmark` for every corpus size, each in a fresh process.
+
+    :return: Machine-readable results with the environment they were measured in.
+    """
+    results = []
+    for n_chunks in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            result = pool.submit(run_benchmark, n_chunks, **options).result()
+        print(json.dumps(result), file=sys.stderr)
+        results.append(result)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "options": options,
+        "results": results,
+    }
+
+
+def compare_to_baseline(current: dict, baseline: dict, tolerance: float = 0.1):
+    """
+    Compare results with a baseline measured on the same corpus sizes.
+
+    :param current: Results of `run_suite`.
+    :param baseline: Previous results of `run_suite`.
+    :param tolerance: Relative increase tolerated before a metric counts as a regression.
+    :return: A tuple of (comparison rows, regressions), where each row holds the
+             corpus size, metric name, baseline and current value and their ratio.
+    """
+    previous = {r["chunks"]: r for r in baseline["results"]}
+    rows = []
+    regressions = []
+    for result in current["results"]:
+        if result["chunks"] not in previous:
+            continue
+        for path in COMPARED_METRICS:
+            old, new = previous[result["chunks"]], result
+            for key in path:
+                old, new = old[key], new[key]
+            ratio = new / old if old else float("inf")
+            row = {
+                "chunks": result["chunks"],
+                "metric": ".".join(path),
+                "baseline": old,
+                "current": new,
+                "ratio": round(ratio, 3),
+            }
+            rows.append(row)
+            if ratio > 1 + tolerance:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retriever scaling benchmarks")
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000",
+        help="Comma-separated corpus sizes in chunks (up to 1000000)"
+    )
+    parser.add_argument("--dim", default=768, type=int, help="Embedding dimension")
+    parser.add_argument("--queries", default=200, type=int, help="Timed queries per corpus")
+    parser.add_argument("--top_k", default=3, type=int, help="Results per query")
+    parser.add_argument("--ann", choices=["exact", "ivf"], default="exact")
+    parser.add_argument("--retrieval", choices=["dense", "bm25", "hybrid"], default="dense")
+    parser.add_argument("--embedding_dtype", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--output", default=None, help="JSON file for the results (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Results file to compare against")
+    parser.add_argument("--tolerance", default=0.1, type=float,
+                        help="Relative slowdown tolerated before a metric counts as regressed")
+    args = parser.parse_args(argv)
+
+    current = run_suite(
+        [int(size) for size in args.sizes.split(",")],
+        dim=args.dim,
+        n_queries=args.queries,
+        top_k=args.top_k,
+        ann=args.ann,
+        ann_min_chunks=0,
+        retrieval=args.retrieval,
+        embedding_dtype=args.embedding_dtype,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    else:
+        print(json.dumps(current, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare_to_baseline(current, baseline, args.tolerance)
+        for row in rows:
+            flag = "REGRESSION" if row in regressions else ""
+            print(f"{row['chunks']:>9} {row['metric']:<16} {row['baseline']:>12} "
+                  f"-> {row['current']:>12} x{row['ratio']:<7} {flag}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,8 +9,31 @@ The agent:
 - Produces a structured execution log for observability and debugging
 """
 
+import asyncio
 import uuid
 import time
+from contextlib import nullcontext
+from rag.context import estimate_tokens, pack_context
+from rag.metrics import LLM_SECONDS, REQUEST_SECONDS, RETRIEVAL_SECONDS
+from rag.tracing import span
+
+
+def _page_label(metadata) -> str:
+    """
+    Format the page, or page range, of a chunk.
+    """
+    page_end = metadata.get("page_end", metadata["page"])
+    if page_end == metadata["page"]:
+        return str(metadata["page"])
+    return f"{metadata['page']}-{page_end}"
+
+
+def _source_header(source_id, metadata) -> str:
+    """
+    Format the line introducing a passage of the prompt context.
+    """
+    return f"{source_id} File: {metadata['file']}, Page: {_page_label(metadata)}"
+
 
 class Agent:
     """
@@ -23,16 +46,34 @@ class Agent:
     - Citation attachment
     - Execution logging (latency, trace ID, retrieved sources)
     """
-    def __init__(self, retriever, llm):
+    def __init__(self, retriever, llm, allm=None, stream_llm=None, answer_cache=None,
+                 tracer=None, context_tokens=None):
         """
         Initialize the agent with its dependencies.
 
         :param retriever: Component responsible for retrieving relevant documents.
-                          Expected to expose a `retrieve(question, top_k)` method.
+                          Expected to expose a `retrieve(question, top_k)` method,
+                          and optionally an awaitable `aretrieve(question, top_k)`.
         :param llm: Callable language model used to generate the answer from a prompt.
+        :param allm: Optional async callable language model used by `arun`.
+                     When omitted, `arun` runs `llm` in a worker thread.
+        :param stream_llm: Optional callable returning an iterator of response
+                           pieces, used by `run_stream`. When omitted, the
+                           complete `llm` response is streamed as one piece.
+        :param answer_cache: Optional `AnswerCache` consulted after retrieval;
+                             a hit skips the LLM call.
+        :param tracer: Optional `Tracer` recording the spans of every run
+                       under its trace ID.
+        :param context_tokens: Optional token budget of the prompt context.
+                               The least relevant passages are trimmed to fit.
         """
         self.retriever = retriever
         self.llm = llm
+        self.allm = allm
+        self.stream_llm = stream_llm
+        self.answer_cache = answer_cache
+        self.tracer = tracer
+        self.context_tokens = context_tokens
 
     def run(self, question: str, top_k: int = 3):
         """
@@ -52,29 +93,369 @@ class Agent:
         """
         trace_id = str(uuid.uuid4())
 
-        plan = ["retrieve", "draft", "cite"]
-        errors = []
+        with self._trace(trace_id):
+            # Retrieve
+            start_time = time.perf_counter()
+            with span("retrieve", top_k=top_k), RETRIEVAL_SECONDS.time():
+                retrieved = self.retriever.retrieve(question, top_k)
+            retrieve_latency = int((time.perf_counter() - start_time) * 1000)
+
+            # Draft
+            draft_start_time = time.perf_counter()
+            prompt, sources = self._create_prompt(question, retrieved)
+            answer, lookup = self._lookup_answer(question, retrieved)
+            if answer is None:
+                with span("generate"), LLM_SECONDS.time():
+                    answer = self.llm(prompt)
+                self._remember_answer(question, answer, lookup)
+            draft_latency = int((time.perf_counter() - draft_start_time) * 1000)
+
+            # Cite
+            with span("cite"):
+                response = self._add_citations(answer, sources)
+
+            total_time = time.perf_counter() - start_time
+            REQUEST_SECONDS.observe(total_time)
+
+            log = self._build_log(trace_id, question, retrieved, prompt, {
+                "retrieve": retrieve_latency,
+                "draft": draft_latency,
+                "total": int(total_time * 1000)
+            }, lookup)
+
+        return response, log
+
+    def run_stream(self, question: str, top_k: int = 3):
+        """
+        Execute the RAG workflow, streaming the answer as it is generated.
+
+        Retrieval runs before this method returns. The returned iterator yields
+        the answer pieces as the LLM produces them, followed by the citations
+        block; joined together they equal the response of `run`. The returned
+        log is completed once the iterator is exhausted, adding
+        `time_to_first_token` (ms) and `tokens_per_second` to `latency_ms`.
+
+        :param question: User question to be answered.
+        :param top_k: Number of top chunks to retrieve.
+        :return: A tuple of (response_iterator, execution_log).
+        """
+        trace_id = str(uuid.uuid4())
+        trace = self.tracer.start(trace_id) if self.tracer else None
+
+        with self._activate(trace):
+            # Retrieve
+            start_time = time.perf_counter()
+            with span("retrieve", top_k=top_k), RETRIEVAL_SECONDS.time():
+                retrieved = self.retriever.retrieve(question, top_k)
+            retrieve_latency = int((time.perf_counter() - start_time) * 1000)
+
+            prompt, sources = self._create_prompt(question, retrieved)
+            cached_answer, lookup = self._lookup_answer(question, retrieved)
+            log = self._build_log(trace_id, question, retrieved, prompt, {
+                "retrieve": retrieve_latency
+            }, lookup)
+
+        def stream():
+            try:
+                with self._activate(trace):
+                    # Draft
+                    draft_start_time = time.perf_counter()
+                    first_token_time = None
+                    n_tokens = 0
+                    started = False  # leading whitespace is dropped, as in `run`
+                    pending = ""  # trailing whitespace is held back until more text arrives
+
+                    if cached_answer is not None:
+                        pieces = iter([cached_answer])
+                    elif self.stream_llm:
+                        pieces = self.stream_llm(prompt)
+                    else:
+                        pieces = iter([self.llm(prompt)])
+
+                    generated = []
+                    with span("generate") as generate_span:
+                        for piece in pieces:
+                            generated.append(piece)
+                            if first_token_time is None:
+                                first_token_time = time.perf_counter()
+                            n_tokens += 1
+
+                            if not started:
+                                piece = piece.lstrip()
+                                if not piece:
+                                    continue
+                                started = True
 
-        # Retrieve
-        start_time = time.time()
-        retrieved = self.retriever.retrieve(question, top_k)
-        retrieve_latency = int((time.time() - start_time) * 1000)
+                            body = piece.rstrip()
+                            if body:
+                                yield pending + body
+                                pending = piece[len(body):]
+                            else:
+                                pending += piece
+                        generate_span.set("pieces", n_tokens)
 
+                    end_time = time.perf_counter()
+                    if cached_answer is None:
+                        LLM_SECONDS.observe(end_time - draft_start_time)
+                        self._remember_answer(question, "".join(generated), lookup)
+                    REQUEST_SECONDS.observe(end_time - start_time)
+
+                    first_token_time = first_token_time or end_time
+                    generation_time = end_time - first_token_time
+                    log["latency_ms"].update({
+                        "draft": int((end_time - draft_start_time) * 1000),
+                        "total": int((end_time - start_time) * 1000),
+                        "time_to_first_token": int((first_token_time - draft_start_time) * 1000),
+                        "tokens_per_second": (
+                            round(n_tokens / generation_time, 2) if generation_time > 0 else None
+                        )
+                    })
+
+                # Cite
+                yield self._citations_block(sources)
+            finally:
+                if trace is not None:
+                    self.tracer.finish(trace)
+
+        return stream(), log
+
+    async def arun(self, question: str, top_k: int = 3):
+        """
+        Asynchronous variant of `run` with the same response and log.
+
+        Retrieval and generation are awaited, so many questions can be answered
+        concurrently on one event loop while waiting on model I/O.
+
+        :param question: User question to be answered.
+        :param top_k: Number of top chunks to retrieve.
+        :return: A tuple of (final_response, execution_log).
+        """
+        trace_id = str(uuid.uuid4())
+
+        with self._trace(trace_id):
+            # Retrieve
+            start_time = time.perf_counter()
+            with span("retrieve", top_k=top_k), RETRIEVAL_SECONDS.time():
+                if hasattr(self.retriever, "aretrieve"):
+                    retrieved = await self.retriever.aretrieve(question, top_k)
+                else:
+                    retrieved = await asyncio.to_thread(self.retriever.retrieve, question, top_k)
+            retrieve_latency = int((time.perf_counter() - start_time) * 1000)
+
+            return await self._agenerate(
+                trace_id, question, retrieved, start_time, retrieve_latency
+            )
+
+    async def _agenerate(self, trace_id, question, retrieved, start_time, retrieve_latency):
+        """
+        Draft and cite the answer of a question whose chunks are already retrieved.
+
+        :return: A tuple of (final_response, execution_log).
+        """
         # Draft
-        draft_start_time = time.time()
+        draft_start_time = time.perf_counter()
         prompt, sources = self._create_prompt(question, retrieved)
-        answer = self.llm(prompt)
-        draft_latency = int((time.time() - draft_start_time) * 1000)
+        answer, lookup = await asyncio.to_thread(self._lookup_answer, question, retrieved)
+        if answer is None:
+            with span("generate"), LLM_SECONDS.time():
+                if self.allm is not None:
+                    answer = await self.allm(prompt)
+                else:
+                    answer = await asyncio.to_thread(self.llm, prompt)
+            self._remember_answer(question, answer, lookup)
+        draft_latency = int((time.perf_counter() - draft_start_time) * 1000)
 
         # Cite
-        response = self._add_citations(answer, sources)
+        with span("cite"):
+            response = self._add_citations(answer, sources)
+
+        total_time = time.perf_counter() - start_time
+        REQUEST_SECONDS.observe(total_time)
+
+        log = self._build_log(trace_id, question, retrieved, prompt, {
+            "retrieve": retrieve_latency,
+            "draft": draft_latency,
+            "total": int(total_time * 1000)
+        }, lookup)
+
+        return response, log
+
+    async def arun_many(self, questions, top_k: int = 3, max_concurrency: int = 4):
+        """
+        Answer many questions concurrently, with at most `max_concurrency`
+        of them in flight at any time.
+
+        Each question gets its own trace ID and latency measurements. A question
+        that fails yields a None response and a log whose `errors` holds the error.
+
+        :param questions: Questions to be answered.
+        :param top_k: Number of top chunks to retrieve per question.
+        :param max_concurrency: Maximum number of questions processed at once.
+        :return: A list of (final_response, execution_log) tuples in input order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded(question):
+            async with semaphore:
+                try:
+                    return await self.arun(question, top_k)
+                except Exception as e:
+                    return self._failed(question, e)
 
-        total_latency = int((time.time() - start_time) * 1000)
+        return await asyncio.gather(*(bounded(q) for q in questions))
 
-        log = {
+    def run_many(self, questions, top_k: int = 3, max_concurrency: int = 4):
+        """
+        Synchronous entry point for `arun_many`.
+        """
+        return asyncio.run(self.arun_many(questions, top_k, max_concurrency))
+
+    async def arun_batch(self, questions, top_k: int = 3, max_concurrency: int = 4):
+        """
+        Answer a batch of questions, retrieving for all of them at once.
+
+        When the retriever exposes `retrieve_many(questions, top_k)`, every
+        question is retrieved in one batched call and only generation runs
+        concurrently, with at most `max_concurrency` LLM calls in flight. The
+        `retrieve` latency of each log is its share of the batched retrieval.
+        Otherwise this is the same as `arun_many`.
+
+        :param questions: Questions to be answered.
+        :param top_k: Number of top chunks to retrieve per question.
+        :param max_concurrency: Maximum number of LLM calls in flight.
+        :return: A list of (final_response, execution_log) tuples in input order.
+        """
+        if not hasattr(self.retriever, "retrieve_many"):
+            return await self.arun_many(questions, top_k, max_concurrency)
+
+        questions = list(questions)
+        start_time = time.perf_counter()
+        try:
+            retrieved_all = await asyncio.to_thread(
+                self.retriever.retrieve_many, questions, top_k
+            )
+        except Exception as e:
+            return [self._failed(question, e) for question in questions]
+        retrieve_share = (time.perf_counter() - start_time) / max(len(questions), 1)
+        retrieve_latency = int(retrieve_share * 1000)
+        for _ in questions:
+            RETRIEVAL_SECONDS.observe(retrieve_share)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded(question, retrieved):
+            async with semaphore:
+                trace_id = str(uuid.uuid4())
+                try:
+                    with self._trace(trace_id):
+                        return await self._agenerate(
+                            trace_id, question, retrieved,
+                            time.perf_counter() - retrieve_share, retrieve_latency
+                        )
+                except Exception as e:
+                    return self._failed(question, e)
+
+        return await asyncio.gather(
+            *(bounded(q, r) for q, r in zip(questions, retrieved_all))
+        )
+
+    def run_batch(self, questions, top_k: int = 3, max_concurrency: int = 4):
+        """
+        Synchronous entry point for `arun_batch`.
+        """
+        return asyncio.run(self.arun_batch(questions, top_k, max_concurrency))
+
+    def _trace(self, trace_id):
+        """
+        Record the enclosed block as one trace when a tracer is configured.
+        """
+        return self.tracer.trace(trace_id) if self.tracer else nullcontext()
+
+    def _activate(self, trace):
+        """
+        Make `trace` active for the enclosed block, if tracing is enabled.
+        """
+        return self.tracer.activate(trace) if trace is not None else nullcontext()
+
+    def _failed(self, question, error):
+        """
+        Build the (None, log) result of a question that could not be answered.
+        """
+        log = self._build_log(str(uuid.uuid4()), question, [], "", {})
+        log["errors"].append(str(error))
+        return None, log
+
+    def _lookup_answer(self, question, retrieved):
+        """
+        Look the question up in the answer cache, if any.
+
+        :param question: User question.
+        :param retrieved: Retrieved chunks with relevance scores.
+        :return: A tuple of (cached answer or None, lookup), where lookup holds
+                 what is needed to store a new answer and report the outcome.
+        """
+        if self.answer_cache is None:
+            return None, None
+
+        with span("answer_cache") as cache_span:
+            answer, lookup = self._lookup_cached_answer(question, retrieved)
+            cache_span.set("outcome", lookup["outcome"])
+        return answer, lookup
+
+    def _lookup_cached_answer(self, question, retrieved):
+        """
+        Answer cache lookup of `_lookup_answer`, without the tracing span.
+        """
+        lookup = {
+            "chunk_ids": [r[0]["metadata"]["chunk_id"] for r in retrieved],
+            "fingerprint": getattr(self.retriever, "corpus_fingerprint", None),
+            "question_vector": None,
+        }
+        if self.answer_cache.similarity_threshold is not None and \
+                hasattr(self.retriever, "embed_question"):
+            lookup["question_vector"] = self.retriever.embed_question(question)
+
+        answer, lookup["outcome"] = self.answer_cache.get(
+            question, lookup["chunk_ids"], lookup["fingerprint"], lookup["question_vector"]
+        )
+        return answer, lookup
+
+    def _remember_answer(self, question, answer, lookup):
+        """
+        Store a freshly generated answer in the answer cache, if any.
+        """
+        if self.answer_cache is None:
+            return
+
+        self.answer_cache.put(
+            question, lookup["chunk_ids"], answer,
+            lookup["fingerprint"], lookup["question_vector"]
+        )
+
+    def _build_log(self, trace_id, question, retrieved, prompt, latency_ms, lookup=None):
+        """
+        Build the structured execution log of one run.
+
+        :param trace_id: Identifier of the run.
+        :param question: User question.
+        :param retrieved: Retrieved chunks with relevance scores.
+        :param prompt: Prompt sent to the LLM.
+        :param latency_ms: Latencies of the executed steps in milliseconds.
+        :param lookup: Answer cache lookup of the run, if any.
+        :return: Execution log dictionary.
+        """
+        # Retrievers without caches simply report none
+        cache_stats = getattr(self.retriever, "cache_stats", dict)()
+        if self.answer_cache is not None:
+            cache_stats["answer"] = {
+                **self.answer_cache.stats(),
+                "outcome": lookup["outcome"] if lookup else None,
+            }
+
+        return {
             "trace_id": trace_id,
             "question": question,
-            "plan": plan,
+            "plan": ["retrieve", "draft", "cite"],
             "retrieval": [
                 {
                     "file": r[0]["metadata"]["file"],
@@ -86,43 +467,55 @@ class Agent:
                 for r in retrieved
             ],
             "draft_tokens": len(prompt.split()),
-            "latency_ms": {
-                "retrieve": retrieve_latency,
-                "draft": draft_latency,
-                "total": total_latency
-            },
-            "errors": errors
+            "latency_ms": latency_ms,
+            "cache": cache_stats,
+            "errors": []
         }
 
-        return response, log
-
     def _create_prompt(self, question, retrieved):
         """
         Construct an LLM prompt using retrieved chunks as context.
 
-        Each retrieved chunk is assigned a source identifier that can
-        later be referenced in the generated citations.
+        Chunks that follow each other in the same file and page are merged
+        into one passage without their repeated text, and passages are added
+        by relevance within the `context_tokens` budget. Each passage is
+        assigned a source identifier that can later be referenced in the
+        generated citations.
 
         :param question: User question.
         :param retrieved: Retrieved chunks with relevance scores.
         :return: A tuple of (prompt, sources), where sources contain
                  citation metadata.
         """
+        with span("build_prompt", chunks=len(retrieved)) as prompt_span:
+            prompt, sources = self._format_prompt(question, retrieved)
+            prompt_span.set("passages", len(sources))
+            prompt_span.set("prompt_tokens", estimate_tokens(prompt))
+            return prompt, sources
+
+    def _format_prompt(self, question, retrieved):
+        """
+        Prompt construction of `_create_prompt`, without the tracing span.
+        """
         context_blocks = []
         sources = []
 
-        for i, (document, score) in enumerate(retrieved):
-            metadata = document["metadata"]
+        passages, _ = pack_context(
+            retrieved,
+            self.context_tokens,
+            overhead_tokens=lambda p: estimate_tokens(_source_header("[00]", p) + "\n\n")
+        )
+
+        for i, passage in enumerate(passages):
             source_id = f"[{i + 1}]"
 
-            context_blocks.append(
-                f"{source_id} File: {metadata['file']}, Page: {metadata['page']}\n{document['text']}"
-            )
+            context_blocks.append(f"{_source_header(source_id, passage)}\n{passage['text']}")
 
             sources.append({
                 "id": source_id,
-                "file": metadata["file"],
-                "page": metadata["page"]
+                "file": passage["file"],
+                "page": passage["page"],
+                "page_end": passage["page_end"]
             })
 
         context = "\n\n".join(context_blocks)
@@ -148,8 +541,19 @@ Question:
         :param sources: List of source metadata collected during retrieval.
         :return: Final answer with formatted citations.
         """
+        return answer.strip() + self._citations_block(sources)
+
+    def _citations_block(self, sources):
+        """
+        Format the citations appended after an answer.
+
+        :param sources: List of source metadata collected during retrieval.
+        :return: Citation block text.
+        """
         citation_lines = "\n\nSources:\n"
         for s in sources:
-            citation_lines += f"{s['id']} {s['file']} (page {s['page']})\n"
+            pages = _page_label(s)
+            label = "pages" if "-" in pages else "page"
+            citation_lines += f"{s['id']} {s['file']} ({label} {pages})\n"
 
-        return answer.strip() + citation_lines
+        return citation_lines
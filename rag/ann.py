@@ -0,0 +1,224 @@
+"""
+Approximate nearest-neighbour search over the normalized embedding matrix.
+
+`IVFIndex` is an inverted-file index: rows are clustered with spherical
+k-means, and a query only scores the rows of the `n_probe` clusters whose
+centroids are closest to it. Raising `n_probe` (or lowering `n_lists`)
+trades speed for recall; `n_probe == n_lists` is equivalent to exact search.
+"""
+
+import json
+import logging
+from pathlib import Path
+import numpy as np
+from rag.metrics import CHUNKS_SCORED
+from rag.scoring import normalize_rows, top_k_indices
+from rag.storage import write_manifest_last
+
+IVF_MANIFEST_FILE = "ivf.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of an L2-normalized float32 matrix.
+
+    The index stores only cluster centroids and, per cluster, the row ids
+    assigned to it; scores are always computed against the original matrix.
+    """
+
+    def __init__(
+            self,
+            n_lists: int | None = None,
+            n_probe: int = 8,
+            max_iter: int = 10,
+            train_size: int = 64,
+            seed: int = 0
+    ):
+        """
+        :param n_lists: Number of clusters. Defaults to sqrt(number of rows).
+        :param n_probe: Number of clusters scanned per query.
+        :param max_iter: Number of k-means iterations.
+        :param train_size: Rows sampled per cluster to train the centroids.
+        :param seed: Random seed used for sampling and initialization.
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.max_iter = max_iter
+        self.train_size = train_size
+        self.seed = seed
+        self.centroids = None
+        self.order = None
+        self.offsets = None
+        self.count = 0
+        self.fingerprint = None
+
+    def build(self, matrix: np.ndarray, block_size: int = 65536):
+        """
+        Cluster the rows of `matrix` and build the inverted lists.
+
+        :param matrix: L2-normalized float32 matrix, one row per chunk.
+        :param block_size: Number of rows assigned to clusters at a time.
+        :return: The index itself.
+        """
+        n = matrix.shape[0]
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        rng = np.random.default_rng(self.seed)
+
+        train_rows = min(n, n_lists * self.train_size)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, train_rows, replace=False))])
+        centroids = sample[rng.choice(train_rows, n_lists, replace=False)].copy()
+
+        for _ in range(self.max_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assignments, minlength=n_lists)
+            nonempty = np.flatnonzero(counts)
+            starts = (np.cumsum(counts) - counts)[nonempty]
+
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(
+                sample[np.argsort(assignments, kind="stable")], starts, axis=0
+            )
+
+            # Re-seed empty clusters with random training rows
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[rng.choice(train_rows, len(empty))]
+            centroids = normalize_rows(sums)
+
+        assignments = np.concatenate([
+            np.argmax(np.asarray(matrix[start:start + block_size]) @ centroids.T, axis=1)
+            for start in range(0, n, block_size)
+        ])
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.order = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]
+        ).astype(np.int64)
+        self.n_lists = n_lists
+        self.count = n
+        return self
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, top_k: int):
+        """
+        Return the approximate top_k rows for a normalized query vector.
+
+        :param matrix: The matrix the index was built from.
+        :param query: L2-normalized query vector.
+        :param top_k: Number of results.
+        :return: A tuple of (row indices, scores) in descending score order.
+        """
+        n_probe = min(self.n_probe, self.n_lists)
+        probed = top_k_indices(self.centroids @ query, n_probe)
+        candidates = np.sort(np.concatenate(
+            [self.order[self.offsets[i]:self.offsets[i + 1]] for i in probed]
+        ))
+        CHUNKS_SCORED.inc(len(candidates), method="ivf")
+        scores = np.asarray(matrix[candidates]) @ query
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
+
+    def save(self, directory):
+        """
+        Persist the index files into `directory`.
+        """
+        write_manifest_last(directory, [
+            (IVF_CENTROIDS_FILE, lambda f: np.save(f, self.centroids)),
+            (IVF_ORDER_FILE, lambda f: np.save(f, self.order)),
+            (IVF_OFFSETS_FILE, lambda f: np.save(f, self.offsets)),
+        ], IVF_MANIFEST_FILE, {
+            "n_lists": self.n_lists,
+            "count": self.count,
+            "seed": self.seed,
+            "fingerprint": self.fingerprint,
+        })
+
+    @classmethod
+    def load(cls, directory, n_probe: int = 8):
+        """
+        Load an index written by `save`, or return None if there is none.
+        """
+        directory = Path(directory)
+        manifest_file = directory / IVF_MANIFEST_FILE
+        if not manifest_file.exists():
+            return None
+
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        index = cls(n_lists=manifest["n_lists"], n_probe=n_probe, seed=manifest["seed"])
+        index.count = manifest["count"]
+        index.fingerprint = manifest.get("fingerprint")
+        index.centroids = np.load(directory / IVF_CENTROIDS_FILE, mmap_mode="r")
+        index.order = np.load(directory / IVF_ORDER_FILE, mmap_mode="r")
+        index.offsets = np.load(directory / IVF_OFFSETS_FILE)
+        return index
+
+
+def recall_at_k(matrix: np.ndarray, index: IVFIndex, queries: np.ndarray, top_k: int = 10) -> float:
+    """
+    Measure the recall@k of an approximate index against exact search.
+
+    :param matrix: Normalized matrix the index was built from.
+    :param index: Index under test.
+    :param queries: Normalized query vectors, one per row.
+    :param top_k: Number of results compared per query.
+    :return: Mean fraction of the exact top_k rows that the index also returns.
+    """
+    if len(queries) == 0:
+        return 1.0
+
+    found = 0
+    expected = 0
+    for query in queries:
+        exact = set(top_k_indices(np.asarray(matrix @ query), top_k).tolist())
+        approx, _ = index.search(matrix, query, top_k)
+        found += len(exact.intersection(approx.tolist()))
+        expected += len(exact)
+
+    return found / expected
+
+
+def build_or_load_ivf(matrix, directory=None, fingerprint=None, n_lists=None, n_probe=8,
+                      sample_queries=100):
+    """
+    Load a persisted IVF index built from the same corpus, or build a new one
+    and persist it into `directory` when given.
+
+    After building, recall@10 is measured on a sample of the matrix rows used
+    as queries and logged, so the effect of `n_lists`/`n_probe` is visible.
+
+    :param matrix: Normalized embedding matrix.
+    :param directory: Optional directory the index is persisted in.
+    :param fingerprint: Identifier of the corpus the matrix was built from.
+                        A persisted index with another fingerprint is rebuilt.
+    :param n_lists: Number of clusters, or None for sqrt(number of rows).
+    :param n_probe: Number of clusters scanned per query.
+    :param sample_queries: Number of rows used to measure recall after building.
+    :return: The IVF index.
+    """
+    n = matrix.shape[0]
+    if directory is not None:
+        index = IVFIndex.load(directory, n_probe=n_probe)
+        if index is not None and index.count == n and index.fingerprint == fingerprint \
+                and (n_lists is None or index.n_lists == min(n_lists, n)):
+            logging.info("Loaded IVF index with %d lists from %s", index.n_lists, directory)
+            return index
+
+    index = IVFIndex(n_lists=n_lists, n_probe=n_probe).build(matrix)
+    index.fingerprint = fingerprint
+
+    rng = np.random.default_rng(index.seed)
+    sample = np.asarray(matrix[rng.choice(n, min(sample_queries, n), replace=False)])
+    logging.info(
+        "Built IVF index with %d lists (n_probe=%d), recall@10 on %d sample queries: %.3f",
+        index.n_lists, index.n_probe, len(sample), recall_at_k(matrix, index, sample)
+    )
+
+    if directory is not None:
+        index.save(directory)
+
+    return index
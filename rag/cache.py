@@ -0,0 +1,383 @@
+"""
+Caches placed in front of the expensive calls of the RAG pipeline.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from rag.metrics import CACHE_REQUESTS
+from rag.tracing import span
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text used as a cache key by trimming it and collapsing whitespace.
+
+    :param text: Raw text.
+    :return: Normalized text.
+    """
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache in front of an embedder's `embed` method.
+
+    The first tier is a bounded in-process LRU. The optional second tier is a
+    SQLite database on disk, so repeated questions are served across runs and
+    processes. Entries are keyed by the embedding model name and the
+    normalized text. Batched `embed_many` calls used during ingestion are
+    passed straight to the wrapped embedder.
+    """
+
+    def __init__(self, embedder, max_entries: int = 1024, path=None):
+        """
+        :param embedder: Embedder exposing `embed(text)` and `embed_many(texts, batch_size)`.
+        :param max_entries: Maximum number of embeddings kept in memory.
+        :param path: Optional SQLite file for the persistent tier.
+        """
+        self.embedder = embedder
+        self.model = getattr(embedder, "model", None)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, prompt: str):
+        """
+        Return the embedding of the normalized prompt, computing it only on a miss.
+
+        :param prompt: Text to embed.
+        :return: Embedding vector as a list of floats.
+        """
+        with span("query_cache") as cache_span:
+            text, key, embedding = self._lookup(prompt)
+            cache_span.set("hit", embedding is not None)
+        if embedding is None:
+            embedding = list(self.embedder.embed(text))
+            self._store(key, embedding)
+        return embedding
+
+    async def aembed(self, prompt: str):
+        """
+        Asynchronous variant of `embed`. Misses are awaited on the wrapped
+        embedder's `aembed`, or run in a worker thread if it has none.
+
+        :param prompt: Text to embed.
+        :return: Embedding vector as a list of floats.
+        """
+        with span("query_cache") as cache_span:
+            text, key, embedding = self._lookup(prompt)
+            cache_span.set("hit", embedding is not None)
+        if embedding is None:
+            if hasattr(self.embedder, "aembed"):
+                embedding = await self.embedder.aembed(text)
+            else:
+                embedding = await asyncio.to_thread(self.embedder.embed, text)
+            embedding = list(embedding)
+            self._store(key, embedding)
+        return embedding
+
+    def _lookup(self, prompt: str):
+        """
+        Look the prompt up in both tiers, updating the counters.
+        Returns (normalized text, key, embedding or None on a miss).
+        """
+        text = normalize_text(prompt)
+        key = self._key(text)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="query_embedding", outcome="hit")
+                return text, key, self._entries[key]
+
+            embedding = self._read_disk(key)
+            if embedding is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                CACHE_REQUESTS.inc(cache="query_embedding", outcome="disk_hit")
+                self._remember(key, embedding)
+                return text, key, embedding
+
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="query_embedding", outcome="miss")
+            return text, key, None
+
+    def _store(self, key, embedding):
+        with self._lock:
+            self._remember(key, embedding)
+            self._write_disk(key, embedding)
+
+    def embed_many(self, texts, batch_size=None):
+        """
+        Embed many texts with the wrapped embedder, bypassing the cache.
+        """
+        return self.embedder.embed_many(texts, batch_size=batch_size)
+
+    def stats(self) -> dict:
+        """
+        :return: Hit and miss counters since the cache was created.
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+    def close(self):
+        """
+        Close the persistent tier, if any.
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key, embedding):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT embedding FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def _write_disk(self, key, embedding):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO query_embeddings (key, embedding) VALUES (?, ?)",
+            (key, np.asarray(embedding, dtype=np.float32).tobytes()),
+        )
+        self._db.commit()
+
+
+class AnswerCache:
+    """
+    Cache of generated answers, consulted after retrieval and before the LLM.
+
+    An exact hit matches the normalized question and the set of retrieved
+    chunk ids. When `similarity_threshold` is set, a semantic hit matches a
+    cached question with the same retrieved chunk ids whose embedding has at
+    least that cosine similarity, so an answer is never served with the
+    citations of other sources.
+    Entries expire after `ttl` seconds, the least recently used entry is
+    evicted beyond `max_entries`, and the whole cache is cleared when the
+    corpus fingerprint of the index changes.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 256,
+            ttl: float | None = 3600.0,
+            similarity_threshold: float | None = None,
+            clock=time.monotonic
+    ):
+        """
+        :param max_entries: Maximum number of cached answers.
+        :param ttl: Seconds an answer stays valid, or None for no expiry.
+        :param similarity_threshold: Minimum cosine similarity for a semantic hit,
+                                     or None to only serve exact hits.
+        :param clock: Monotonic clock returning seconds, replaceable in tests.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self.fingerprint = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (answer, normalized vector, expires_at)
+        self._by_chunks = {}  # sorted chunk ids -> {key: None} of the entries retrieving them
+        self._lock = threading.Lock()
+
+    def _key(self, question: str, chunk_ids):
+        return normalize_text(question).casefold(), tuple(sorted(chunk_ids))
+
+    def get(self, question: str, chunk_ids, fingerprint=None, question_vector=None):
+        """
+        Look up a cached answer.
+
+        :param question: User question.
+        :param chunk_ids: Ids of the chunks retrieved for the question.
+        :param fingerprint: Identifier of the current index; a change clears the cache.
+        :param question_vector: Optional question embedding for semantic hits.
+        :return: A tuple of (answer or None, "exact" | "semantic" | "miss").
+        """
+        answer, outcome = self._lookup(question, chunk_ids, fingerprint, question_vector)
+        CACHE_REQUESTS.inc(cache="answer", outcome=outcome)
+        return answer, outcome
+
+    def _lookup(self, question: str, chunk_ids, fingerprint, question_vector):
+        key = self._key(question, chunk_ids)
+
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._expire()
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0], "exact"
+
+            if self.similarity_threshold is not None and question_vector is not None:
+                query = _unit(question_vector)
+                best_key, best_score = None, self.similarity_threshold
+                for entry_key in self._by_chunks.get(key[1], ()):
+                    vector = self._entries[entry_key][1]
+                    if vector is None:
+                        continue
+                    score = float(vector @ query)
+                    if score >= best_score:
+                        best_key, best_score = entry_key, score
+
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._entries[best_key][0], "semantic"
+
+            self.misses += 1
+            return None, "miss"
+
+    def put(self, question: str, chunk_ids, answer: str, fingerprint=None, question_vector=None):
+        """
+        Cache the answer generated for a question and its retrieved chunks.
+        """
+        key = self._key(question, chunk_ids)
+        vector = _unit(question_vector) if question_vector is not None else None
+        expires_at = self.clock() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._entries[key] = (answer, vector, expires_at)
+            self._entries.move_to_end(key)
+            self._by_chunks.setdefault(key[1], {})[key] = None
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        """
+        :return: Hit and miss counters since the cache was created.
+        """
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self.fingerprint:
+            self._entries.clear()
+            self._by_chunks.clear()
+            self.fingerprint = fingerprint
+
+    def _expire(self):
+        now = self.clock()
+        expired = [
+            key for key, (_, _, expires_at) in self._entries.items()
+            if expires_at is not None and expires_at <= now
+        ]
+        for key in expired:
+            self._remove(key)
+
+    def _remove(self, key):
+        del self._entries[key]
+        keys = self._by_chunks[key[1]]
+        del keys[key]
+        if not keys:
+            del self._by_chunks[key[1]]
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ChunkTextCache:
+    """
+    Bounded LRU of chunk texts in front of a text source read by row, such
+    as an index's `ChunkTextFile`. Only the texts of recently retrieved chunks
+    stay in memory.
+    """
+
+    def __init__(self, texts, max_entries: int = 256):
+        """
+        :param texts: Source returning the text of a row with `texts[row]`.
+        :param max_entries: Maximum number of texts kept in memory.
+        """
+        self.texts = texts
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, row: int) -> str:
+        row = int(row)
+        with self._lock:
+            text = self._entries.get(row)
+            if text is not None:
+                self._entries.move_to_end(row)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="chunk_text", outcome="hit")
+                return text
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache="chunk_text", outcome="miss")
+
+        text = self.texts[row]
+        with self._lock:
+            self._entries[row] = text
+            self._entries.move_to_end(row)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text
+
+    def __iter__(self):
+        # Full scans (e.g. building BM25) bypass the cache
+        return iter(self.texts)
+
+    def stats(self) -> dict:
+        """
+        :return: Hit and miss counters since the cache was created.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,154 @@
+"""
+Text chunking strategies used during ingestion.
+
+The functions here are module-level and depend only on their arguments, so
+they can run in worker processes during parallel ingestion.
+"""
+
+import re
+
+# One pattern classifies a line; alternatives are tried in priority order and
+# the name of the matching group is the header level. Roman numerals take
+# precedence over letters, so "C. ..." is a roman header as before.
+HEADER_PATTERN = re.compile(
+    r"(?P<roman>[IVXLCDM]+\.\s+.+)"
+    r"|(?P<letter>[A-Z]\.\s+.+)"
+    r"|(?P<question>(?:Q\d+[:.]|\d+\.)\s+.+)"
+)
+
+# Header levels cleared when a header of the given level starts
+_RESET_LEVELS = {
+    "roman": ("roman", "letter", "question"),
+    "letter": ("letter", "question"),
+    "question": ("question",),
+}
+
+
+def chunk_text(text: str, chunk_size: int, step: int):
+    """
+    Yield overlapping chunks of text
+    """
+    for start in range(0, len(text), step):
+        chunk = text[start:start + chunk_size]
+        if chunk.strip():
+            yield chunk
+
+
+def semantic_chunk_pages(pages):
+    """
+    Chunk a document using its structure such as section headers and Q&A blocks.
+
+    Streams over (page_number, text) pairs and carries the open section and
+    its pending body across page breaks, so a section that continues on the
+    next page stays one chunk. Every chunk records the section path and the
+    first and last page its body lines come from.
+
+    :param pages: Iterable of (page_number, text) pairs in page order.
+    :return: Generator of {"text", "section_path", "page", "page_end"} dicts.
+    """
+    section = {
+        "roman": None,
+        "letter": None,
+        "question": None,
+    }
+    buffer = []
+    first_page = last_page = None
+
+    def flush():
+        header_path = [h for h in section.values() if h is not None]
+        return {
+            "text": "\n".join(header_path + [""] + buffer),
+            "section_path": header_path,
+            "page": first_page,
+            "page_end": last_page,
+        }
+
+    for page_num, text in pages:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            match = HEADER_PATTERN.match(line)
+            if match is None:
+                if not buffer:
+                    first_page = page_num
+                buffer.append(line)
+                last_page = page_num
+                continue
+
+            if buffer:
+                yield flush()
+                buffer = []
+            for level in _RESET_LEVELS[match.lastgroup]:
+                section[level] = None
+            section[match.lastgroup] = line
+
+    if buffer:
+        yield flush()
+
+
+def semantic_chunk_text(text: str):
+    """
+    Chunk text using document structure such as section headers and Q&A blocks.
+    Preserves hierarchical context for better retrieval accuracy.
+    """
+    return [
+        {"text": c["text"], "section_path": c["section_path"]}
+        for c in semantic_chunk_pages([(1, text)])
+    ]
+
+
+def extract_page_texts(pdf_reader, path: str, first_page: int = 1, last_page: int | None = None):
+    """
+    Extract the text of pages [first_page, last_page) of a PDF.
+
+    Page numbers are 1-based; last_page=None means up to the last page.
+    Returns (page_number, text) pairs for the pages that hold any text.
+    """
+    pages = pdf_reader(path).pages
+    last_page = len(pages) + 1 if last_page is None else last_page
+
+    page_texts = []
+    for page_num in range(first_page, last_page):
+        text = pages[page_num - 1].extract_text()
+        if text:
+            page_texts.append((page_num, text))
+    return page_texts
+
+
+def chunk_pages(path: str, pages, chunking_strategy: str, chunk_size: int, step: int):
+    """
+    Chunk the (page_number, text) pairs of a document, in page order.
+
+    Returns the chunks as {"text", "metadata"} dicts, where metadata "page"
+    and "page_end" are the first and last page of the chunk. Semantic chunks
+    may span pages, so with that strategy the pages are chunked as one stream.
+    """
+    if chunking_strategy == "semantic":
+        return [
+            {
+                "text": chunk["text"],
+                "metadata": {
+                    "file": path,
+                    "page": chunk["page"],
+                    "page_end": chunk["page_end"],
+                    "section_path": chunk["section_path"],
+                }
+            }
+            for chunk in semantic_chunk_pages(pages)
+        ]
+
+    return [
+        {
+            "text": chunk,
+            "metadata": {
+                "file": path,
+                "page": page_num,
+                "page_end": page_num,
+                "section_path": [],
+            }
+        }
+        for page_num, text in pages
+        for chunk in chunk_text(text, chunk_size, step)
+    ]
@@ -10,19 +10,21 @@ This CLI:
 
 It is intended as a lightweight, user-facing entry point and is excluded from
 coverage and strict linting rules where appropriate.
+
+Only lightweight modules are imported at module level. The retriever, PDF
+reader, Ollama client and the libraries behind them (numpy, scikit-learn,
+httpx, pydantic) are imported by the functions that need them, so argument
+errors, invalid questions and `--help` return without loading them.
 """
 
 import json
-from rag.retriever import Retriever
-from rag.embeddings import Embedder
-from PyPDF2 import PdfReader
-from rag.llm import run_llm
-from rag.agent import Agent
+from rag.metrics import REGISTRY
 from rag.utils.validator import QValidator
+from rag.utils.logs import structured_log
 import logging 
 import argparse
-import ollama
 import time
+import sys
 import os
 
 logging.basicConfig(
@@ -34,27 +36,164 @@ logging.basicConfig(
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-def ensure_models():
+REQUIRED_MODELS = [
+    "phi3:latest",
+    "embeddinggemma:latest"
+]
+
+# Models found on the server by the last successful check
+MODEL_MANIFEST = "storage/ollama_models.json"
+
+# Fits the top 3 chunks of the default 2000 characters (about 510 tokens
+# each with their source headers), so trimming only starts with a larger
+# --top_k or --chunk_size
+DEFAULT_CONTEXT_TOKENS = 2048
+
+def ensure_models(client, manifest_path=MODEL_MANIFEST):
     """
     Ensure that all required Ollama models are available.
 
     If a required model is missing, it will be pulled automatically.
-    This function blocks until all models are present.
-    """
-    REQUIRED_MODELS = [
-        "phi3:latest",
-        "embeddinggemma:latest"
-    ]
+    This function blocks until all models are present, then records the
+    available models in `manifest_path` for `models_from_manifest`.
 
-    existing = {m["model"] for m in ollama.list()["models"]}
+    :param client: `OllamaClient` used to list and pull the models.
+    :param manifest_path: File the model manifest is written to (None to skip).
+    """
+    existing = {m["model"] for m in client.list()["models"]}
 
     for model in REQUIRED_MODELS:
         if model not in existing:
             logger.info(f"Pulling model: {model}")
-            ollama.pull(model)
+            client.pull(model)
         else:
             logger.info(f"Model already present: {model}")
 
+    if manifest_path:
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"models": sorted(existing | set(REQUIRED_MODELS))}, f)
+
+def models_from_manifest(manifest_path=MODEL_MANIFEST) -> bool:
+    """
+    Check the model manifest written by `ensure_models` without querying the server.
+
+    :param manifest_path: Model manifest file.
+    :return: True if the manifest lists every required model.
+    """
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            models = set(json.load(f)["models"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    return all(model in models for model in REQUIRED_MODELS)
+
+def wait_for_models(args):
+    """
+    Configure the shared Ollama client and wait until the required models
+    are available, backing off up to a minute between attempts. With
+    --trust_model_cache, a manifest listing every model skips the check.
+    """
+    from rag.ollama_client import backoff_delay, configure_client
+
+    client = configure_client(
+        timeout=args.ollama_timeout or None,
+        max_in_flight=args.ollama_parallel,
+        max_retries=args.ollama_retries
+    )
+
+    if args.trust_model_cache and models_from_manifest(MODEL_MANIFEST):
+        logger.info("Trusting cached model manifest %s", MODEL_MANIFEST)
+        return
+
+    attempt = 0
+    while True:
+        try:
+            ensure_models(client, MODEL_MANIFEST)
+            return
+        except Exception as e:
+            delay = backoff_delay(attempt, base=2.0, max_delay=60.0)
+            logger.exception("Cannot set up the required Ollama models. %s", e)
+            logger.info("Will try again in %.0f seconds.", delay)
+            time.sleep(delay)
+            attempt += 1
+
+def query_embedding_cache(embedder, max_entries, path):
+    """
+    Wrap the embedder in a query embedding cache persisted at `path`, or in
+    memory only when the SQLite file cannot be opened, so that an unwritable
+    storage directory never disables dense retrieval.
+    """
+    import sqlite3
+    from rag.cache import QueryEmbeddingCache
+
+    if path:
+        try:
+            return QueryEmbeddingCache(embedder, max_entries=max_entries, path=path)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Cannot open query cache %s, keeping it in memory: %s", path, e)
+    return QueryEmbeddingCache(embedder, max_entries=max_entries)
+
+
+def build_agent(args):
+    """
+    Load the corpus and assemble the agent configured by the CLI arguments.
+    """
+    from PyPDF2 import PdfReader
+    from rag.agent import Agent
+    from rag.cache import AnswerCache
+    from rag.embeddings import Embedder
+    from rag.llm import arun_llm, run_llm, stream_llm
+    from rag.retriever import Retriever
+    from rag.tracing import Tracer
+
+    # Try creating embedder, otherwise return None so as to fall to TF-IDF
+    try:
+        embedder = Embedder()
+    except Exception as e:
+        logger.warning("Cannot create the embedder, falling back to TF-IDF: %s", e)
+        embedder = None
+
+    if embedder is not None:
+        embedder = query_embedding_cache(
+            embedder, args.query_cache_size, args.query_cache_path or None
+        )
+
+    docs_path = "docs/"
+    retriever = Retriever(
+        embedder=embedder,
+        pdf_reader=PdfReader,
+        docs_paths = [docs_path + doc_path for doc_path in os.listdir(docs_path) if doc_path.endswith(".pdf")],
+        chunking_strategy=args.chunking,
+        chunk_size=args.chunk_size,
+        overlap_ratio=args.overlap_ratio,
+        embed_batch_size=args.embed_batch_size,
+        ingest_workers=args.ingest_workers,
+        ingest_queue_size=args.ingest_queue_size,
+        ann=args.ann,
+        ann_lists=args.ann_lists,
+        ann_probe=args.ann_probe,
+        ann_min_chunks=args.ann_min_chunks,
+        retrieval=args.retrieval,
+        embedding_dtype=args.embedding_dtype,
+        rescore=args.rescore,
+        lazy_text=args.lazy_text,
+        text_cache_size=args.text_cache_size
+    )
+
+    answer_cache = None
+    if args.answer_cache_size > 0:
+        answer_cache = AnswerCache(
+            max_entries=args.answer_cache_size,
+            ttl=args.answer_cache_ttl,
+            similarity_threshold=args.answer_cache_similarity
+        )
+
+    return Agent(retriever, run_llm, allm=arun_llm, stream_llm=stream_llm,
+                 answer_cache=answer_cache,
+                 context_tokens=args.context_tokens or None,
+                 tracer=Tracer(args.trace_file) if args.trace_file else None)
+
 def main():
     """
     Entry point for the RAG CLI.
@@ -65,12 +204,14 @@ def main():
     - Ensures required LLM and embedding models are available
     - Initializes retrieval and agent components
     - Validates the user question
-    - Executes the RAG workflow and prints results
+    - Executes the RAG workflow and prints results, or keeps serving
+      questions when --serve is given
     """
     parser = argparse.ArgumentParser(description="RAG CLI")
     parser.add_argument(
         "question",
-        help="Question to ask",
+        nargs="?",
+        help="Question to ask (omit when using --serve or --questions_file)",
     )
     parser.add_argument(
         "--top_k",
@@ -87,46 +228,246 @@ def main():
     parser.add_argument(
         "--chunk_size",
         default=2000,
+        type=int,
         help="Chunk size to use"
     )
     parser.add_argument(
         "--overlap_ratio",
         default=0.15,
+        type=float,
         help="Chunk overlap ratio to use"
     )
+    parser.add_argument(
+        "--embed_batch_size",
+        default=32,
+        type=int,
+        help="Number of chunks sent per embedding request during ingestion"
+    )
+    parser.add_argument(
+        "--ingest_workers",
+        default=1,
+        type=int,
+        help="Number of worker processes used to extract PDF pages"
+    )
+    parser.add_argument(
+        "--ingest_queue_size",
+        default=4,
+        type=int,
+        help="Documents buffered between ingestion stages (extract, chunk, embed)"
+    )
+    parser.add_argument(
+        "--ann",
+        choices=["exact", "ivf"],
+        default="exact",
+        help="Nearest-neighbour search backend"
+    )
+    parser.add_argument(
+        "--ann_lists",
+        default=None,
+        type=int,
+        help="Number of IVF clusters (default: square root of the chunk count)"
+    )
+    parser.add_argument(
+        "--ann_probe",
+        default=8,
+        type=int,
+        help="Number of IVF clusters scanned per query; higher is slower but more accurate"
+    )
+    parser.add_argument(
+        "--ann_min_chunks",
+        default=10000,
+        type=int,
+        help="Corpora with fewer chunks always use exact search"
+    )
+    parser.add_argument(
+        "--embedding_dtype",
+        choices=["float32", "float16", "int8"],
+        default="float32",
+        help="Precision of the embedding copy scored by the exact search"
+    )
+    parser.add_argument(
+        "--rescore",
+        default=0,
+        type=int,
+        help="Re-rank this many quantized candidates at full precision (0 to disable)"
+    )
+    parser.add_argument(
+        "--lazy_text",
+        action="store_true",
+        help="Keep chunk texts on disk and read only the retrieved ones"
+    )
+    parser.add_argument(
+        "--text_cache_size",
+        default=256,
+        type=int,
+        help="Number of chunk texts kept in memory with --lazy_text"
+    )
+    parser.add_argument(
+        "--retrieval",
+        choices=["dense", "bm25", "hybrid"],
+        default="dense",
+        help="Score chunks by embedding similarity, BM25 over an inverted index, "
+             "or both fused with reciprocal rank fusion"
+    )
+    parser.add_argument(
+        "--query_cache_size",
+        default=1024,
+        type=int,
+        help="Number of question embeddings kept in memory"
+    )
+    parser.add_argument(
+        "--query_cache_path",
+        default="storage/query_embeddings.sqlite3",
+        help="SQLite file persisting question embeddings across runs (empty to disable)"
+    )
+    parser.add_argument(
+        "--context_tokens",
+        default=DEFAULT_CONTEXT_TOKENS,
+        type=int,
+        help="Estimated token budget of the prompt context (0 for no limit)"
+    )
+    parser.add_argument(
+        "--answer_cache_size",
+        default=256,
+        type=int,
+        help="Number of generated answers kept in memory (0 to disable)"
+    )
+    parser.add_argument(
+        "--answer_cache_ttl",
+        default=3600.0,
+        type=float,
+        help="Seconds a cached answer stays valid"
+    )
+    parser.add_argument(
+        "--answer_cache_similarity",
+        default=None,
+        type=float,
+        help="Serve a cached answer to a question at least this similar (cosine) "
+             "with the same retrieved chunks; exact matches only when unset"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the answer as it is generated"
+    )
+    parser.add_argument(
+        "--questions_file",
+        default=None,
+        help="Answer every non-empty line of this file and write one JSON log per question"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="JSONL file the --questions_file logs are written to (default: stdout)"
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        default=4,
+        type=int,
+        help="Maximum number of LLM calls in flight with --questions_file"
+    )
+    parser.add_argument(
+        "--ollama_timeout",
+        default=120.0,
+        type=float,
+        help="Seconds an Ollama request may take (0 for no limit). Timed out embedding "
+             "requests are retried, timed out answer generations are not"
+    )
+    parser.add_argument(
+        "--ollama_parallel",
+        default=None,
+        type=int,
+        help="Maximum number of Ollama requests in flight (default: OLLAMA_NUM_PARALLEL or 4)"
+    )
+    parser.add_argument(
+        "--ollama_retries",
+        default=3,
+        type=int,
+        help="Number of times a failed Ollama request is retried with jittered exponential backoff"
+    )
+    parser.add_argument(
+        "--trust_model_cache",
+        action="store_true",
+        help=f"Skip querying Ollama for the required models when {MODEL_MANIFEST} "
+             "lists them from an earlier run"
+    )
+    parser.add_argument(
+        "--trace_file",
+        default=None,
+        help="Append timing spans of every run to this JSONL file, keyed by trace_id"
+    )
+    parser.add_argument(
+        "--metrics_file",
+        default=None,
+        help="Write aggregated metrics in the Prometheus text format to this file "
+             "('-' for stdout) before exiting"
+    )
+    parser.add_argument(
+        "--serve",
+        choices=["http", "stdio"],
+        default=None,
+        help="Keep the corpus loaded and answer questions over HTTP or JSON lines on stdin/stdout"
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Interface the HTTP server binds to"
+    )
+    parser.add_argument(
+        "--port",
+        default=8000,
+        type=int,
+        help="Port the HTTP server listens on"
+    )
 
     args = parser.parse_args()
+    if args.question is None and args.serve is None and args.questions_file is None:
+        parser.error("a question is required unless --serve or --questions_file is used")
 
     log_banner()
+    qvalidator = QValidator()
 
-    # Wait for Ollama server to be available
-    while True:
-        try:
-            ensure_models()
-            break
-        except Exception as e:
-            logger.exception("Cannot set up the required Ollama models. %s", e)
-            logger.info("Will try again in 1 minute.")
-            time.sleep(60)
+    # A single invalid question is answered without loading anything
+    if args.serve is None and args.questions_file is None:
+        valid, error_code = qvalidator.validate_question(args.question)
+        if not valid:
+            log_answer(qvalidator.human_readable_message(error_code))
+            return
+
+    wait_for_models(args)
+    agent = build_agent(args)
 
-    # Try creating embedder, otherwise return None so as to fall to TF-IDF
     try:
-        embedder = Embedder()
-    except Exception as e:
-        embedder = None
+        run_command(agent, qvalidator, args)
+    finally:
+        if args.metrics_file:
+            REGISTRY.write(args.metrics_file)
 
-    docs_path = "docs/"
-    retriever = Retriever(
-        embedder=embedder,
-        pdf_reader=PdfReader,
-        docs_paths = [docs_path + doc_path for doc_path in os.listdir(docs_path) if doc_path.endswith(".pdf")],
-        chunking_strategy=args.chunking,
-        chunk_size=args.chunk_size,
-        overlap_ratio=args.overlap_ratio
-    )
+def run_command(agent, qvalidator, args):
+    """
+    Serve, answer a questions file or answer the single question,
+    depending on the parsed CLI arguments.
+    """
+    from rag.server import serve_http, serve_stdio
 
-    agent = Agent(retriever, run_llm)
-    qvalidator = QValidator()
+    if args.serve == "http":
+        serve_http(agent, qvalidator, args.host, args.port, args.top_k)
+        return
+    if args.serve == "stdio":
+        serve_stdio(agent, qvalidator, args.top_k)
+        return
+
+    if args.questions_file:
+        with open(args.questions_file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                answer_questions_file(agent, qvalidator, questions, out,
+                                      args.top_k, args.max_concurrency)
+        else:
+            answer_questions_file(agent, qvalidator, questions, sys.stdout,
+                                  args.top_k, args.max_concurrency)
+        return
 
     question = args.question
     valid, error_code = qvalidator.validate_question(question)
@@ -134,11 +475,53 @@ def main():
         log_answer(qvalidator.human_readable_message(error_code))
         return
     
+    if args.stream:
+        stream, log = agent.run_stream(question, args.top_k)
+        log_answer_stream(stream)
+        log_logs_json(log)
+        return
+
     answer, log = agent.run(question, args.top_k)
 
     log_answer(answer)
     log_logs_json(log)
 
+def answer_questions_file(agent, qvalidator, questions, out, top_k: int = 3,
+                          max_concurrency: int = 4):
+    """
+    Answer a batch of questions and write one JSON line per question.
+
+    Every line holds the structured log of `log_logs_json` plus the "answer".
+    Invalid questions are answered with the validator message and their
+    error code in "errors", without reaching the retriever or the LLM.
+
+    :param agent: Agent used to answer valid questions.
+    :param qvalidator: Validator applied to every question.
+    :param questions: Questions to answer.
+    :param out: Text stream the JSON lines are written to, in input order.
+    :param top_k: Number of top chunks to retrieve per question.
+    :param max_concurrency: Maximum number of LLM calls in flight.
+    """
+    results = [None] * len(questions)
+    valid = []
+    for i, question in enumerate(questions):
+        is_valid, error_code = qvalidator.validate_question(question)
+        if is_valid:
+            valid.append(i)
+        else:
+            results[i] = (
+                qvalidator.human_readable_message(error_code),
+                {"question": question, "errors": [error_code]},
+            )
+
+    answered = agent.run_batch([questions[i] for i in valid], top_k, max_concurrency)
+    for i, result in zip(valid, answered):
+        results[i] = result
+
+    for answer, log in results:
+        out.write(json.dumps({**structured_log(log), "answer": answer}) + "\n")
+    out.flush()
+
 def log_banner():
     banner = """
 ══════════════════════════════════════════════════════
@@ -164,44 +547,27 @@ def log_answer(answer: str):
 """
     logger.info(message)
 
+def log_answer_stream(stream):
+    """
+    Print the answer to stdout piece by piece as it is generated.
+
+    :param stream: Iterator of answer pieces from Agent.run_stream()
+    """
+    sys.stdout.write(f"{'-' * 80}\n{'ANSWER'.center(80)}\n{'-' * 80}\n")
+    for piece in stream:
+        sys.stdout.write(piece)
+        sys.stdout.flush()
+    sys.stdout.write("\n")
+
 def log_logs_json(log: dict):
     """
     Log the agent execution log as structured JSON.
 
-    The JSON format matches:
-
-    {
-        "trace_id": "...",
-        "question": "...",
-        "plan": [...],
-        "retrieval": [{"file":"a.txt","chunk_id":42,"score":0.78}],
-        "draft_tokens": ...,
-        "latency_ms": {...},
-        "errors": [...]
-    }
+    See `rag.utils.logs.structured_log` for the format.
 
     :param log: Execution log dictionary from Agent.run()
     """
-    # Build a minimal structured log
-    structured_log = {
-        "trace_id": log.get("trace_id"),
-        "question": log.get("question"),
-        "plan": log.get("plan"),
-        "retrieval": [
-            {
-                "file": r["file"],
-                "chunk_id": r["chunk_id"],
-                "score": r["score"],
-                "section_path": r.get("section_path", [])
-            }
-            for r in log.get("retrieval", [])
-        ],
-        "draft_tokens": log.get("draft_tokens"),
-        "latency_ms": log.get("latency_ms"),
-        "errors": log.get("errors", []),
-    }
-
-    logger.info("\n" + json.dumps(structured_log, indent=2))
+    logger.info("\n" + json.dumps(structured_log(log), indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,194 @@
+"""
+Assembly of the retrieved chunks into the context of a prompt.
+
+Retrieved chunks often repeat text: basic chunks overlap their neighbours
+and semantic chunks start with their section headers. Chunks that follow
+each other in the same file and page are therefore merged into one passage
+with the repeated text removed. Passages are then added in order of
+relevance until the token budget is spent, so the lowest-scoring content is
+trimmed first.
+
+Token counts are estimated from the text length, since the LLM's tokenizer
+is not available locally.
+"""
+
+import math
+
+# Rough number of characters per token of English text
+CHARS_PER_TOKEN = 4
+
+# Passages that would be cut below this many tokens are dropped instead
+MIN_PASSAGE_TOKENS = 32
+
+# Shorter repeats between neighbouring chunks are left alone, since they may
+# be coincidental
+MIN_OVERLAP_CHARS = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens of a text.
+
+    :param text: Text to measure.
+    :return: Estimated token count.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def strip_overlap(previous: str, text: str) -> str:
+    """
+    Remove the longest prefix of `text` that is also a suffix of `previous`,
+    if it is at least `MIN_OVERLAP_CHARS` long.
+
+    :param previous: Text preceding `text` in the document.
+    :param text: Text that may start with the end of `previous`.
+    :return: `text` without the repeated prefix.
+    """
+    probe = text[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return text
+
+    start = max(0, len(previous) - len(text))
+    # The earliest match in the tail of `previous` is the longest overlap
+    position = previous.find(probe, start)
+    while position != -1:
+        if text.startswith(previous[position:]):
+            return text[len(previous) - position:]
+        position = previous.find(probe, position + 1)
+    return text
+
+
+def _strip_headers(text: str, shared: int) -> str:
+    """
+    Drop the first `shared` header lines of a semantic chunk.
+    """
+    lines = text.split("\n")
+    return "\n".join(lines[shared:])
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """
+    Cut text to at most `max_chars` characters, at a word boundary if possible.
+    """
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = cut.rstrip().rfind(" ")
+    return cut[:boundary] if boundary > max_chars // 2 else cut
+
+
+def _common_prefix(a, b) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _adjacent(passage, metadata) -> bool:
+    return (
+        metadata["file"] == passage["file"]
+        and metadata.get("chunk_id") is not None
+        and metadata["chunk_id"] == passage["chunk_ids"][-1] + 1
+        and metadata["page"] <= passage["page_end"]
+    )
+
+
+def merge_chunks(retrieved):
+    """
+    Merge retrieved chunks that follow each other in the same file and page.
+
+    :param retrieved: List of (chunk, score) tuples.
+    :return: Passages as {"file", "page", "page_end", "section_path", "text",
+             "chunk_ids", "score"} dicts ordered by the rank of their best
+             chunk, where the score of a passage is the best score of its chunks.
+    """
+    def position(item):
+        metadata = item[1][0]["metadata"]
+        chunk_id = metadata.get("chunk_id")
+        return metadata["file"], chunk_id is None, chunk_id or 0
+
+    passages = []
+    ranks = []
+    for rank, (document, score) in sorted(enumerate(retrieved), key=position):
+        metadata = document["metadata"]
+        section_path = metadata.get("section_path") or []
+        last = passages[-1] if passages else None
+
+        if last is not None and _adjacent(last, metadata):
+            text = document["text"]
+            shared = _common_prefix(last["section_path"], section_path)
+            if shared and text.split("\n", shared)[:shared] == section_path[:shared]:
+                text = _strip_headers(text, shared)
+                continued = False
+            else:
+                stripped = strip_overlap(last["text"], text)
+                continued = len(stripped) < len(text)
+                text = stripped
+
+            if text.strip():
+                # Text following a stripped overlap continues the previous chunk as is
+                separator = "" if continued or text[:1] == "\n" else "\n"
+                last["text"] += separator + text
+            last["page_end"] = max(last["page_end"], metadata.get("page_end", metadata["page"]))
+            last["section_path"] = section_path
+            last["chunk_ids"].append(metadata["chunk_id"])
+            last["score"] = max(last["score"], score)
+            ranks[-1] = min(ranks[-1], rank)
+            continue
+
+        passages.append({
+            "file": metadata["file"],
+            "page": metadata["page"],
+            "page_end": metadata.get("page_end", metadata["page"]),
+            "section_path": section_path,
+            "text": document["text"],
+            "chunk_ids": [metadata.get("chunk_id")],
+            "score": score,
+        })
+        ranks.append(rank)
+
+    order = sorted(range(len(passages)), key=ranks.__getitem__)
+    return [passages[i] for i in order]
+
+
+def pack_context(retrieved, max_tokens: int | None = None, overhead_tokens=lambda passage: 0):
+    """
+    Merge the retrieved chunks into passages and keep the most relevant
+    ones that fit in the token budget.
+
+    Passages are taken in order of relevance. One that does not fit
+    is cut to the remaining budget, or dropped if fewer than
+    `MIN_PASSAGE_TOKENS` would be left of it.
+
+    :param retrieved: List of (chunk, score) tuples.
+    :param max_tokens: Token budget of the context, or None for no limit.
+    :param overhead_tokens: Tokens added to a passage by its formatting,
+                            such as its source header.
+    :return: A tuple of (passages, trimmed), where trimmed counts the
+             passages cut or dropped to respect the budget.
+    """
+    passages = merge_chunks(retrieved)
+    if max_tokens is None:
+        return passages, 0
+
+    packed = []
+    trimmed = 0
+    remaining = max_tokens
+    for passage in passages:
+        cost = estimate_tokens(passage["text"]) + overhead_tokens(passage)
+        if cost <= remaining:
+            packed.append(passage)
+            remaining -= cost
+            continue
+
+        trimmed += 1
+        available = remaining - overhead_tokens(passage)
+        if available < MIN_PASSAGE_TOKENS:
+            continue
+
+        packed.append({**passage, "text": _truncate(passage["text"], available * CHARS_PER_TOKEN)})
+        remaining -= available + overhead_tokens(passage)
+
+    return packed, trimmed
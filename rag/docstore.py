@@ -0,0 +1,123 @@
+"""
+Columnar storage of the chunks searched by a `Retriever`.
+
+Instead of one nested dict per chunk, the store keeps one column per field:
+- texts: a single string buffer with an offsets array, or an external
+  source read by row (e.g. the index's text file behind a small cache)
+- files and section paths: interned tables referenced by integer ids
+- first and last page: int32 arrays
+- embeddings: the shared float32 matrix (usually memory-mapped)
+
+The chunk id of a chunk is its row index. Indexing the store materializes
+a {"text", "embedding", "metadata"} dict for that row only, so retrieval
+builds dicts for the top_k results it returns and nothing else.
+"""
+
+from collections.abc import Sequence
+import numpy as np
+
+
+class DocumentStore(Sequence):
+    """
+    Read-only sequence of chunks stored column by column.
+    """
+
+    def __init__(self, chunks=(), embeddings=None, texts=None):
+        """
+        :param chunks: Iterable of {"text", "metadata"} chunks in row order, where
+                       metadata holds "file", "page" and optionally "page_end"
+                       and "section_path".
+        :param embeddings: Optional matrix with one row per chunk.
+        :param texts: Optional source of the chunk texts supporting `len`,
+                      `texts[row]` and iteration. When given, the texts of
+                      `chunks` are ignored and none are kept in memory.
+        """
+        files, file_ids = {}, []
+        sections, section_ids = {}, []
+        pages, page_ends = [], []
+        buffer, offsets = [], [0]
+
+        for chunk in chunks:
+            metadata = chunk["metadata"]
+            file_ids.append(files.setdefault(metadata["file"], len(files)))
+            section = tuple(metadata.get("section_path") or ())
+            section_ids.append(sections.setdefault(section, len(sections)))
+            pages.append(metadata["page"])
+            page_ends.append(metadata.get("page_end", metadata["page"]))
+            if texts is None:
+                buffer.append(chunk["text"])
+                offsets.append(offsets[-1] + len(chunk["text"]))
+
+        self.files = list(files)
+        self.sections = list(sections)
+        self.file_ids = np.array(file_ids, dtype=np.int32)
+        self.section_ids = np.array(section_ids, dtype=np.int32)
+        self.pages = np.array(pages, dtype=np.int32)
+        self.page_ends = np.array(page_ends, dtype=np.int32)
+        self._buffer = "".join(buffer)
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._texts = texts
+
+        if texts is not None and len(texts) != len(self.pages):
+            raise ValueError(f"Expected {len(self.pages)} texts, got {len(texts)}")
+        if embeddings is not None and len(embeddings) != len(self.pages):
+            raise ValueError(
+                f"Expected {len(self.pages)} embeddings, got {len(embeddings)}"
+            )
+        self.embeddings = embeddings
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(len(self)))]
+
+        n = len(self)
+        index = int(index)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("DocumentStore index out of range")
+        return self._materialize(index)
+
+    def text(self, index: int) -> str:
+        """
+        :return: The text of one chunk, sliced from the shared buffer
+                 or read from the text source.
+        """
+        if self._texts is not None:
+            return self._texts[index]
+        return self._buffer[self._offsets[index]:self._offsets[index + 1]]
+
+    def texts(self):
+        """
+        :return: Generator over the chunk texts in row order.
+        """
+        if self._texts is not None:
+            yield from self._texts
+            return
+
+        offsets = self._offsets.tolist()
+        buffer = self._buffer
+        for start, end in zip(offsets, offsets[1:]):
+            yield buffer[start:end]
+
+    def metadata(self, index: int) -> dict:
+        """
+        :return: A fresh metadata dict for one chunk.
+        """
+        return {
+            "file": self.files[self.file_ids[index]],
+            "page": int(self.pages[index]),
+            "page_end": int(self.page_ends[index]),
+            "section_path": list(self.sections[self.section_ids[index]]),
+            "chunk_id": index,
+        }
+
+    def _materialize(self, index: int) -> dict:
+        return {
+            "text": self.text(index),
+            "embedding": None if self.embeddings is None else self.embeddings[index],
+            "metadata": self.metadata(index),
+        }
@@ -1,4 +1,7 @@
-import ollama
+import asyncio
+from rag.metrics import EMBEDDED_TEXTS, EMBEDDING_REQUESTS
+from rag.ollama_client import get_client
+from rag.tracing import span
 
 class Embedder:
     """
@@ -6,6 +9,29 @@ class Embedder:
     using an Ollama embedding model.
     """
 
+    def __init__(
+            self,
+            model: str = "embeddinggemma",
+            client=None,
+            async_client=None,
+            batch_size: int = 32
+    ):
+        """
+        Args:
+            model (str): Name of the Ollama embedding model.
+            client: Object exposing `embed(model=..., input=...)`, such as an
+                `ollama.Client`. Defaults to the shared pooled `OllamaClient`,
+                which retries transient failures with backoff.
+            async_client: Object exposing an awaitable `embed(model=..., input=...)`,
+                such as an `ollama.AsyncClient`. Defaults to the `aembed` method of
+                `client`, or to running `client.embed` in a worker thread.
+            batch_size (int): Default number of texts sent per embed request.
+        """
+        self.model = model
+        self.client = client or get_client()
+        self.async_client = async_client
+        self.batch_size = batch_size
+
     def embed(self, prompt: str):
         """
         Generate an embedding vector for the given text prompt.
@@ -20,8 +46,69 @@ class Embedder:
             list[float]: The embedding vector representing the semantic meaning
             of the input prompt.
         """
-        return ollama.embed(
-            # model='nomic-embed-text',
-            model='embeddinggemma',
-            input=prompt,
-        ).embeddings[0]
+        EMBEDDING_REQUESTS.inc(kind="query")
+        with span("embed", model=self.model):
+            embedding = self.client.embed(
+                model=self.model,
+                input=prompt,
+            ).embeddings[0]
+        EMBEDDED_TEXTS.inc(kind="query")
+        return embedding
+
+    async def aembed(self, prompt: str):
+        """
+        Asynchronous variant of `embed`.
+
+        Args:
+            prompt (str): The input text to be embedded.
+
+        Returns:
+            list[float]: The embedding vector of the input prompt.
+        """
+        EMBEDDING_REQUESTS.inc(kind="query")
+        with span("embed", model=self.model):
+            if self.async_client is not None:
+                response = await self.async_client.embed(model=self.model, input=prompt)
+            elif hasattr(self.client, "aembed"):
+                response = await self.client.aembed(model=self.model, input=prompt)
+            else:
+                response = await asyncio.to_thread(self.client.embed, model=self.model, input=prompt)
+        EMBEDDED_TEXTS.inc(kind="query")
+        return response.embeddings[0]
+
+    def embed_many(self, texts: list[str], batch_size: int | None = None):
+        """
+        Generate embedding vectors for many texts using batched requests.
+
+        Texts are sent to the embedding model in batches of `batch_size`,
+        one request per batch. Retrying transient failures is left to the
+        client, so errors it gives up on are propagated.
+
+        Args:
+            texts (list[str]): The input texts to be embedded.
+            batch_size (int, optional): Number of texts per request.
+                Defaults to the embedder's configured batch size.
+
+        Returns:
+            list[list[float]]: One embedding vector per input text, in input order.
+        """
+        batch_size = batch_size or self.batch_size
+        embeddings = []
+
+        for start in range(0, len(texts), batch_size):
+            batch = list(texts[start:start + batch_size])
+            embeddings.extend(self._embed_batch(batch))
+
+        return embeddings
+
+    def _embed_batch(self, batch: list[str]):
+        """
+        Embed a single batch, checking that every text got an embedding.
+        """
+        EMBEDDING_REQUESTS.inc(kind="batch")
+        with span("embed_batch", model=self.model, size=len(batch)):
+            embeddings = self.client.embed(model=self.model, input=batch).embeddings
+        if len(embeddings) != len(batch):
+            raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+        EMBEDDED_TEXTS.inc(len(batch), kind="batch")
+        return embeddings
@@ -1,11 +1,12 @@
-from ollama import chat
+from rag.ollama_client import get_client
+from rag.tracing import span
 
 def run_llm(prompt: str) -> str:
     """
     Execute a chat-based large language model (LLM) request with a user prompt.
 
     This function sends the provided prompt to the configured Ollama chat model
-    and returns the model's generated response text.
+    through the shared pooled client and returns the model's generated response text.
 
     Args:
         prompt (str): The user input prompt to send to the LLM.
@@ -13,7 +14,50 @@ def run_llm(prompt: str) -> str:
     Returns:
         str: The generated response content from the LLM.
     """
-    return chat(
-        model='phi3',
-        messages=[{'role': 'user', 'content': prompt}]
-    ).message.content
+    with span("llm_chat", model='phi3', prompt_chars=len(prompt)):
+        return get_client().chat(
+            model='phi3',
+            messages=[{'role': 'user', 'content': prompt}]
+        ).message.content
+
+def stream_llm(prompt: str):
+    """
+    Execute a streaming chat request and yield the response as it is generated.
+
+    Args:
+        prompt (str): The user input prompt to send to the LLM.
+
+    Yields:
+        str: Pieces of the response content, roughly one token each.
+    """
+    with span("llm_chat", model='phi3', prompt_chars=len(prompt), stream=True):
+        for part in get_client().chat(
+            model='phi3',
+            messages=[{'role': 'user', 'content': prompt}],
+            stream=True
+        ):
+            if part.message.content:
+                yield part.message.content
+
+async def arun_llm(prompt: str, client=None) -> str:
+    """
+    Asynchronous variant of `run_llm`.
+
+    The request is awaited instead of blocking, so many prompts can be in
+    flight on the same event loop, up to the shared client's concurrency limit.
+
+    Args:
+        prompt (str): The user input prompt to send to the LLM.
+        client: Optional object exposing an awaitable `chat(model=..., messages=...)`,
+            such as an `ollama.AsyncClient`. Defaults to the shared pooled client.
+
+    Returns:
+        str: The generated response content from the LLM.
+    """
+    messages = [{'role': 'user', 'content': prompt}]
+    with span("llm_chat", model='phi3', prompt_chars=len(prompt)):
+        if client is None:
+            response = await get_client().achat(model='phi3', messages=messages)
+        else:
+            response = await client.chat(model='phi3', messages=messages)
+    return response.message.content
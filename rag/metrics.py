@@ -0,0 +1,238 @@
+"""
+Process-wide metrics aggregated across questions.
+
+Counters and histograms live in a `MetricsRegistry` and are exposed in the
+Prometheus text format with `REGISTRY.render()` or `REGISTRY.write(path)`.
+Histograms use fixed bucket bounds, so recording an observation is a
+bisection and a few increments under a lock, cheap enough for the hot path.
+
+The metrics recorded by the pipeline are defined at the bottom of this module.
+"""
+
+import bisect
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond scoring up to slow LLM generations
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonically increasing count, optionally split by label values.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        """
+        :param name: Metric name, ending in `_total` by convention.
+        :param documentation: Help text of the metric.
+        :param labelnames: Names of the labels every increment is recorded under.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Increase the count of the given label values by `amount`.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """
+        :return: The current count of the given label values.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        """
+        :param name: Metric name.
+        :param documentation: Help text of the metric.
+        :param buckets: Increasing upper bounds of the buckets; a +Inf bucket is added.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        Record one observation.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """
+        Observe the duration of the enclosed block in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        :return: A tuple of (cumulative counts per bucket including +Inf, sum, count).
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+    def render(self) -> list[str]:
+        cumulative, total, count = self.snapshot()
+        lines = [
+            f'{self.name}_bucket{{le="{_format_value(bound)}"}} {value}'
+            for bound, value in zip(self.buckets + (math.inf,), cumulative)
+        ]
+        lines.append(f"{self.name}_sum {_format_value(total)}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named collection of metrics rendered together.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """
+        Return the counter called `name`, creating it on first use.
+        """
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        """
+        Return the histogram called `name`, creating it on first use.
+        """
+        return self._get_or_create(Histogram, name, documentation, buckets)
+
+    def _get_or_create(self, cls, name, documentation, arg):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, arg)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {type(metric).__name__}")
+            return metric
+
+    def render(self) -> str:
+        """
+        :return: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+
+        lines = []
+        for metric in metrics:
+            kind = "counter" if isinstance(metric, Counter) else "histogram"
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=None):
+        """
+        Write the rendered metrics to `path`, or to stdout when it is None or "-".
+        """
+        text = self.render()
+        if path is None or path == "-":
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_request_seconds", "Time to answer a question end to end"
+)
+RETRIEVAL_SECONDS = REGISTRY.histogram(
+    "rag_retrieval_seconds", "Time to retrieve the chunks of a question"
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "rag_llm_seconds", "Time to generate an answer with the LLM"
+)
+EMBEDDING_REQUESTS = REGISTRY.counter(
+    "rag_embedding_requests_total", "Requests sent to the embedding model", ("kind",)
+)
+EMBEDDED_TEXTS = REGISTRY.counter(
+    "rag_embedded_texts_total", "Texts embedded by the embedding model", ("kind",)
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "rag_cache_requests_total", "Cache lookups by cache and outcome", ("cache", "outcome")
+)
+CHUNKS_SCORED = REGISTRY.counter(
+    "rag_chunks_scored_total", "Chunks scored against questions", ("method",)
+)
+OLLAMA_REQUESTS = REGISTRY.counter(
+    "rag_ollama_requests_total", "HTTP requests sent to Ollama by endpoint and outcome",
+    ("endpoint", "outcome")
+)
+INGESTED_ITEMS = REGISTRY.counter(
+    "rag_ingested_items_total", "Units produced by each ingestion stage", ("stage",)
+)
@@ -0,0 +1,390 @@
+"""
+Shared HTTP client for the Ollama API, used by `Embedder` and the LLM helpers.
+
+Compared to the module-level `ollama` functions, `OllamaClient`:
+- keeps a pool of keep-alive connections, so consecutive requests skip the
+  TCP handshake
+- applies a timeout to every call, overridable per call
+- retries connection errors, timeouts and transient statuses (429, 5xx)
+  with exponential backoff and full jitter, except read timeouts of
+  generation requests: a slow generation would only be restarted from scratch
+- caps the requests in flight with a semaphore, matching the number of
+  requests the server processes in parallel (`OLLAMA_NUM_PARALLEL`)
+
+Responses are parsed into the `ollama` response types and error responses
+raise `ollama.ResponseError`, so callers handle them as before. Connection
+errors and timeouts that persist after the retries raise the underlying
+`httpx` exception.
+
+Async calls use one `httpx.AsyncClient` and semaphore per event loop, since
+both are bound to the loop they are used in.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+import httpx
+from ollama import ChatResponse, EmbedResponse, ListResponse, ProgressResponse, ResponseError
+from rag.metrics import OLLAMA_REQUESTS
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+
+# Marks a call that uses the client's default timeout, since None means no limit
+_DEFAULT = object()
+
+# Statuses worth retrying: the server is busy, overloaded or restarting
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Endpoints whose requests keep the server busy generating until they time
+# out, so retrying a read timeout repeats the same slow work
+GENERATION_PATHS = {"/api/chat", "/api/generate"}
+
+
+def backoff_delay(attempt: int, base: float, max_delay: float, rng=random.random) -> float:
+    """
+    Delay before retry number `attempt` (0 for the first retry), drawn
+    uniformly between 0 and an exponentially growing cap ("full jitter"),
+    so that clients failing together do not retry in lockstep.
+
+    :param attempt: Number of retries already made.
+    :param base: Cap of the first delay in seconds.
+    :param max_delay: Upper bound of the cap in seconds.
+    :param rng: Callable returning a float in [0, 1).
+    :return: Delay in seconds.
+    """
+    return rng() * min(max_delay, base * 2 ** attempt)
+
+
+def _default_parallel() -> int:
+    try:
+        return max(1, int(os.getenv("OLLAMA_NUM_PARALLEL", "")))
+    except ValueError:
+        return 4
+
+
+def _parse_host(host) -> str:
+    host = host or os.getenv("OLLAMA_HOST") or DEFAULT_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+class _Retry(Exception):
+    """
+    Raised by an attempt that failed in a way worth retrying.
+    """
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+def _transport_error(path: str, error: httpx.TransportError):
+    """
+    Wrap a transport error as retryable, unless it is a read timeout of a
+    generation request, which is returned unchanged to be raised as is.
+    """
+    if isinstance(error, httpx.ReadTimeout) and path in GENERATION_PATHS:
+        OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+        return error
+    return _Retry(error)
+
+
+def _check(response: httpx.Response):
+    """
+    Raise a ResponseError for an error response, marked as retryable when
+    the status is transient.
+    """
+    if response.is_success:
+        return
+    try:
+        message = response.json().get("error", response.text)
+    except ValueError:
+        message = response.text
+    error = ResponseError(message, response.status_code)
+    if response.status_code in RETRYABLE_STATUS:
+        raise _Retry(error)
+    raise error
+
+
+class OllamaClient:
+    """
+    Pooled, rate-limited client for the Ollama HTTP API.
+    """
+
+    def __init__(
+            self,
+            host: str | None = None,
+            timeout: float | None = 120.0,
+            connect_timeout: float = 5.0,
+            max_in_flight: int | None = None,
+            max_connections: int | None = None,
+            keep_alive: float = 60.0,
+            max_retries: int = 3,
+            backoff: float = 0.5,
+            max_backoff: float = 30.0,
+            sleep=time.sleep,
+            rng=random.random
+    ):
+        """
+        :param host: Ollama server URL. Defaults to `OLLAMA_HOST` or the local server.
+        :param timeout: Default seconds a call may wait for the server (None for no limit).
+        :param connect_timeout: Seconds allowed to open a connection.
+        :param max_in_flight: Maximum number of requests in flight. Defaults
+                              to `OLLAMA_NUM_PARALLEL`, or 4.
+        :param max_connections: Size of the connection pool. Defaults to `max_in_flight`.
+        :param keep_alive: Seconds an idle pooled connection is kept open.
+        :param max_retries: Number of times a failed request is retried.
+        :param backoff: Cap of the first retry delay in seconds, doubled on every retry.
+        :param max_backoff: Upper bound of the retry delay cap in seconds.
+        :param sleep: Function used to wait between retries.
+        :param rng: Random source of the retry jitter.
+        """
+        self.host = _parse_host(host)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_in_flight = max_in_flight or _default_parallel()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+        self._rng = rng
+        self._limits = httpx.Limits(
+            max_connections=max_connections or self.max_in_flight,
+            max_keepalive_connections=max_connections or self.max_in_flight,
+            keepalive_expiry=keep_alive,
+        )
+        self._http = httpx.Client(
+            base_url=self.host, timeout=self._timeout(timeout), limits=self._limits
+        )
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._loop_state = weakref.WeakKeyDictionary()
+
+    def _timeout(self, timeout):
+        return httpx.Timeout(timeout, connect=self.connect_timeout)
+
+    def _delay(self, attempt: int) -> float:
+        return backoff_delay(attempt, self.backoff, self.max_backoff, self._rng)
+
+    def _log_retry(self, path, attempt, error, delay):
+        logging.warning(
+            "Ollama request %s failed (attempt %d/%d): %s. Retrying in %.2f s",
+            path, attempt + 1, self.max_retries + 1, error, delay
+        )
+
+    def _send(self, path: str, payload: dict | None, timeout, parse):
+        """
+        Send one request with retries, holding a slot while it is in flight.
+        """
+        method = "GET" if payload is None else "POST"
+        timeout = self._timeout(self.timeout if timeout is _DEFAULT else timeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._slots:
+                    try:
+                        response = self._http.request(method, path, json=payload, timeout=timeout)
+                    except httpx.TransportError as e:
+                        error = _transport_error(path, e)
+                        if error is e:
+                            raise
+                        raise error from e
+                    _check(response)
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="ok")
+                return parse(response.json())
+            except _Retry as retry:
+                if attempt == self.max_retries:
+                    OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+                    raise retry.error from None
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="retry")
+                delay = self._delay(attempt)
+                self._log_retry(path, attempt, retry.error, delay)
+                self._sleep(delay)
+            except ResponseError:
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+                raise
+
+    def _stream(self, path: str, payload: dict, timeout, cls):
+        """
+        Stream a request's JSON lines. Failures are retried until the first
+        line arrives; the slot is held until the stream is consumed or closed.
+        """
+        timeout = self._timeout(self.timeout if timeout is _DEFAULT else timeout)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            with self._slots:
+                try:
+                    with self._http.stream("POST", path, json=payload, timeout=timeout) as response:
+                        if not response.is_success:
+                            response.read()
+                        _check(response)
+                        OLLAMA_REQUESTS.inc(endpoint=path, outcome="ok")
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            part = json.loads(line)
+                            if error := part.get("error"):
+                                raise ResponseError(error)
+                            started = True
+                            yield cls(**part)
+                        return
+                except (httpx.TransportError, _Retry) as e:
+                    retry = e if isinstance(e, _Retry) else _transport_error(path, e)
+                    if not isinstance(retry, _Retry):
+                        raise
+                    if started:
+                        # Part of the response was already consumed
+                        raise retry.error from None
+                except ResponseError:
+                    OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+                    raise
+
+            if attempt == self.max_retries:
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+                raise retry.error
+            OLLAMA_REQUESTS.inc(endpoint=path, outcome="retry")
+            delay = self._delay(attempt)
+            self._log_retry(path, attempt, retry.error, delay)
+            self._sleep(delay)
+
+    def embed(self, model: str, input, timeout=_DEFAULT) -> EmbedResponse:
+        """
+        Embed one text or a list of texts.
+
+        :param model: Embedding model name.
+        :param input: Text or list of texts.
+        :param timeout: Seconds allowed for this call; defaults to the client's timeout.
+        :return: The embeddings, one per input text.
+        """
+        return self._send(
+            "/api/embed", {"model": model, "input": input}, timeout, lambda r: EmbedResponse(**r)
+        )
+
+    def chat(self, model: str, messages, stream: bool = False, timeout=_DEFAULT):
+        """
+        Generate the next chat message.
+
+        :param model: Chat model name.
+        :param messages: Conversation as a list of {"role", "content"} dicts.
+        :param stream: Return an iterator of partial responses instead.
+        :param timeout: Seconds allowed for this call; defaults to the client's timeout.
+        :return: A `ChatResponse`, or an iterator of them when streaming.
+        """
+        payload = {"model": model, "messages": list(messages), "stream": stream}
+        if stream:
+            return self._stream("/api/chat", payload, timeout, ChatResponse)
+        return self._send("/api/chat", payload, timeout, lambda r: ChatResponse(**r))
+
+    def list(self, timeout=_DEFAULT) -> ListResponse:
+        """
+        :return: The models available on the server.
+        """
+        return self._send("/api/tags", None, timeout, lambda r: ListResponse(**r))
+
+    def pull(self, model: str, timeout=None) -> ProgressResponse:
+        """
+        Download a model, waiting for the download to finish.
+
+        :param model: Model name.
+        :param timeout: Seconds allowed for the download (no limit by default).
+        """
+        return self._send(
+            "/api/pull", {"model": model, "stream": False}, timeout, lambda r: ProgressResponse(**r)
+        )
+
+    def _async_state(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._loop_state:
+            self._loop_state[loop] = (
+                httpx.AsyncClient(
+                    base_url=self.host, timeout=self._timeout(self.timeout), limits=self._limits
+                ),
+                asyncio.Semaphore(self.max_in_flight),
+            )
+        return self._loop_state[loop]
+
+    async def _asend(self, path: str, payload: dict, timeout, parse):
+        """
+        Asynchronous variant of `_send`.
+        """
+        http, slots = self._async_state()
+        timeout = self._timeout(self.timeout if timeout is _DEFAULT else timeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with slots:
+                    try:
+                        response = await http.post(path, json=payload, timeout=timeout)
+                    except httpx.TransportError as e:
+                        error = _transport_error(path, e)
+                        if error is e:
+                            raise
+                        raise error from e
+                    _check(response)
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="ok")
+                return parse(response.json())
+            except _Retry as retry:
+                if attempt == self.max_retries:
+                    OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+                    raise retry.error from None
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="retry")
+                delay = self._delay(attempt)
+                self._log_retry(path, attempt, retry.error, delay)
+                await asyncio.sleep(delay)
+            except ResponseError:
+                OLLAMA_REQUESTS.inc(endpoint=path, outcome="error")
+                raise
+
+    async def aembed(self, model: str, input, timeout=_DEFAULT) -> EmbedResponse:
+        """
+        Asynchronous variant of `embed`.
+        """
+        return await self._asend(
+            "/api/embed", {"model": model, "input": input}, timeout, lambda r: EmbedResponse(**r)
+        )
+
+    async def achat(self, model: str, messages, timeout=_DEFAULT) -> ChatResponse:
+        """
+        Asynchronous variant of `chat`, without streaming.
+        """
+        payload = {"model": model, "messages": list(messages), "stream": False}
+        return await self._asend("/api/chat", payload, timeout, lambda r: ChatResponse(**r))
+
+    def close(self):
+        """
+        Close the pooled connections of the synchronous client.
+        """
+        self._http.close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """
+    :return: The client shared by the embedder and the LLM helpers,
+             created with default settings on first use.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = OllamaClient()
+        return _shared
+
+
+def configure_client(**kwargs) -> OllamaClient:
+    """
+    Replace the shared client with one created from `kwargs`
+    (see `OllamaClient`).
+
+    :return: The new shared client.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+        _shared = OllamaClient(**kwargs)
+        return _shared
@@ -0,0 +1,184 @@
+"""
+Staged producer/consumer pipeline used for ingestion.
+
+Every stage runs in its own thread and transforms an iterator of input
+items into an iterator of output items, so a stage may batch items or hold
+state across them. Consecutive stages are connected by bounded queues: a
+fast stage blocks once the next one falls `queue_size` items behind, which
+bounds memory and lets slow I/O (embedding requests) overlap with CPU work
+(PDF parsing and chunking) instead of alternating with it.
+
+Each stage counts the units it produced (pages, chunks, documents), and
+the counts and throughput are logged periodically and at the end.
+"""
+
+import logging
+import queue
+import threading
+import time
+from rag.metrics import INGESTED_ITEMS
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a pipeline.
+    """
+
+    def __init__(self, name: str, transform, unit: str = "items", size=None):
+        """
+        :param name: Stage name used in progress reports and metrics.
+        :param transform: Function taking an iterator of input items and
+                          returning an iterable of output items.
+        :param unit: Name of the unit counted in progress reports.
+        :param size: Function returning the number of units of an output
+                     item. Defaults to one unit per item.
+        """
+        self.name = name
+        self.transform = transform
+        self.unit = unit
+        self.size = size or (lambda item: 1)
+        self.count = 0
+        self.items = 0
+        self.finished_at = None
+
+
+class Pipeline:
+    """
+    Runs stages concurrently, connected by bounded queues.
+    """
+
+    def __init__(self, stages, queue_size: int = 4, report_interval: float = 10.0):
+        """
+        :param stages: Stages in processing order.
+        :param queue_size: Maximum number of items waiting between two stages.
+        :param report_interval: Seconds between progress reports (None to disable).
+        """
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.started_at = None
+        self._stop = threading.Event()
+        self._errors = []
+
+    def run(self, source) -> list:
+        """
+        Feed `source` through the stages and wait until all of them are done.
+
+        :param source: Iterable of input items of the first stage.
+        :return: The output items of the last stage, in order.
+        :raises Exception: The first error raised by a stage, after every
+                           stage has stopped.
+        """
+        self.started_at = time.perf_counter()
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(stage, iter(source) if i == 0 else self._drain(queues[i - 1]), queues[i]),
+                name=f"ingest-{stage.name}",
+                daemon=True,
+            )
+            for i, stage in enumerate(self.stages)
+        ]
+        for thread in threads:
+            thread.start()
+
+        results = []
+        last_report = time.perf_counter()
+        for item in self._drain(queues[-1]):
+            results.append(item)
+            if self.report_interval and time.perf_counter() - last_report >= self.report_interval:
+                logging.info("Ingestion progress: %s", self.progress())
+                last_report = time.perf_counter()
+
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        logging.info("Ingestion finished: %s", self.progress())
+        return results
+
+    def stats(self) -> dict:
+        """
+        :return: Per stage: units produced, unit name, seconds from the start
+                 of the run until the stage finished (or until now) and
+                 throughput in units per second.
+        """
+        now = time.perf_counter()
+        stats = {}
+        for stage in self.stages:
+            elapsed = (stage.finished_at or now) - (self.started_at or now)
+            stats[stage.name] = {
+                "count": stage.count,
+                "unit": stage.unit,
+                "seconds": round(elapsed, 3),
+                "per_second": round(stage.count / elapsed, 1) if elapsed > 0 else None,
+            }
+        return stats
+
+    def progress(self) -> str:
+        """
+        :return: One-line summary of `stats`.
+        """
+        return " | ".join(
+            f"{name} {s['count']} {s['unit']} ({s['per_second'] or 0:.1f}/s)"
+            for name, s in self.stats().items()
+        )
+
+    def _run_stage(self, stage, items, output):
+        outputs = iter(stage.transform(items))
+        try:
+            for item in outputs:
+                units = stage.size(item)
+                stage.count += units
+                stage.items += 1
+                INGESTED_ITEMS.inc(units, stage=stage.name)
+                if not self._put(output, item):
+                    return
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            # Release what a stopped generator holds, such as a process pool
+            if hasattr(outputs, "close"):
+                outputs.close()
+            stage.finished_at = time.perf_counter()
+            self._put(output, _DONE, force=True)
+
+    def _put(self, output, item, force=False) -> bool:
+        """
+        Put an item on a queue, blocking while it is full. Gives up once the
+        pipeline is stopped, except for the end marker when `force` is set.
+        """
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                output.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if force and self._stop.is_set():
+                    # Nobody may read this queue anymore; drop a pending item
+                    # so that the end marker gets through
+                    try:
+                        output.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _drain(self, source):
+        """
+        Iterate over the items of a queue until its end marker.
+        """
+        while True:
+            item = source.get()
+            if item is _DONE:
+                return
+            if self._stop.is_set():
+                # Discard the rest so that the upstream stage can finish
+                continue
+            yield item
@@ -0,0 +1,235 @@
+"""
+Reduced-precision copies of the normalized embedding matrix.
+
+A `QuantizedMatrix` stores every row either as float16 or as int8 codes with
+one float32 scale per row (row ~= codes * scale). Queries are scored block by
+block, so the full-precision matrix never has to be resident in memory; the
+float32 index on disk is only read for the rows of a rescoring shortlist.
+"""
+
+import json
+import logging
+from pathlib import Path
+import numpy as np
+from rag.scoring import top_k_indices
+from rag.storage import write_manifest_last
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+# Rows widened to float32 at a time when scoring a query: 12 MiB of
+# temporary memory at 768 dimensions, while still large enough for BLAS
+SCORE_BLOCK_ROWS = 4096
+
+
+class QuantizedMatrix:
+    """
+    Row-wise quantized matrix scored against float32 query vectors.
+    """
+
+    def __init__(self, dtype: str, codes: np.ndarray, scales: np.ndarray | None = None):
+        """
+        :param dtype: "float16" or "int8".
+        :param codes: Quantized rows.
+        :param scales: Per-row scales of int8 codes, None for float16.
+        """
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+        self.dtype = dtype
+        self.codes = codes
+        self.scales = scales
+        self.fingerprint = None
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, dtype: str, block_size: int = 65536):
+        """
+        Quantize the rows of a float32 matrix.
+
+        :param matrix: Float32 matrix, possibly memory-mapped.
+        :param dtype: "float16" or "int8".
+        :param block_size: Number of rows converted at a time.
+        :return: The quantized matrix.
+        """
+        if dtype == "float16":
+            return cls(dtype, np.asarray(matrix, dtype=np.float16))
+
+        if dtype != "int8":
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            block_scales = np.abs(block).max(axis=1) / 127
+            block_scales[block_scales == 0] = 1.0
+            codes[start:start + len(block)] = np.rint(block / block_scales[:, None])
+            scales[start:start + len(block)] = block_scales
+        return cls(dtype, codes, scales)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory taken by the codes and scales in bytes.
+        """
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query: np.ndarray, block_size: int = SCORE_BLOCK_ROWS) -> np.ndarray:
+        """
+        Approximate dot products of every row with a float32 query.
+
+        Rows are widened to float32 one block at a time, which keeps the
+        products on the BLAS path without materializing the full matrix.
+
+        :param query: Normalized float32 query vector.
+        :param block_size: Number of rows scored at a time.
+        :return: One float32 score per row.
+        """
+        n = self.codes.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, block_size):
+            block = np.asarray(self.codes[start:start + block_size], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query: np.ndarray, top_k: int, matrix: np.ndarray | None = None,
+               rescore: int = 0):
+        """
+        Return the top_k rows for a query, optionally re-ranking a shortlist
+        at full precision.
+
+        :param query: Normalized float32 query vector.
+        :param top_k: Number of results.
+        :param matrix: Full-precision matrix used for rescoring.
+        :param rescore: Size of the shortlist rescored against `matrix`, 0 to disable.
+        :return: A tuple of (row indices, scores) in descending score order.
+        """
+        scores = self.scores(query)
+        if not rescore or matrix is None:
+            best = top_k_indices(scores, top_k)
+            return best, scores[best]
+
+        # Keep the shortlist in row order so ties are still broken by index
+        shortlist = np.sort(top_k_indices(scores, max(rescore, top_k)))
+        exact = np.asarray(matrix[shortlist], dtype=np.float32) @ query
+        best = top_k_indices(exact, top_k)
+        return shortlist[best], exact[best]
+
+    def save(self, directory):
+        """
+        Persist the quantized matrix into `directory`.
+        """
+        files = [(f"embeddings_{self.dtype}.npy", lambda f: np.save(f, self.codes))]
+        if self.scales is not None:
+            files.append((f"embeddings_{self.dtype}_scales.npy", lambda f: np.save(f, self.scales)))
+        write_manifest_last(directory, files, f"embeddings_{self.dtype}.json", {
+            "dtype": self.dtype,
+            "count": int(self.codes.shape[0]),
+            "fingerprint": self.fingerprint,
+        })
+
+    @classmethod
+    def load(cls, directory, dtype: str):
+        """
+        Load a matrix written by `save` with its codes memory-mapped,
+        or return None if there is none.
+        """
+        directory = Path(directory)
+        manifest_file = directory / f"embeddings_{dtype}.json"
+        if not manifest_file.exists():
+            return None
+
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        codes = np.load(directory / f"embeddings_{dtype}.npy", mmap_mode="r")
+        scales = None
+        if dtype == "int8":
+            scales = np.load(directory / f"embeddings_{dtype}_scales.npy")
+
+        quantized = cls(dtype, codes, scales)
+        quantized.fingerprint = manifest.get("fingerprint")
+        return quantized
+
+
+def quantization_report(matrix: np.ndarray, quantized: QuantizedMatrix, queries: np.ndarray,
+                        top_k: int = 10, rescore: int = 0) -> dict:
+    """
+    Compare a quantized matrix with the float32 baseline.
+
+    :param matrix: Normalized float32 matrix.
+    :param quantized: Quantized copy of `matrix`.
+    :param queries: Normalized query vectors, one per row.
+    :param top_k: Number of results compared per query.
+    :param rescore: Shortlist size used for the rescored recall, 0 to skip it.
+    :return: Memory footprint of both matrices in bytes and the mean recall@k
+             of quantized search (with and without rescoring) against exact search.
+    """
+    def recall(rescore_size):
+        if len(queries) == 0:
+            return 1.0
+        found = 0
+        expected = 0
+        for query in queries:
+            exact = set(top_k_indices(np.asarray(matrix @ query), top_k).tolist())
+            approx, _ = quantized.search(query, top_k, matrix, rescore_size)
+            found += len(exact.intersection(approx.tolist()))
+            expected += len(exact)
+        return found / expected
+
+    report = {
+        "dtype": quantized.dtype,
+        "float32_bytes": int(matrix.shape[0] * matrix.shape[1] * 4),
+        "quantized_bytes": int(quantized.nbytes),
+        "recall_at_k": recall(0),
+    }
+    if rescore:
+        report["rescored_recall_at_k"] = recall(rescore)
+    return report
+
+
+def build_or_load_quantized(matrix, dtype: str, directory=None, fingerprint=None,
+                            rescore: int = 0, sample_queries: int = 100):
+    """
+    Load a persisted quantized matrix of the same corpus, or quantize `matrix`
+    and persist the result into `directory` when given.
+
+    After quantizing, the memory footprint and recall@10 against the float32
+    baseline are measured on a sample of rows used as queries and logged.
+
+    :param matrix: Normalized float32 embedding matrix.
+    :param dtype: "float16" or "int8".
+    :param directory: Optional directory the quantized matrix is persisted in.
+    :param fingerprint: Identifier of the corpus the matrix was built from.
+    :param rescore: Shortlist size used at query time, reported alongside.
+    :param sample_queries: Number of rows used to measure recall.
+    :return: The quantized matrix.
+    """
+    n = matrix.shape[0]
+    if directory is not None:
+        quantized = QuantizedMatrix.load(directory, dtype)
+        if quantized is not None and quantized.codes.shape[0] == n \
+                and quantized.fingerprint == fingerprint:
+            logging.info("Loaded %s embeddings from %s", dtype, directory)
+            return quantized
+
+    quantized = QuantizedMatrix.quantize(matrix, dtype)
+    quantized.fingerprint = fingerprint
+
+    rng = np.random.default_rng(0)
+    sample = np.asarray(matrix[rng.choice(n, min(sample_queries, n), replace=False)])
+    report = quantization_report(matrix, quantized, sample, rescore=rescore)
+    logging.info(
+        "Quantized embeddings to %s: %.1f MiB instead of %.1f MiB, "
+        "recall@10 on %d sample queries: %.3f%s",
+        dtype, report["quantized_bytes"] / 2**20, report["float32_bytes"] / 2**20,
+        len(sample), report["recall_at_k"],
+        f" ({report['rescored_recall_at_k']:.3f} with rescoring)" if rescore else ""
+    )
+
+    if directory is not None:
+        quantized.save(directory)
+
+    return quantized
@@ -1,15 +1,66 @@
+import asyncio
 import logging
-import pickle
-import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+from rag.ann import build_or_load_ivf
+from rag.cache import ChunkTextCache
+from rag.chunking import (
+    chunk_pages,
+    chunk_text,
+    extract_page_texts,
+    semantic_chunk_text,
+)
+from rag.docstore import DocumentStore
+from rag.pipeline import Pipeline, Stage
+from rag.quantization import build_or_load_quantized
+from rag.scoring import normalize_rows, reciprocal_rank_fusion, top_k_indices
+from rag.sparse import BM25Index, load_tfidf, save_tfidf
+from rag.metrics import CHUNKS_SCORED
+from rag.tracing import span
+from rag.storage import ChunkIndex, file_sha256, index_key, load_legacy_pickle
+
+# Settings of the per-PDF pickles written by earlier versions
+LEGACY_CHUNK_SIZE = 2000
+LEGACY_OVERLAP_RATIO = 0.15
+LEGACY_MODEL = "embeddinggemma"
+
+
+def _with_file(group, path):
+    """
+    Return the group with its chunks attributed to `path`.
+    Cached groups are matched by content, so the file may have been renamed.
+    """
+    if group["file"] == path:
+        return group
+
+    return {
+        **group,
+        "file": path,
+        "chunks": [
+            {"text": c["text"], "metadata": {**c["metadata"], "file": path}}
+            for c in group["chunks"]
+        ],
+    }
+
+
+def _read_cached_texts(index, groups):
+    """
+    Fill in the texts of chunks loaded from `index` without them.
+    Groups loaded from the index carry their row range in it.
+    """
+    texts = index.texts()
+    try:
+        for group in groups:
+            if "start" not in group:
+                continue
+            for row, chunk in enumerate(group["chunks"], group["start"]):
+                if chunk["text"] is None:
+                    chunk["text"] = texts[row]
+    finally:
+        texts.close()
 
-ROMAN_HEADER = re.compile(r"^[IVXLCDM]+\.\s+.+")
-LETTER_HEADER = re.compile(r"^[A-Z]\.\s+.+")
-NUMBER_HEADER = re.compile(r"^\d+(\.\d+)*\s+.+")
-QUESTION_HEADER = re.compile(r"^(Q\d+[:.]|\d+\.)\s+.+")
-ANSWER_HEADER = re.compile(r"^A\d+[:.]")
 
 class Retriever:
     def __init__(
@@ -20,15 +71,62 @@ class Retriever:
             chunk_size: int = 2000,
             overlap_ratio: float = 0.15,  # 10-20% recommended
             chunking_strategy: str = "basic",
-            save: bool = True
+            save: bool = True,
+            embed_batch_size: int = 32,
+            storage_dir: str = "storage",
+            ingest_workers: int = 1,
+            pages_per_task: int = 8,
+            ingest_queue_size: int = 4,
+            ann: str = "exact",
+            ann_lists: int | None = None,
+            ann_probe: int = 8,
+            ann_min_chunks: int = 10000,
+            retrieval: str = "dense",
+            fusion_candidates: int = 50,
+            fusion_k: int = 60,
+            embedding_dtype: str = "float32",
+            rescore: int = 0,
+            lazy_text: bool = False,
+            text_cache_size: int = 256
     ):
-        self.documents = []
+        self.documents = DocumentStore()
         self.chunk_size = chunk_size
+        self.overlap_ratio = overlap_ratio
         self.overlap = int(chunk_size * overlap_ratio)
         self.step = chunk_size - self.overlap
         self.chunking_strategy = chunking_strategy
         self.pdf_reader = pdf_reader
         self.save = save
+        self.embed_batch_size = embed_batch_size
+        self.storage_dir = Path(storage_dir)
+        self.ingest_workers = ingest_workers
+        self.pages_per_task = pages_per_task
+        self.ingest_queue_size = ingest_queue_size
+        self.ingest_stats = {}
+        self.embedding_matrix = None
+        self.ann = ann
+        self.ann_lists = ann_lists
+        self.ann_probe = ann_probe
+        self.ann_min_chunks = ann_min_chunks
+        self.ann_index = None
+        self.index_dir = None
+        self.corpus_fingerprint = None
+        self.retrieval = retrieval
+        self.fusion_candidates = fusion_candidates
+        self.fusion_k = fusion_k
+        self.bm25_index = None
+        self.embedding_dtype = embedding_dtype
+        self.rescore = rescore
+        self.quantized_matrix = None
+        self.lazy_text = lazy_text
+        self.text_cache_size = text_cache_size
+        self.text_cache = None
+
+        if retrieval not in ("dense", "bm25", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval}")
+
+        if embedding_dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported embedding dtype: {embedding_dtype}")
 
         if embedder:
             self.embedder = embedder
@@ -36,170 +134,545 @@ class Retriever:
         else:
             logging.warning("Embeddinggema model unavailable, falling back to TF-IDF: ")
             self.use_embbeder = False
+            # scikit-learn is only needed by the fallback and slow to import
+            from sklearn.feature_extraction.text import TfidfVectorizer
             self.vectorizer = TfidfVectorizer()
             self.tfidf_matrix = None
 
         self._load_and_embed_docs(docs_paths)
 
+        if self.use_embbeder and retrieval != "bm25":
+            self._build_ann_index()
+            self._build_quantized_matrix()
+
+        if retrieval != "dense":
+            self.bm25_index = BM25Index().build(list(self.documents.texts()))
+
+    def _build_ann_index(self):
+        """
+        Build or load the approximate nearest-neighbour index when requested.
+        Small corpora keep using the exact scan, which is both fast and exact.
+        """
+        if self.ann == "exact":
+            return
+
+        if self.ann != "ivf":
+            raise ValueError(f"Unknown ANN backend: {self.ann}")
+
+        n_chunks = len(self.documents)
+        if n_chunks < self.ann_min_chunks:
+            logging.info(
+                "Corpus has %d chunks (< %d), using exact search", n_chunks, self.ann_min_chunks
+            )
+            return
+
+        self.ann_index = build_or_load_ivf(
+            self.embedding_matrix,
+            directory=self.index_dir,
+            fingerprint=self.corpus_fingerprint,
+            n_lists=self.ann_lists,
+            n_probe=self.ann_probe
+        )
+
+    def _build_quantized_matrix(self):
+        """
+        Build or load the float16/int8 copy of the embeddings scored by the
+        exact scan when a reduced precision is requested. The IVF index, when
+        in use, keeps scoring its probed rows at full precision.
+        """
+        if self.embedding_dtype == "float32" or self.ann_index is not None or not self.documents:
+            return
+
+        self.quantized_matrix = build_or_load_quantized(
+            self.embedding_matrix,
+            self.embedding_dtype,
+            directory=self.index_dir,
+            fingerprint=self.corpus_fingerprint,
+            rescore=self.rescore
+        )
+
+    def _set_documents(self, groups, embedding_matrix=None, index=None):
+        """
+        Store the chunks of the document groups column by column in
+        `self.documents`, with continuous chunk ids.
+
+        If `index` is given (an index holding exactly these groups) and lazy
+        text loading is enabled, chunk texts are read from its text file
+        through `self.text_cache` instead of being kept in memory.
+
+        When embeddings are used, `self.embedding_matrix` becomes one contiguous,
+        L2-normalized float32 matrix so that a query is scored with a single
+        matrix-vector product. If `embedding_matrix` is given (an index opened
+        with mmap that holds exactly these groups), it is used without copying.
+        """
+        chunks = (chunk for group in groups for chunk in group["chunks"])
+
+        texts = None
+        if self.lazy_text and index is not None:
+            self.text_cache = ChunkTextCache(index.texts(), max_entries=self.text_cache_size)
+            texts = self.text_cache
+
+        if not self.use_embbeder:
+            self.documents = DocumentStore(chunks, texts=texts)
+            return
+
+        if embedding_matrix is None:
+            blocks = [g["embeddings"] for g in groups if g["chunks"]]
+            embedding_matrix = (
+                np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32)
+                if blocks else np.empty((0, 0), dtype=np.float32)
+            )
+
+        self.embedding_matrix = embedding_matrix
+        self.documents = DocumentStore(chunks, embedding_matrix, texts)
+
     def _chunk_text(self, text: str):
         """
         Yield overlapping chunks of text
         """
-        for start in range(0, len(text), self.step):
-            chunk = text[start:start + self.chunk_size]
-            if chunk.strip():
-                yield chunk
+        return chunk_text(text, self.chunk_size, self.step)
 
     def _semantic_chunk_text(self, text: str):
         """
         Chunk text using document structure such as section headers and Q&A blocks.
         Preserves hierarchical context for better retrieval accuracy.
         """
-        lines = [l.strip() for l in text.splitlines() if l.strip()]
-        chunks = []
+        return semantic_chunk_text(text)
 
-        section = {
-            "roman": None,
-            "letter": None,
-            "number": None,
-            "question": None,
+    def _load_and_embed_docs(self, docs_paths):
+        storage_dir = self.storage_dir
+        storage_dir.mkdir(exist_ok=True)
+        params = {
+            "chunking_strategy": self.chunking_strategy,
+            "chunk_size": self.chunk_size,
+            "overlap_ratio": self.overlap_ratio,
+            "model": self._embedding_model(),
         }
+        index = ChunkIndex(storage_dir / f"index_{self.chunking_strategy}_{index_key(params)}")
+
+        manifest, cached, cached_matrix = None, {}, None
+        if index.exists():
+            try:
+                manifest, cached_groups, cached_matrix = index.load(with_text=not self.lazy_text)
+                cached = {g["sha256"]: g for g in cached_groups}
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning("Ignoring unreadable index %s: %s", index.directory, e)
+
+        indexed_files = {d["file"] for d in manifest["documents"]} if manifest else set()
+        groups = []
+        migrated = []  # legacy pickles replaced by the index once it is written
+        to_extract = []  # (position in groups, path, digest)
+        for path in docs_paths:
+            digest = file_sha256(path)
+            pdf_name = Path(path).stem
+            pickle_file = storage_dir / f"{pdf_name}_{self.chunking_strategy}.pkl"
 
-        buffer = []
+            if digest in cached:
+                logging.info("Loading cached embeddings for %s", path)
+                groups.append(_with_file(cached[digest], path))
+                continue
 
-        def flush():
-            if not buffer:
-                return
+            if path not in indexed_files and self._can_migrate(pickle_file, path):
+                logging.info("Migrating legacy cache %s", pickle_file)
+                group = _with_file(load_legacy_pickle(pickle_file, pdf_name), path)
+                group["sha256"] = digest
+                if group["embeddings"] is not None or not self.use_embbeder:
+                    if not self.use_embbeder:
+                        group["embeddings"] = None
+                    else:
+                        group["embeddings"] = normalize_rows(group["embeddings"])
+                    groups.append(group)
+                    migrated.append(pickle_file)
+                    continue
 
-            header_path = [
-                h for h in section.values() if h is not None
-            ]
+            to_extract.append((len(groups), path, digest))
+            groups.append(None)
 
-            chunk_text = "\n".join(header_path + [""] + buffer)
+        # Extract, chunk and embed new or changed documents concurrently
+        if to_extract:
+            pipeline = self._ingest_pipeline()
+            for position, group in pipeline.run(to_extract):
+                groups[position] = group
+            self.ingest_stats = pipeline.stats()
 
-            chunks.append({
-                "text": chunk_text,
-                "section_path": header_path.copy()
-            })
+        self.corpus_fingerprint = index_key(
+            {**params, "documents": [g["sha256"] for g in groups]}
+        )
 
-            buffer.clear()
+        entries = [(g["sha256"], g["file"]) for g in groups]
+        unchanged = manifest is not None \
+            and entries == [(d["sha256"], d["file"]) for d in manifest["documents"]]
+        if self.lazy_text and manifest is not None and not unchanged:
+            # Cached groups were loaded without their texts, which are
+            # needed to rewrite the index or keep the corpus in memory
+            _read_cached_texts(index, groups)
+
+        if unchanged:
+            # The index holds exactly this corpus: use its mapped matrix as is
+            self._set_documents(groups, cached_matrix, index)
+            self.index_dir = index.directory
+        elif self.save and any(g["chunks"] for g in groups):
+            # Rewrite the index with the current corpus only,
+            # evicting the entries of removed or modified files
+            evicted = set(cached) - {digest for digest, _ in entries}
+            if evicted:
+                logging.info("Evicting %d stale documents from %s", len(evicted), index.directory)
+            index.write(groups, **params)
+            # The index now holds these documents; an old pickle must not be
+            # migrated again once its PDF changes. Without an embedding model
+            # the index dropped the pickle's embeddings, so it is kept.
+            for pickle_file in migrated if self.use_embbeder else ():
+                pickle_file.rename(pickle_file.with_name(pickle_file.name + ".migrated"))
+            _, groups, cached_matrix = index.load(with_text=not self.lazy_text)
+            self._set_documents(groups, cached_matrix, index)
+            self.index_dir = index.directory
+        else:
+            if self.lazy_text:
+                logging.info("Index is not saved, keeping chunk texts in memory")
+            self._set_documents(groups)
+
+        # TF-IDF fallback, unless BM25 is used instead
+        if not self.use_embbeder and self.retrieval == "dense":
+            self._fit_tfidf(
+                storage_dir / f"tfidf_{self.chunking_strategy}_{index_key(params)}"
+            )
 
-        for line in lines:
-            if ROMAN_HEADER.match(line):
-                flush()
-                section["roman"] = line
-                section["letter"] = None
-                section["number"] = None
-                section["question"] = None
+    def _can_migrate(self, pickle_file, path) -> bool:
+        """
+        Whether the per-PDF pickle written by earlier versions can stand in
+        for `path`. Those versions chunked with the default size, overlap
+        and embedding model, and semantic chunks used to stop at page breaks,
+        so other settings chunk the document again. A pickle older than its
+        PDF is stale: the PDF was edited after it was embedded.
+        """
+        if self.chunking_strategy != "basic" or self.chunk_size != LEGACY_CHUNK_SIZE \
+                or self.overlap_ratio != LEGACY_OVERLAP_RATIO \
+                or self._embedding_model() not in (None, LEGACY_MODEL):
+            return False
+        try:
+            return pickle_file.stat().st_mtime >= Path(path).stat().st_mtime
+        except OSError:
+            return False
+
+    def _fit_tfidf(self, directory):
+        """
+        Load the TF-IDF model fitted on this corpus from `directory`,
+        or fit it and persist it there when saving is enabled
+        """
+        try:
+            loaded = load_tfidf(directory, self.corpus_fingerprint)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning("Ignoring unreadable TF-IDF model %s: %s", directory, e)
+            loaded = None
+
+        if loaded is not None:
+            logging.info("Loaded TF-IDF model from %s", directory)
+            self.vectorizer, self.tfidf_matrix = loaded
+            return
+
+        self.tfidf_matrix = self.vectorizer.fit_transform(self.documents.texts())
+        if self.save:
+            save_tfidf(directory, self.vectorizer, self.tfidf_matrix, self.corpus_fingerprint)
+
+    def _embedding_model(self):
+        """
+        Name of the embedding model, used to key cached embeddings
+        """
+        if not self.use_embbeder:
+            return None
+        return getattr(self.embedder, "model", None)
+
+    def _ingest_pipeline(self):
+        """
+        Pipeline turning (position, path, sha256) tuples into
+        (position, document group) pairs, in input order:
+        extract (pages) -> chunk (chunks) -> embed (chunks, with an embedder).
+        """
+        stages = [
+            Stage("extract", self._extract_stage, "pages", lambda doc: len(doc[3])),
+            Stage("chunk", self._chunk_stage, "chunks", lambda doc: len(doc[1]["chunks"])),
+        ]
+        if self.use_embbeder:
+            stages.append(
+                Stage("embed", self._embed_stage, "chunks", lambda doc: len(doc[1]["chunks"]))
+            )
+        return Pipeline(stages, queue_size=self.ingest_queue_size)
+
+    def _extract_stage(self, docs):
+        """
+        Yield (position, path, sha256, pages) with the (page_number, text)
+        pairs of every document.
+
+        With more than one ingest worker, the pages of every document are split
+        into ranges of `pages_per_task` pages extracted by a process pool. At
+        most two tasks per worker run ahead of the oldest unfinished document,
+        and documents are yielded in input order, so the chunks (and therefore
+        chunk ids) match a serial run exactly.
+        """
+        if self.ingest_workers <= 1:
+            for position, path, digest in docs:
+                logging.info("Processing: %s", path)
+                yield position, path, digest, extract_page_texts(self.pdf_reader, path)
+            return
+
+        window = 2 * self.ingest_workers
+        with ProcessPoolExecutor(max_workers=self.ingest_workers) as pool:
+            pending = deque()  # (position, path, digest, futures)
+            for position, path, digest in docs:
+                logging.info("Processing: %s", path)
+                n_pages = len(self.pdf_reader(path).pages)
+                futures = [
+                    pool.submit(
+                        extract_page_texts, self.pdf_reader, path,
+                        first, min(first + self.pages_per_task, n_pages + 1)
+                    )
+                    for first in range(1, n_pages + 1, self.pages_per_task)
+                ]
+                pending.append((position, path, digest, futures))
+                while len(pending) > 1 and sum(len(p[3]) for p in pending) > window:
+                    yield self._collect_pages(pending.popleft())
+            while pending:
+                yield self._collect_pages(pending.popleft())
+
+    @staticmethod
+    def _collect_pages(doc):
+        position, path, digest, futures = doc
+        return position, path, digest, [page for f in futures for page in f.result()]
+
+    def _chunk_stage(self, docs):
+        """
+        Yield (position, group) with the chunks of every document.
+        """
+        for position, path, digest, pages in docs:
+            chunks = chunk_pages(path, pages, self.chunking_strategy, self.chunk_size, self.step)
+            yield position, {
+                "name": Path(path).stem,
+                "file": path,
+                "chunks": chunks,
+                "embeddings": None,
+                "sha256": digest,
+            }
+
+    def _embed_stage(self, docs):
+        """
+        Embed the chunks of the incoming groups in batches of
+        `embed_batch_size`, which may span documents, and yield every group
+        once all of its chunks are embedded, as an L2-normalized float32 matrix.
+        """
+        waiting = deque()  # (position, group) not embedded yet
+        texts, vectors = [], []
+
+        def embed(batch):
+            vectors.extend(self.embedder.embed_many(batch, batch_size=self.embed_batch_size))
+
+        def ready():
+            while waiting and len(vectors) >= len(waiting[0][1]["chunks"]):
+                position, group = waiting.popleft()
+                n = len(group["chunks"])
+                group["embeddings"] = normalize_rows(np.array(vectors[:n], dtype=np.float32)) \
+                    if n else np.empty((0, 0), dtype=np.float32)
+                del vectors[:n]
+                yield position, group
+
+        for position, group in docs:
+            waiting.append((position, group))
+            texts.extend(c["text"] for c in group["chunks"])
+            full = len(texts) - len(texts) % self.embed_batch_size
+            if full:
+                embed(texts[:full])
+                del texts[:full]
+            yield from ready()
+
+        if texts:
+            embed(texts)
+        yield from ready()
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the counters of the caches used at query time, keyed by cache name
+        """
+        stats = {}
+        if self.use_embbeder and hasattr(self.embedder, "stats"):
+            stats["query_embedding"] = self.embedder.stats()
+        if self.text_cache is not None:
+            stats["chunk_text"] = self.text_cache.stats()
+        return stats
+
+    def embed_question(self, question: str):
+        """
+        Returns the embedding of a question, or None when falling back to TF-IDF
+        """
+        if not self.use_embbeder:
+            return None
+        return self.embedder.embed(question)
 
-            elif LETTER_HEADER.match(line):
-                flush()
-                section["letter"] = line
-                section["number"] = None
-                section["question"] = None
+    def retrieve(self, question: str, top_k: int = 3):
+        """
+        Returns top_k (document, score) pairs
+        """
+        if not self.documents:
+            return []
 
-            elif QUESTION_HEADER.match(line):
-                flush()
-                section["question"] = line
+        embedding = None
+        if self._uses_dense():
+            with span("embed_query"):
+                embedding = self.embedder.embed(question)
+        return self._rank(question, embedding, top_k)
 
-            elif ANSWER_HEADER.match(line):
-                buffer.append(line)
+    def retrieve_many(self, questions: list[str], top_k: int = 3, block_size: int = 256):
+        """
+        Returns top_k (document, score) pairs for every question, in input order.
 
-            else:
-                buffer.append(line)
+        Question embeddings are requested in batches, and with exact dense or
+        TF-IDF search every block of `block_size` questions is scored against
+        all chunks with a single matrix-matrix product.
+        """
+        if not self.documents:
+            return [[] for _ in questions]
+
+        if not self._uses_dense():
+            if self.bm25_index is not None:
+                return [self._rank_by_bm25(q, top_k) for q in questions]
+            from sklearn.metrics.pairwise import cosine_similarity
+            return self._rank_many(
+                lambda start: cosine_similarity(
+                    self.vectorizer.transform(questions[start:start + block_size]),
+                    self.tfidf_matrix
+                ),
+                len(questions), top_k, block_size
+            )
 
-        flush()
-        return chunks
+        embeddings = self.embedder.embed_many(list(questions), batch_size=self.embed_batch_size)
+        if self.retrieval == "hybrid" or self.ann_index is not None \
+                or self.quantized_matrix is not None:
+            return [self._rank(q, e, top_k) for q, e in zip(questions, embeddings)]
 
-    def _load_and_embed_docs(self, docs_paths):
-        chunk_id = 0
-        storage_dir = Path("storage")
-        storage_dir.mkdir(exist_ok=True)
+        question_matrix = normalize_rows(np.array(embeddings, dtype=np.float32))
+        return self._rank_many(
+            lambda start: question_matrix[start:start + block_size] @ self.embedding_matrix.T,
+            len(questions), top_k, block_size
+        )
 
-        for path in docs_paths:
-            pdf_name = Path(path).stem
-            pickle_file = storage_dir / f"{pdf_name}_{self.chunking_strategy}.pkl"
+    def _rank_many(self, score_block, n_questions: int, top_k: int, block_size: int):
+        """
+        Rank chunks for many questions from blocks of (questions x chunks) scores
+        """
+        results = []
+        for start in range(0, n_questions, block_size):
+            for scores in score_block(start):
+                CHUNKS_SCORED.inc(len(scores), method="dense" if self.use_embbeder else "tfidf")
+                results.append([
+                    (self.documents[i], float(scores[i]))
+                    for i in top_k_indices(scores, top_k)
+                ])
+        return results
+
+    async def aretrieve(self, question: str, top_k: int = 3):
+        """
+        Asynchronous variant of `retrieve`: the question embedding request is
+        awaited (or run in a worker thread for embedders without `aembed`),
+        scoring itself is synchronous.
+        """
+        if not self.documents:
+            return []
+
+        embedding = None
+        if self._uses_dense():
+            with span("embed_query"):
+                if hasattr(self.embedder, "aembed"):
+                    embedding = await self.embedder.aembed(question)
+                else:
+                    embedding = await asyncio.to_thread(self.embedder.embed, question)
+        return self._rank(question, embedding, top_k)
 
-            # Load from storage if default chunk size
-            if pickle_file.exists() and self.chunk_size==2000:
-                logging.info("Loading cached embeddings for %s", path)
-                with open(pickle_file, "rb") as f:
-                    saved_docs = pickle.load(f)
+    def _uses_dense(self) -> bool:
+        """
+        Whether questions are scored against the embedding matrix
+        """
+        return self.use_embbeder and self.retrieval != "bm25"
 
-                # Ensure chunk_id continuity
-                for doc in saved_docs:
-                    doc["metadata"]["chunk_id"] = chunk_id
-                    chunk_id += 1
+    def _rank(self, question: str, embedding, top_k: int):
+        """
+        Rank the chunks with the configured retrieval mode
+        """
+        if embedding is None:
+            if self.bm25_index is not None:
+                return self._rank_by_bm25(question, top_k)
+            return self._rank_by_tfidf(question, top_k)
 
-                self.documents.extend(saved_docs)
-                continue
+        if self.retrieval == "hybrid":
+            return self._rank_hybrid(question, embedding, top_k)
+        return self._rank_by_embedding(embedding, top_k)
 
-            # Process Pdfs
-            logging.info("Processing and embedding: %s", path)
-            data_to_store = []
-            pdf_reader = self.pdf_reader(path)
+    def _dense_search(self, embedding, top_k: int):
+        """
+        Returns the (row indices, scores) of the top_k chunks for a question embedding
+        """
+        question_vector = normalize_rows(np.array([embedding], dtype=np.float32))[0]
+
+        if self.ann_index is not None:
+            with span("ann_search", n_probe=self.ann_index.n_probe):
+                return self.ann_index.search(self.embedding_matrix, question_vector, top_k)
+
+        if self.quantized_matrix is not None:
+            CHUNKS_SCORED.inc(len(self.documents), method=self.embedding_dtype)
+            with span("quantized_search", dtype=self.embedding_dtype, rescore=self.rescore):
+                return self.quantized_matrix.search(
+                    question_vector, top_k, self.embedding_matrix, self.rescore
+                )
+
+        CHUNKS_SCORED.inc(len(self.documents), method="dense")
+        with span("score", chunks=len(self.documents)):
+            scores = self.embedding_matrix @ question_vector
+        with span("select", top_k=top_k):
+            indices = top_k_indices(scores, top_k)
+        return indices, scores[indices]
+
+    def _rank_by_embedding(self, embedding, top_k: int):
+        """
+        Score every chunk against a question embedding and return the top_k pairs
+        """
+        indices, scores = self._dense_search(embedding, top_k)
+        return [
+            (self.documents[i], float(score)) for i, score in zip(indices, scores)
+        ]
 
-            for page_num, page in enumerate(pdf_reader.pages, start=1):
-                text = page.extract_text()
-                if not text:
-                    continue
+    def _rank_by_bm25(self, question: str, top_k: int):
+        """
+        Score the chunks sharing terms with the question with BM25 and return the top_k pairs
+        """
+        with span("bm25_search", top_k=top_k):
+            indices, scores = self.bm25_index.search(question, top_k)
+        return [
+            (self.documents[i], float(score)) for i, score in zip(indices, scores)
+        ]
 
-                if self.chunking_strategy == "semantic":
-                    chunks = self._semantic_chunk_text(text)
-                else:
-                    chunks = [{"text": c, "section_path": []} for c in self._chunk_text(text)]
-
-                for chunk in chunks:
-                    embedding = None
-                    if self.use_embbeder:
-                        embedding = self.embedder.embed(chunk["text"])
-
-                    chunk_data = {
-                        "text": chunk["text"],
-                        "embedding": embedding,
-                        "metadata": {
-                            "file": path,
-                            "page": page_num,
-                            "chunk_id": chunk_id,
-                            "section_path": chunk.get("section_path", [])
-                        }
-                    }
-
-                    data_to_store.append(chunk_data)
-                    self.documents.append(chunk_data)
-                    chunk_id += 1
-
-            if self.save and self.chunk_size==2000:
-                # Save to storage
-                with open(pickle_file, "wb") as f:
-                    pickle.dump(data_to_store, f)
-
-                logging.info("Saved embeddings to %s", pickle_file)
-
-        # TF-IDF fallback
-        if not self.use_embbeder:
-            self.tfidf_matrix = self.vectorizer.fit_transform(
-                [d["text"] for d in self.documents]
+    def _rank_hybrid(self, question: str, embedding, top_k: int):
+        """
+        Fuse the dense and BM25 candidate lists with reciprocal rank fusion
+        and return the top_k pairs, scored by their fused score
+        """
+        depth = max(top_k, self.fusion_candidates)
+        dense_indices, _ = self._dense_search(embedding, depth)
+        with span("bm25_search", top_k=depth):
+            sparse_indices, _ = self.bm25_index.search(question, depth)
+        with span("fusion", candidates=len(dense_indices) + len(sparse_indices)):
+            indices, scores = reciprocal_rank_fusion(
+                [dense_indices, sparse_indices], top_k, k=self.fusion_k
             )
+        return [
+            (self.documents[i], float(score)) for i, score in zip(indices, scores)
+        ]
 
-    def retrieve(self, question: str, top_k: int = 3):
+    def _rank_by_tfidf(self, question: str, top_k: int):
         """
-        Returns top_k (document, score) pairs
+        Score every chunk against the question's TF-IDF vector and return the top_k pairs
         """
+        from sklearn.metrics.pairwise import cosine_similarity
 
-        if self.use_embbeder:
-            question_vector = self.embedder.embed(question)
-            scores = [
-                cosine_similarity([question_vector], [d["embedding"]])[0][0] for d in self.documents
-            ]
-        else:
+        CHUNKS_SCORED.inc(len(self.documents), method="tfidf")
+        with span("tfidf_search", top_k=top_k):
             question_vector = self.vectorizer.transform([question])
             scores = cosine_similarity(question_vector, self.tfidf_matrix)[0]
-
-        ranked = sorted(
-            zip(self.documents, scores),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        return ranked[:top_k]
-    
\ No newline at end of file
+            indices = top_k_indices(scores, top_k)
+        return [(self.documents[i], float(scores[i])) for i in indices]
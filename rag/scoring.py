@@ -0,0 +1,63 @@
+"""
+Vectorized scoring helpers shared by the exact and approximate search paths.
+"""
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row of a 2D float matrix in place.
+    Zero rows are left untouched so they score 0 against any query.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Return the indices of the top_k scores in descending order.
+
+    Uses a partial selection instead of a full sort. Ties are broken by
+    ascending index, matching a stable descending sort over all scores.
+    """
+    n = len(scores)
+    top_k = min(top_k, n)
+    if top_k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if top_k < n:
+        kth = np.partition(scores, n - top_k)[n - top_k]
+        above = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)[:top_k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def reciprocal_rank_fusion(rankings, top_k: int, k: int = 60):
+    """
+    Fuse several rankings with reciprocal rank fusion.
+
+    Every ranked index scores 1 / (k + rank) summed over the rankings it
+    appears in, with ranks starting at 1. Ties are broken by ascending index.
+
+    :param rankings: Sequences of row indices, each in descending relevance.
+    :param top_k: Number of fused results.
+    :param k: Rank offset damping the weight of the first positions.
+    :return: A tuple of (row indices, fused scores) in descending score order.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, index in enumerate(ranking, start=1):
+            fused[int(index)] = fused.get(int(index), 0.0) + 1.0 / (k + rank)
+
+    indices = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    order = np.lexsort((indices, -scores))[:max(top_k, 0)]
+    return indices[order], scores[order]
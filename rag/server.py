@@ -0,0 +1,175 @@
+"""
+Long-running query server that keeps the retriever and agent resident, so the
+model check and corpus load are paid once instead of on every question.
+
+Two transports are supported:
+- HTTP/JSON: `POST /ask` with {"question": "...", "top_k": 3} returns
+  {"answer": ..., "log": ..., "error": ...}. `GET /health` returns
+  {"status": "ready"}; the server only starts listening once the corpus
+  is loaded. `GET /metrics` returns the aggregated metrics in the
+  Prometheus text format.
+- JSON lines over stdin/stdout: one request object per input line and one
+  response object per output line. A {"event": "ready"} line is written
+  before the first request is read.
+
+Answers and logs have the same content and structure as the one-shot CLI.
+"""
+
+import json
+import logging
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rag.metrics import REGISTRY
+from rag.utils.logs import structured_log
+
+logger = logging.getLogger(__name__)
+
+
+def handle_request(agent, qvalidator, request, default_top_k: int = 3) -> dict:
+    """
+    Answer one decoded request.
+
+    :param agent: Agent used to answer valid questions.
+    :param qvalidator: Validator applied before running the agent.
+    :param request: Decoded request object with "question" and optional
+                    "top_k" and "id" fields.
+    :param default_top_k: top_k used when the request does not set one.
+    :return: Response with "answer", "log" and "error" fields, echoing "id".
+    """
+    if not isinstance(request, dict) or not isinstance(request.get("question"), str):
+        response = {"answer": None, "log": None, "error": "BAD_REQUEST"}
+    else:
+        response = _answer(agent, qvalidator, request["question"],
+                           request.get("top_k", default_top_k))
+
+    if isinstance(request, dict) and "id" in request:
+        response["id"] = request["id"]
+    return response
+
+
+def _answer(agent, qvalidator, question: str, top_k: int) -> dict:
+    valid, error_code = qvalidator.validate_question(question)
+    if not valid:
+        return {
+            "answer": qvalidator.human_readable_message(error_code),
+            "log": None,
+            "error": error_code,
+        }
+
+    try:
+        answer, log = agent.run(question, top_k)
+    except Exception as e:
+        logger.exception("Failed to answer question")
+        return {"answer": None, "log": None, "error": str(e)}
+
+    return {"answer": answer, "log": structured_log(log), "error": None}
+
+
+def serve_stdio(agent, qvalidator, default_top_k: int = 3, stdin=None, stdout=None):
+    """
+    Serve JSON-lines requests from stdin until it is closed.
+
+    :param agent: Agent used to answer questions.
+    :param qvalidator: Question validator.
+    :param default_top_k: top_k used when a request does not set one.
+    :param stdin: Input stream, defaults to sys.stdin.
+    :param stdout: Output stream, defaults to sys.stdout.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    _write_line(stdout, {"event": "ready"})
+
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            response = {"answer": None, "log": None, "error": "INVALID_JSON"}
+        else:
+            response = handle_request(agent, qvalidator, request, default_top_k)
+
+        _write_line(stdout, response)
+
+
+def _write_line(stream, payload: dict):
+    stream.write(json.dumps(payload) + "\n")
+    stream.flush()
+
+
+def make_http_server(agent, qvalidator, host: str = "127.0.0.1", port: int = 8000,
+                     default_top_k: int = 3) -> ThreadingHTTPServer:
+    """
+    Create (but do not start) the HTTP server.
+
+    :param agent: Agent used to answer questions.
+    :param qvalidator: Question validator.
+    :param host: Interface to bind.
+    :param port: Port to bind, 0 for any free port.
+    :param default_top_k: top_k used when a request does not set one.
+    :return: A bound ThreadingHTTPServer; call `serve_forever()` to start it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):  # pylint: disable=arguments-renamed
+            logger.debug(fmt, *args)
+
+        def _reply(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ready"})
+            elif self.path == "/metrics":
+                body = REGISTRY.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._reply(404, {"error": "NOT_FOUND"})
+
+        def do_POST(self):
+            if self.path != "/ask":
+                self._reply(404, {"error": "NOT_FOUND"})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"null")
+            except json.JSONDecodeError:
+                self._reply(400, {"answer": None, "log": None, "error": "INVALID_JSON"})
+                return
+
+            response = handle_request(agent, qvalidator, request, default_top_k)
+            status = 400 if response["error"] == "BAD_REQUEST" else 200
+            if response["answer"] is None and status == 200:
+                status = 500
+            self._reply(status, response)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve_http(agent, qvalidator, host: str = "127.0.0.1", port: int = 8000,
+               default_top_k: int = 3):
+    """
+    Serve HTTP requests until interrupted.
+    """
+    server = make_http_server(agent, qvalidator, host, port, default_top_k)
+    bound_host, bound_port = server.server_address[:2]
+    logger.info("Server ready on http://%s:%d", bound_host, bound_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,180 @@
+"""
+Sparse lexical search over chunk texts.
+
+`BM25Index` is an inverted index: every term maps to a postings list of the
+chunks containing it and the term frequency in each. A query only visits the
+postings of its own terms, so its cost grows with the number of matching
+chunks rather than with the corpus size.
+
+The fitted TF-IDF fallback model can be persisted with `save_tfidf` and
+reloaded with `load_tfidf`, so it is only refitted when the corpus changes.
+Both import scipy and scikit-learn when called, since these are slow to
+import and only the fallback needs them.
+"""
+
+import json
+import re
+from collections import Counter
+from pathlib import Path
+import numpy as np
+from rag.metrics import CHUNKS_SCORED
+from rag.scoring import top_k_indices
+from rag.storage import write_manifest_last
+
+TFIDF_MANIFEST_FILE = "tfidf.json"
+TFIDF_IDF_FILE = "tfidf_idf.npy"
+TFIDF_MATRIX_FILE = "tfidf_matrix.npz"
+
+# Same tokens as scikit-learn's default vectorizer pattern
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase word tokens of at least two characters.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index stored as flat postings arrays.
+
+    Postings of term `t` are `doc_ids[offsets[t]:offsets[t + 1]]` with the
+    matching term frequencies in `term_freqs`, sorted by chunk id.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        :param k1: Term frequency saturation.
+        :param b: Strength of the document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.doc_ids = None
+        self.term_freqs = None
+        self.offsets = None
+        self.idf = None
+        self.length_norms = None
+        self.count = 0
+
+    def build(self, texts):
+        """
+        Tokenize the texts and build the postings lists.
+
+        :param texts: Chunk texts, indexed by position.
+        :return: The index itself.
+        """
+        vocabulary = {}
+        term_ids, doc_ids, term_freqs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, freq in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(freq)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        doc_freqs = np.bincount(term_ids, minlength=len(vocabulary))
+
+        n = len(texts)
+        average_length = lengths.mean() if n and lengths.mean() > 0 else 1.0
+
+        self.vocabulary = vocabulary
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)[order]
+        self.term_freqs = np.asarray(term_freqs, dtype=np.float32)[order]
+        self.offsets = np.concatenate([[0], np.cumsum(doc_freqs)]).astype(np.int64)
+        self.idf = np.log1p((n - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        self.length_norms = (
+            self.k1 * (1 - self.b + self.b * lengths / average_length)
+        ).astype(np.float32)
+        self.count = n
+        return self
+
+    def search(self, query: str, top_k: int):
+        """
+        Return the top_k chunks for a query, visiting only the postings of its terms.
+
+        :param query: Query text.
+        :param top_k: Number of results.
+        :return: A tuple of (row indices, scores) in descending score order.
+                 Only chunks sharing at least one term with the query are returned.
+        """
+        query_terms = Counter(
+            self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary
+        )
+        if not query_terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        docs, contributions = [], []
+        for term_id, query_freq in query_terms.items():
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            postings = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+            docs.append(postings)
+            contributions.append(
+                query_freq * self.idf[term_id] * freqs * (self.k1 + 1)
+                / (freqs + self.length_norms[postings])
+            )
+
+        candidates, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        CHUNKS_SCORED.inc(len(candidates), method="bm25")
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
+
+
+def save_tfidf(directory, vectorizer, matrix, fingerprint: str):
+    """
+    Persist a fitted TF-IDF vectorizer and its document matrix into `directory`.
+
+    The vocabulary and the manifest are stored as JSON, the IDF weights and the
+    sparse matrix as numpy/scipy files, so no pickled objects are involved.
+
+    :param directory: Directory the model is written to.
+    :param vectorizer: Fitted vectorizer with default parameters.
+    :param matrix: Sparse document-term matrix returned by `fit_transform`.
+    :param fingerprint: Identifier of the corpus the model was fitted on.
+    """
+    from scipy import sparse
+
+    write_manifest_last(directory, [
+        (TFIDF_IDF_FILE, lambda f: np.save(f, vectorizer.idf_.astype(np.float64))),
+        (TFIDF_MATRIX_FILE, lambda f: sparse.save_npz(f, sparse.csr_matrix(matrix))),
+    ], TFIDF_MANIFEST_FILE, {
+        "fingerprint": fingerprint,
+        "vocabulary": {term: int(i) for term, i in vectorizer.vocabulary_.items()},
+    }, indent=None)
+
+
+def load_tfidf(directory, fingerprint: str):
+    """
+    Load a TF-IDF model written by `save_tfidf` for the same corpus.
+
+    :param directory: Directory the model was written to.
+    :param fingerprint: Identifier of the current corpus.
+    :return: A tuple of (vectorizer, matrix), or None if there is no model
+             or it was fitted on another corpus.
+    """
+    manifest_file = Path(directory) / TFIDF_MANIFEST_FILE
+    if not manifest_file.exists():
+        return None
+
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("fingerprint") != fingerprint:
+        return None
+
+    from scipy import sparse
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(vocabulary=manifest["vocabulary"])
+    vectorizer.idf_ = np.load(Path(directory) / TFIDF_IDF_FILE)
+    matrix = sparse.load_npz(Path(directory) / TFIDF_MATRIX_FILE)
+    return vectorizer, matrix
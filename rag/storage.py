@@ -0,0 +1,351 @@
+"""
+On-disk chunk index used to cache ingested documents between runs.
+
+An index is a directory holding:
+- embeddings.npy: L2-normalized float32 matrix with one row per chunk.
+  It is opened with mmap, so loading is close to constant time and the
+  pages are shared between processes reading the same index. Without an
+  embedding model (TF-IDF fallback) it has no columns, and the index only
+  caches the extracted chunks.
+- chunks.jsonl: first and last page and section path, one JSON object per row
+- texts.bin: the UTF-8 chunk texts back to back, with their byte offsets in
+  text_offsets.npy, so a single chunk text can be read without parsing the
+  others (see `ChunkTextFile`)
+- manifest.json: format version, matrix shape, the ingestion parameters the
+  index was built with and the content hash and row range of every document
+
+Each set of ingestion parameters gets its own index directory (see
+`index_key`), and documents inside an index are matched by the SHA-256 of
+the file contents, so renamed files are reused and modified files are
+re-embedded.
+
+Files are written next to their final name and moved into place with
+`os.replace`. The manifest is removed before the other files are replaced
+and written last (see `write_manifest_last`), so readers never accept a
+partially written index: an interrupted write leaves no index at all.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+
+INDEX_VERSION = 4
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+class ChunkIndex:
+    """
+    Reads and writes a chunk index directory.
+
+    Documents are represented as groups:
+    {"name": str, "file": str, "sha256": str, "chunks": [{"text", "metadata"}],
+     "embeddings": np.ndarray}
+    where `embeddings` holds one row per chunk.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory holding the index files.
+        """
+        self.directory = Path(directory)
+
+    def exists(self) -> bool:
+        """
+        :return: True if a complete index has been written to the directory.
+        """
+        return (self.directory / MANIFEST_FILE).exists()
+
+    def load(self, with_text: bool = True):
+        """
+        Load the index with its embedding matrix memory-mapped read-only.
+
+        :param with_text: Read the chunk texts. Otherwise every chunk's "text"
+                          is None and can be read later with `texts()`.
+        :return: A tuple of (manifest, groups, embeddings), where groups are
+                 listed in index order, hold their row range as "start" and
+                 "end", and every group's embeddings are row slices of the
+                 shared matrix.
+        :raises ValueError: If the index is from another format version or
+                            its files disagree with each other.
+        """
+        with open(self.directory / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version: {manifest.get('version')}")
+
+        embeddings = np.load(self.directory / EMBEDDINGS_FILE, mmap_mode="r")
+
+        with open(self.directory / CHUNKS_FILE, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+
+        texts = self.texts()
+        try:
+            if embeddings.shape[0] != len(records) or len(records) != manifest["count"] \
+                    or len(texts) != len(records):
+                raise ValueError("Index files are inconsistent")
+
+            groups = []
+            for entry in manifest["documents"]:
+                start, end = entry["start"], entry["end"]
+                groups.append({
+                    "name": entry["name"],
+                    "file": entry["file"],
+                    "sha256": entry["sha256"],
+                    "start": start,
+                    "end": end,
+                    "chunks": [
+                        {
+                            "text": texts[row] if with_text else None,
+                            "metadata": {
+                                "file": entry["file"],
+                                "page": record["page"],
+                                "page_end": record["page_end"],
+                                "section_path": record["section_path"],
+                            },
+                        }
+                        for row, record in enumerate(records[start:end], start)
+                    ],
+                    "embeddings": embeddings[start:end],
+                })
+        finally:
+            texts.close()
+
+        return manifest, groups, embeddings
+
+    def texts(self) -> "ChunkTextFile":
+        """
+        :return: The chunk texts of the index, read on demand.
+        """
+        return ChunkTextFile(self.directory / TEXTS_FILE, self.directory / TEXT_OFFSETS_FILE)
+
+    def write(self, groups, **params):
+        """
+        Write the given document groups as a new index, replacing any
+        existing one.
+
+        :param groups: Document groups in the order they should be stored,
+                       holding at least one chunk in total. Their embeddings
+                       must already be L2-normalized, or be None for all of
+                       them when no embedding model is used, and their chunks
+                       must carry their text.
+        :param params: Extra ingestion parameters recorded in the manifest.
+        """
+        documents = []
+        start = 0
+        for group in groups:
+            end = start + len(group["chunks"])
+            documents.append({
+                "name": group["name"],
+                "file": group["file"],
+                "sha256": group["sha256"],
+                "start": start,
+                "end": end,
+            })
+            start = end
+
+        embeddings = np.concatenate([
+            np.asarray(g["embeddings"], dtype=np.float32) if g["embeddings"] is not None
+            else np.empty((len(g["chunks"]), 0), dtype=np.float32)
+            for g in groups if g["chunks"]
+        ])
+
+        manifest = {
+            "version": INDEX_VERSION,
+            "count": start,
+            "dim": int(embeddings.shape[1]),
+            "dtype": "float32",
+            "documents": documents,
+            **params,
+        }
+
+        offsets = [0]
+
+        def write_texts(f):
+            for group in groups:
+                for chunk in group["chunks"]:
+                    offsets.append(offsets[-1] + f.write(chunk["text"].encode("utf-8")))
+
+        def write_chunks(f):
+            for group in groups:
+                for chunk in group["chunks"]:
+                    f.write((json.dumps({
+                        "page": chunk["metadata"]["page"],
+                        "page_end": chunk["metadata"].get("page_end", chunk["metadata"]["page"]),
+                        "section_path": chunk["metadata"].get("section_path", []),
+                    }) + "\n").encode("utf-8"))
+
+        write_manifest_last(self.directory, [
+            (EMBEDDINGS_FILE, lambda f: np.save(f, np.ascontiguousarray(embeddings))),
+            (TEXTS_FILE, write_texts),
+            # Runs after write_texts has collected the offsets
+            (TEXT_OFFSETS_FILE, lambda f: np.save(f, np.array(offsets, dtype=np.int64))),
+            (CHUNKS_FILE, write_chunks),
+        ], MANIFEST_FILE, manifest)
+
+        logging.info("Saved index with %d chunks to %s", start, self.directory)
+
+
+class ChunkTextFile:
+    """
+    Chunk texts stored back to back in one file and read by row.
+
+    The file is memory-mapped, so reading a text costs a slice and a UTF-8
+    decode, and the operating system is free to drop pages that are not read.
+    Reads are safe from several threads.
+    """
+
+    def __init__(self, path, offsets_path):
+        """
+        :param path: File holding the UTF-8 encoded texts.
+        :param offsets_path: `.npy` file with the byte offset of every text
+                             followed by the total size.
+        """
+        self.path = Path(path)
+        self.offsets = np.load(offsets_path)
+        self._file = open(self.path, "rb")
+        size = int(self.offsets[-1])
+        # mmap cannot map an empty file
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if len(self._data) != size:
+            self.close()
+            raise ValueError(f"Text file {self.path} does not match its offsets")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self._data[start:end].decode("utf-8")
+
+    def __iter__(self):
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield self._data[start:end].decode("utf-8")
+
+    def close(self):
+        """
+        Unmap and close the file.
+        """
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
+        self._file.close()
+
+
+def file_sha256(path, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+
+    :param path: File to hash.
+    :param block_size: Number of bytes read at a time.
+    :return: Hex digest string.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_key(params: dict) -> str:
+    """
+    Derive a short, stable directory key from a set of ingestion parameters.
+
+    :param params: JSON-serializable ingestion parameters such as chunk size,
+                   overlap ratio, chunking strategy and embedding model.
+    :return: 16 hex characters identifying the parameter set.
+    """
+    encoded = json.dumps(params, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+@contextmanager
+def atomic_path(target: Path):
+    """
+    Yield a temporary path that is moved onto `target` on success
+    and removed on failure.
+    """
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        yield tmp
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, target)
+
+
+def write_manifest_last(directory, files, manifest_name: str, manifest: dict, indent=2):
+    """
+    Write a set of files described by a JSON manifest, such that a crash
+    never leaves a manifest next to files it does not describe.
+
+    The previous manifest is removed first, then every file is written to a
+    temporary path and moved into place, in the given order. The manifest
+    goes last: its presence marks the set as complete.
+
+    :param directory: Directory of the files, created if needed.
+    :param files: (file name, write) pairs, where `write(f)` writes the
+                  file content to a binary file object.
+    :param manifest_name: File name of the manifest.
+    :param manifest: JSON-serializable manifest content.
+    :param indent: JSON indentation of the manifest (None for compact).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / manifest_name).unlink(missing_ok=True)
+
+    for name, write in files:
+        with atomic_path(directory / name) as tmp:
+            with open(tmp, "wb") as f:
+                write(f)
+
+    with atomic_path(directory / manifest_name) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=indent)
+
+
+def load_legacy_pickle(pickle_file, name: str):
+    """
+    Read a per-PDF `.pkl` cache written by earlier versions into a group.
+
+    :param pickle_file: Path to the legacy pickle file.
+    :param name: Document name stored in the group.
+    :return: A group whose embeddings are a raw (not normalized) float32
+             matrix. Its "embeddings" are None if the pickle was saved
+             without embeddings.
+    """
+    with open(pickle_file, "rb") as f:
+        saved_docs = pickle.load(f)
+
+    embeddings = None
+    if saved_docs and all(d["embedding"] is not None for d in saved_docs):
+        embeddings = np.array([d["embedding"] for d in saved_docs], dtype=np.float32)
+
+    return {
+        "name": name,
+        "file": saved_docs[0]["metadata"]["file"] if saved_docs else str(pickle_file),
+        "chunks": [
+            {
+                "text": d["text"],
+                "metadata": {
+                    "file": d["metadata"]["file"],
+                    "page": d["metadata"]["page"],
+                    "page_end": d["metadata"]["page"],
+                    "section_path": d["metadata"].get("section_path", []),
+                },
+            }
+            for d in saved_docs
+        ],
+        "embeddings": embeddings,
+    }
@@ -0,0 +1,199 @@
+"""
+Lightweight tracing of the RAG pipeline.
+
+Code marks the steps worth measuring with `span(name)`:
+
+    with span("score", chunks=n) as s:
+        ...
+        s.set("top_k", top_k)
+
+Spans only record anything while a trace is active, which a `Tracer` does
+per agent run. Otherwise `span` returns a shared no-op object, so
+instrumented code costs one context variable lookup when tracing is off.
+
+Timings use `time.perf_counter_ns`. Spans nest through context variables,
+so they follow asyncio tasks and `asyncio.to_thread` calls. A finished trace
+is exported as JSON lines, one span per line, keyed by the run's `trace_id`.
+"""
+
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_trace = ContextVar("rag_trace", default=None)
+_current_span = ContextVar("rag_span", default=None)
+
+
+class Span:
+    """
+    One timed step of a trace.
+    """
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, span_id: int, parent_id, attributes: dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_ns = None
+        self.end_ns = None
+        self.attributes = attributes
+
+    def set(self, key: str, value):
+        """
+        Attach an attribute to the span.
+        """
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """
+    Spans recorded for one trace ID, in the order they were opened.
+    """
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.start_ns = time.perf_counter_ns()
+        self.spans = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def records(self) -> list[dict]:
+        """
+        :return: The finished spans as JSON-serializable dicts, with start
+                 offsets relative to the start of the trace.
+        """
+        return [
+            {
+                "trace_id": self.trace_id,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "name": s.name,
+                "start_ms": round((s.start_ns - self.start_ns) / 1e6, 3),
+                "duration_ms": round(s.duration_ms, 3),
+                "attributes": s.attributes,
+            }
+            for s in self.spans if s.end_ns is not None
+        ]
+
+
+class _SpanContext:
+    __slots__ = ("trace", "span", "token")
+
+    def __init__(self, trace: Trace, name: str, attributes: dict):
+        parent = _current_span.get()
+        with trace._lock:
+            span_id = next(trace._ids)
+            self.span = Span(name, span_id, parent.span_id if parent else None, attributes)
+            trace.spans.append(self.span)
+        self.trace = trace
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_span.set(self.span)
+        self.span.start_ns = time.perf_counter_ns()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.span.attributes["error"] = repr(exc)
+        _current_span.reset(self.token)
+        return False
+
+
+class _NoopSpan:
+    """
+    Stand-in for both the span context and the span when tracing is off.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Time a block of code as a span of the active trace.
+
+    :param name: Name of the step.
+    :param attributes: Attributes recorded with the span.
+    :return: A context manager yielding the span (or a no-op when no trace is active).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _SpanContext(trace, name, attributes)
+
+
+class Tracer:
+    """
+    Starts traces and exports the finished ones as JSON lines.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Optional JSONL file finished traces are appended to.
+        """
+        self.path = path
+        self.last_trace = None
+        self._lock = threading.Lock()
+
+    def start(self, trace_id: str) -> Trace:
+        """
+        Create a trace; spans are only recorded while it is activated.
+        """
+        return Trace(trace_id)
+
+    @contextmanager
+    def activate(self, trace: Trace):
+        """
+        Make `trace` the active trace of the current context.
+        """
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+    def finish(self, trace: Trace):
+        """
+        Export a finished trace.
+        """
+        self.last_trace = trace
+        if self.path is None:
+            return
+
+        lines = "".join(json.dumps(record) + "\n" for record in trace.records())
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    @contextmanager
+    def trace(self, trace_id: str):
+        """
+        Record and export the spans of the enclosed block as one trace.
+        """
+        trace = self.start(trace_id)
+        try:
+            with self.activate(trace):
+                yield trace
+        finally:
+            self.finish(trace)
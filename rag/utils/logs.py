@@ -0,0 +1,38 @@
+def structured_log(log: dict) -> dict:
+    """
+    Build the minimal structured log reported for an agent execution.
+
+    The format matches:
+
+    {
+        "trace_id": "...",
+        "question": "...",
+        "plan": [...],
+        "retrieval": [{"file":"a.txt","chunk_id":42,"score":0.78}],
+        "draft_tokens": ...,
+        "latency_ms": {...},
+        "cache": {"query_embedding": {"hits": ..., "misses": ...}},
+        "errors": [...]
+    }
+
+    :param log: Execution log dictionary from Agent.run()
+    :return: JSON-serializable structured log.
+    """
+    return {
+        "trace_id": log.get("trace_id"),
+        "question": log.get("question"),
+        "plan": log.get("plan"),
+        "retrieval": [
+            {
+                "file": r["file"],
+                "chunk_id": r["chunk_id"],
+                "score": r["score"],
+                "section_path": r.get("section_path", [])
+            }
+            for r in log.get("retrieval", [])
+        ],
+        "draft_tokens": log.get("draft_tokens"),
+        "latency_ms": log.get("latency_ms"),
+        "cache": log.get("cache", {}),
+        "errors": log.get("errors", []),
+    }
@@ -1,3 +1,9 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pytest
 
 # ------------------ Fakes ------------------
@@ -6,6 +12,23 @@ class FakeEmbedder:
     def embed(self, text: str):
         return [0.1] * 8  
 
+    def embed_many(self, texts, batch_size=None):
+        return [self.embed(t) for t in texts]
+
+
+class RandomEmbedder:
+    """Deterministic pseudo-random embedding per text"""
+    def __init__(self, dim=8):
+        self.dim = dim
+
+    def embed(self, text: str):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16)
+        rng = random.Random(seed)
+        return [rng.uniform(-1, 1) for _ in range(self.dim)]
+
+    def embed_many(self, texts, batch_size=None):
+        return [self.embed(t) for t in texts]
+
 
 class FakePage:
     def __init__(self, text):
@@ -28,13 +51,152 @@ def fake_pdf_reader(path):
     ])
 
 
+class OllamaStub:
+    """
+    Minimal local HTTP/1.1 server speaking the Ollama /api/embed, /api/chat
+    and /api/tags protocol. Records every request body and the client
+    address it came from, can be told to fail the next N requests, and
+    tracks the peak number of requests handled at once.
+    """
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.requests = []
+        self.clients = []
+        self.fail_next = 0
+        self.fail_status = 500
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self._send(status, body, "application/json")
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _enter(self, body):
+                with stub._lock:
+                    stub.requests.append((self.path, body))
+                    stub.clients.append(self.client_address)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    fail = stub.fail_next > 0
+                    if fail:
+                        stub.fail_next -= 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                return fail
+
+            def _exit(self):
+                with stub._lock:
+                    stub.in_flight -= 1
+
+            def do_GET(self):
+                fail = self._enter(None)
+                try:
+                    if fail:
+                        self._reply(stub.fail_status, {"error": "stub failure"})
+                    elif self.path == "/api/tags":
+                        self._reply(200, {"models": [
+                            {"model": "phi3:latest", "name": "phi3:latest"},
+                        ]})
+                    else:
+                        self._reply(404, {"error": f"unknown path {self.path}"})
+                finally:
+                    self._exit()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                fail = self._enter(body)
+                try:
+                    if fail:
+                        self._reply(stub.fail_status, {"error": "stub failure"})
+                    elif self.path == "/api/embed":
+                        inputs = body.get("input", "")
+                        inputs = [inputs] if isinstance(inputs, str) else inputs
+                        embedder = RandomEmbedder(stub.dim)
+                        self._reply(200, {
+                            "model": body.get("model"),
+                            "embeddings": [embedder.embed(t) for t in inputs],
+                        })
+                    elif self.path == "/api/chat":
+                        content = "echo: " + body["messages"][-1]["content"]
+                        if not body.get("stream", True):
+                            self._reply(200, {
+                                "model": body.get("model"),
+                                "message": {"role": "assistant", "content": content},
+                                "done": True,
+                            })
+                            return
+                        words = content.split(" ")
+                        parts = [
+                            {"model": body.get("model"),
+                             "message": {"role": "assistant", "content": w + " "}, "done": False}
+                            for w in words
+                        ] + [{"model": body.get("model"),
+                              "message": {"role": "assistant", "content": ""}, "done": True}]
+                        ndjson = "".join(json.dumps(p) + "\n" for p in parts).encode("utf-8")
+                        self._send(200, ndjson, "application/x-ndjson")
+                    elif self.path == "/api/pull":
+                        self._reply(200, {"status": "success"})
+                    else:
+                        self._reply(404, {"error": f"unknown path {self.path}"})
+                finally:
+                    self._exit()
+
+        return Handler
+
+
 # ------------------ Fixtures ------------------
 
+@pytest.fixture
+def ollama_stub():
+    stub = OllamaStub().start()
+    yield stub
+    stub.stop()
+
+
 @pytest.fixture
 def embedder():
     return FakeEmbedder()
 
 
+@pytest.fixture
+def random_embedder():
+    return RandomEmbedder()
+
+
 @pytest.fixture
 def pdf_reader():
     return fake_pdf_reader
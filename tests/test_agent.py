@@ -1,3 +1,4 @@
+import time
 import pytest
 from rag.agent import Agent
 
@@ -36,4 +37,46 @@ def test_create_prompt_and_citations(agent):
     assert sources[0]["id"] == "[1]"
     answer_with_cites = agent._add_citations("Some answer", sources)
     assert "Sources:" in answer_with_cites
-    assert "[1] a.pdf" in answer_with_cites
\ No newline at end of file
+    assert "[1] a.pdf" in answer_with_cites
+
+def fake_stream_llm(prompt):
+    for piece in ["  ", "AN", "SWER", " text", " ", "\n"]:
+        time.sleep(0.01)
+        yield piece
+
+def test_run_stream_yields_tokens_then_citations():
+    agent = Agent(FakeRetriever(), fake_llm, stream_llm=fake_stream_llm)
+    expected, _ = Agent(FakeRetriever(), lambda prompt: "  ANSWER text \n").run("Question?")
+
+    stream, log = agent.run_stream("Question?")
+    pieces = list(stream)
+
+    assert pieces[:3] == ["AN", "SWER", " text"]
+    assert pieces[-1].startswith("\n\nSources:")
+    assert "".join(pieces) == expected
+
+    latency = log["latency_ms"]
+    assert latency["time_to_first_token"] >= 5
+    assert latency["draft"] >= latency["time_to_first_token"]
+    assert latency["tokens_per_second"] > 0
+    assert latency["total"] >= latency["retrieve"]
+
+def test_run_stream_without_streaming_llm(agent):
+    answer, _ = agent.run("Question?")
+
+    stream, log = agent.run_stream("Question?")
+
+    assert "".join(stream) == answer
+    assert "time_to_first_token" in log["latency_ms"]
+
+def test_citations_show_page_ranges(agent):
+    retrieved = [
+        ({"text": "t", "metadata": {"file": "a.pdf", "page": 3, "page_end": 4, "chunk_id": 0}}, 0.9),
+        ({"text": "u", "metadata": {"file": "b.pdf", "page": 5, "chunk_id": 1}}, 0.8)
+    ]
+    prompt, sources = agent._create_prompt("Q?", retrieved)
+
+    assert "Page: 3-4" in prompt
+    citations = agent._citations_block(sources)
+    assert "[1] a.pdf (pages 3-4)" in citations
+    assert "[2] b.pdf (page 5)" in citations
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from rag.ann import IVF_MANIFEST_FILE, IVFIndex, recall_at_k
+from rag.retriever import Retriever
+from rag.scoring import normalize_rows
+
+
+@pytest.fixture
+def clustered_matrix():
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(20, 32))
+    rows = centers[rng.integers(0, 20, 2000)] + 0.3 * rng.normal(size=(2000, 32))
+    return normalize_rows(rows.astype(np.float32))
+
+
+@pytest.fixture
+def queries(clustered_matrix):
+    rng = np.random.default_rng(7)
+    noisy = clustered_matrix[:50] + 0.1 * rng.normal(size=(50, 32)).astype(np.float32)
+    return normalize_rows(noisy)
+
+
+def test_ivf_recall_against_exact_search(clustered_matrix, queries):
+    index = IVFIndex(n_lists=40, n_probe=8).build(clustered_matrix)
+
+    assert recall_at_k(clustered_matrix, index, queries, top_k=10) >= 0.9
+
+
+def test_probing_every_list_is_exact(clustered_matrix, queries):
+    index = IVFIndex(n_lists=40, n_probe=40).build(clustered_matrix)
+
+    assert recall_at_k(clustered_matrix, index, queries, top_k=10) == 1.0
+
+    indices, scores = index.search(clustered_matrix, queries[0], 5)
+    exact = clustered_matrix @ queries[0]
+    assert list(indices) == list(np.argsort(-exact, kind="stable")[:5])
+    assert np.allclose(scores, exact[indices])
+
+
+def test_ivf_save_and_load(clustered_matrix, queries, tmp_path):
+    index = IVFIndex(n_lists=16, n_probe=4).build(clustered_matrix)
+    index.fingerprint = "corpus"
+    index.save(tmp_path)
+
+    loaded = IVFIndex.load(tmp_path, n_probe=4)
+
+    assert loaded.fingerprint == "corpus"
+    assert loaded.count == len(clustered_matrix)
+    for query in queries[:5]:
+        expected, _ = index.search(clustered_matrix, query, 10)
+        actual, _ = loaded.search(clustered_matrix, query, 10)
+        assert list(actual) == list(expected)
+
+
+def test_failed_ivf_save_leaves_no_stale_manifest(clustered_matrix, tmp_path, monkeypatch):
+    index = IVFIndex(n_lists=16, n_probe=4).build(clustered_matrix)
+    index.save(tmp_path)
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, "save", crash)
+    with pytest.raises(OSError):
+        index.save(tmp_path)
+
+    assert IVFIndex.load(tmp_path) is None
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_retriever_uses_persisted_ivf_index(random_embedder, pdf_reader, simple_docs, tmp_path):
+    kwargs = dict(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        storage_dir=tmp_path / "storage",
+        ann="ivf",
+        ann_lists=2,
+        ann_probe=2,
+        ann_min_chunks=0
+    )
+    retriever = Retriever(**kwargs)
+
+    assert retriever.ann_index is not None
+    assert (retriever.index_dir / IVF_MANIFEST_FILE).exists()
+
+    reloaded = Retriever(**kwargs)
+    results = reloaded.retrieve("First page content", top_k=3)
+    exact = Retriever(**{**kwargs, "ann": "exact"}).retrieve("First page content", top_k=3)
+
+    assert [d["metadata"]["chunk_id"] for d, _ in results] == \
+        [d["metadata"]["chunk_id"] for d, _ in exact]
+
+
+def test_small_corpus_falls_back_to_exact_search(random_embedder, pdf_reader, simple_docs, tmp_path):
+    retriever = Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        save=False,
+        storage_dir=tmp_path / "storage",
+        ann="ivf"
+    )
+
+    assert retriever.ann_index is None
+    assert len(retriever.retrieve("First page content")) == 3
@@ -0,0 +1,144 @@
+import asyncio
+from rag.agent import Agent
+from rag.cache import AnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRetriever:
+    def __init__(self, vectors=None):
+        self.corpus_fingerprint = "corpus-1"
+        self.chunk_ids = [0, 1, 2]
+        self.vectors = vectors or {}
+
+    def retrieve(self, question, top_k=3):
+        return [
+            ({"text": f"text {i}", "metadata": {"file": "doc.pdf", "page": 1, "chunk_id": i}}, 0.5)
+            for i in self.chunk_ids[:top_k]
+        ]
+
+    def embed_question(self, question):
+        return self.vectors.get(question)
+
+
+class CountingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return f"ANSWER {len(self.prompts)}"
+
+
+def test_exact_hit_skips_llm():
+    llm = CountingLLM()
+    agent = Agent(FakeRetriever(), llm, answer_cache=AnswerCache())
+
+    first, first_log = agent.run("What is RAG?")
+    second, second_log = agent.run("  what is  RAG? ")
+
+    assert first == second
+    assert len(llm.prompts) == 1
+    assert first_log["cache"]["answer"]["outcome"] == "miss"
+    assert second_log["cache"]["answer"]["outcome"] == "exact"
+    assert second_log["cache"]["answer"]["hits"] == 1
+
+
+def test_different_chunk_set_misses():
+    llm = CountingLLM()
+    retriever = FakeRetriever()
+    agent = Agent(retriever, llm, answer_cache=AnswerCache())
+
+    agent.run("What is RAG?")
+    retriever.chunk_ids = [0, 1, 5]
+    _, log = agent.run("What is RAG?")
+
+    assert len(llm.prompts) == 2
+    assert log["cache"]["answer"]["outcome"] == "miss"
+
+
+def test_semantic_hit_above_threshold():
+    llm = CountingLLM()
+    retriever = FakeRetriever({
+        "What is RAG?": [1.0, 0.0],
+        "Explain RAG": [0.99, 0.1],
+        "Who wrote it?": [0.0, 1.0],
+    })
+    agent = Agent(retriever, llm, answer_cache=AnswerCache(similarity_threshold=0.95))
+
+    first, _ = agent.run("What is RAG?")
+    paraphrase, log = agent.run("Explain RAG")
+    _, other_log = agent.run("Who wrote it?")
+
+    assert paraphrase == first
+    assert log["cache"]["answer"]["outcome"] == "semantic"
+    assert other_log["cache"]["answer"]["outcome"] == "miss"
+    assert len(llm.prompts) == 2
+
+
+def test_semantic_hit_requires_the_same_chunks():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("What is X?", [1, 2, 3], "answer from chunks 1-3", question_vector=[1.0, 0.0])
+
+    assert cache.get("Define X", [7, 8, 9], question_vector=[0.99, 0.1]) == (None, "miss")
+    assert cache.get("Define X", [3, 2, 1], question_vector=[0.99, 0.1]) == \
+        ("answer from chunks 1-3", "semantic")
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = AnswerCache(ttl=10, clock=clock)
+    cache.put("q", [1, 2], "answer")
+
+    clock.now = 9
+    assert cache.get("q", [2, 1]) == ("answer", "exact")
+
+    clock.now = 10
+    assert cache.get("q", [1, 2]) == (None, "miss")
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("a", [1], "A")
+    cache.put("b", [1], "B")
+    cache.get("a", [1])
+    cache.put("c", [1], "C")
+
+    assert cache.get("a", [1])[0] == "A"
+    assert cache.get("b", [1])[0] is None
+    assert cache.get("c", [1])[0] == "C"
+
+
+def test_index_change_invalidates_cache():
+    llm = CountingLLM()
+    retriever = FakeRetriever()
+    agent = Agent(retriever, llm, answer_cache=AnswerCache())
+
+    agent.run("What is RAG?")
+    retriever.corpus_fingerprint = "corpus-2"
+    _, log = agent.run("What is RAG?")
+
+    assert len(llm.prompts) == 2
+    assert log["cache"]["answer"]["outcome"] == "miss"
+
+
+def test_stream_and_async_runs_share_cache():
+    llm = CountingLLM()
+    agent = Agent(FakeRetriever(), llm, answer_cache=AnswerCache())
+
+    answer, _ = agent.run("What is RAG?")
+    stream, log = agent.run_stream("What is RAG?")
+    streamed = "".join(stream)
+    async_answer, async_log = asyncio.run(agent.arun("What is RAG?"))
+
+    assert streamed == answer == async_answer
+    assert log["cache"]["answer"]["outcome"] == "exact"
+    assert async_log["cache"]["answer"]["outcome"] == "exact"
+    assert len(llm.prompts) == 1
@@ -0,0 +1,108 @@
+import asyncio
+import time
+import ollama
+import pytest
+from rag.agent import Agent
+from rag.cache import QueryEmbeddingCache
+from rag.embeddings import Embedder
+from rag.retriever import Retriever
+from tests.test_agent import FakeRetriever, fake_llm
+
+
+class SlowAsyncRetriever(FakeRetriever):
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aretrieve(self, question, top_k=3):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        if question == "fail":
+            raise RuntimeError("retrieval failed")
+        return self.retrieve(question, top_k)
+
+
+async def slow_allm(prompt):
+    await asyncio.sleep(0.05)
+    return "ANSWER"
+
+
+def test_arun_matches_run():
+    agent = Agent(FakeRetriever(), fake_llm)
+
+    answer, log = agent.run("Question?")
+    async_answer, async_log = asyncio.run(agent.arun("Question?"))
+
+    assert async_answer == answer
+    assert async_log.keys() == log.keys()
+    assert async_log["retrieval"] == log["retrieval"]
+    assert async_log["trace_id"] != log["trace_id"]
+
+
+def test_arun_many_bounds_concurrency_and_keeps_per_request_logs():
+    retriever = SlowAsyncRetriever()
+    agent = Agent(retriever, fake_llm, allm=slow_allm)
+    questions = [f"Question {i}?" for i in range(8)]
+
+    started = time.perf_counter()
+    results = agent.run_many(questions, max_concurrency=4)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    assert retriever.max_in_flight == 4
+    assert [log["question"] for _, log in results] == questions
+    assert len({log["trace_id"] for _, log in results}) == 8
+    for answer, log in results:
+        assert answer.startswith("ANSWER")
+        assert log["latency_ms"]["retrieve"] >= 40
+        assert log["latency_ms"]["draft"] >= 40
+    # Queueing time behind the semaphore is not attributed to a request. Two
+    # waves of 4 take about 2 request durations, so the totals add up to about
+    # 4x the elapsed time, or 6x if the second wave counted its wait. The
+    # ratio holds however slow the machine is.
+    assert sum(log["latency_ms"]["total"] for _, log in results) < 5 * elapsed_ms
+
+
+def test_arun_many_reports_failures_per_question():
+    agent = Agent(SlowAsyncRetriever(), fake_llm, allm=slow_allm)
+
+    results = agent.run_many(["Question?", "fail"])
+
+    assert results[0][0].startswith("ANSWER")
+    assert results[1][0] is None
+    assert results[1][1]["errors"] == ["retrieval failed"]
+
+
+def test_async_embedder_and_cache(ollama_stub):
+    embedder = Embedder(
+        client=ollama.Client(host=ollama_stub.url),
+        async_client=ollama.AsyncClient(host=ollama_stub.url)
+    )
+    cache = QueryEmbeddingCache(embedder)
+
+    async def embed_twice():
+        return await cache.aembed("What is RAG?"), await cache.aembed("What is RAG?")
+
+    first, second = asyncio.run(embed_twice())
+
+    assert first == second == embedder.embed("What is RAG?")
+    assert cache.stats()["hits"] == 1
+    assert len(ollama_stub.requests) == 2  # one async miss, one sync comparison
+
+
+def test_aretrieve_matches_retrieve(random_embedder, pdf_reader, simple_docs, tmp_path):
+    retriever = Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        save=False,
+        storage_dir=tmp_path / "storage"
+    )
+
+    expected = retriever.retrieve("First page content")
+    actual = asyncio.run(retriever.aretrieve("First page content"))
+
+    assert [(d["metadata"]["chunk_id"], s) for d, s in actual] == \
+        [(d["metadata"]["chunk_id"], s) for d, s in expected]
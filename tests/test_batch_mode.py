@@ -0,0 +1,87 @@
+import asyncio
+import io
+import json
+import pytest
+from rag.agent import Agent
+from rag.cli import answer_questions_file
+from rag.retriever import Retriever
+from rag.utils.validator import QValidator
+from tests.test_agent import FakeRetriever, fake_llm
+
+QUESTIONS = ["First page content", "second page", "What is on page two?", "content"]
+
+
+class BatchRetriever(FakeRetriever):
+    def __init__(self):
+        self.batches = []
+
+    def retrieve(self, question, top_k=3):
+        raise AssertionError("questions should be retrieved in one batch")
+
+    def retrieve_many(self, questions, top_k=3):
+        self.batches.append(list(questions))
+        return [FakeRetriever.retrieve(self, q, top_k) for q in questions]
+
+
+class ConcurrencyLLM:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, prompt):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.02)
+        self.in_flight -= 1
+        return "ANSWER"
+
+
+def _ranking(results):
+    return [(d["metadata"]["chunk_id"], round(s, 5)) for d, s in results]
+
+
+@pytest.mark.parametrize("use_embedder", [True, False])
+def test_retrieve_many_matches_retrieve(random_embedder, pdf_reader, simple_docs, tmp_path, use_embedder):
+    retriever = Retriever(
+        embedder=random_embedder if use_embedder else None,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        storage_dir=tmp_path / "storage",
+    )
+
+    batched = retriever.retrieve_many(QUESTIONS, top_k=3, block_size=3)
+
+    assert [_ranking(r) for r in batched] == \
+        [_ranking(retriever.retrieve(q, top_k=3)) for q in QUESTIONS]
+
+
+def test_run_batch_retrieves_once_and_bounds_llm_concurrency():
+    retriever = BatchRetriever()
+    allm = ConcurrencyLLM()
+    agent = Agent(retriever, fake_llm, allm=allm)
+    questions = [f"Question {i}?" for i in range(10)]
+
+    results = agent.run_batch(questions, top_k=2, max_concurrency=3)
+
+    assert retriever.batches == [questions]
+    assert allm.max_in_flight == 3
+    assert [log["question"] for _, log in results] == questions
+    assert all(answer.startswith("ANSWER") for answer, _ in results)
+    assert all(len(log["retrieval"]) == 2 for _, log in results)
+
+
+def test_answer_questions_file_writes_one_line_per_question():
+    agent = Agent(BatchRetriever(), fake_llm)
+    questions = ["What is RAG?", "?", "How are chunks scored?"]
+    out = io.StringIO()
+
+    answer_questions_file(agent, QValidator(), questions, out, top_k=2)
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [line["question"] for line in lines] == questions
+    assert lines[0]["answer"].startswith("ANSWER")
+    assert lines[0]["errors"] == [] and len(lines[0]["retrieval"]) == 2
+    assert lines[1]["answer"] == QValidator().human_readable_message("NO_SEMANTIC_CONTENT")
+    assert lines[1]["errors"] == ["NO_SEMANTIC_CONTENT"]
+    assert set(lines[0]) == set(lines[1])
@@ -0,0 +1,29 @@
+from benchmarks.bench_retriever import compare_to_baseline, run_benchmark
+
+
+def test_benchmark_reports_every_metric():
+    result = run_benchmark(300, dim=16, n_queries=5)
+
+    assert result["chunks"] == 300
+    assert result["ingest_chunks_per_second"] > 0
+    assert result["load_seconds"] > 0
+    assert set(result["query_ms"]) == {"p50", "p95", "p99"}
+    assert result["query_ms"]["p50"] <= result["query_ms"]["p99"]
+    assert result["peak_rss_mb"] > 0
+
+
+def test_compare_to_baseline_flags_regressions():
+    def results(query_p95):
+        return {"results": [{
+            "chunks": 1000,
+            "ingest_seconds": 1.0,
+            "load_seconds": 0.1,
+            "query_ms": {"p50": 1.0, "p95": query_p95, "p99": 3.0},
+            "peak_rss_mb": 100.0,
+        }]}
+
+    rows, regressions = compare_to_baseline(results(2.5), results(2.0), tolerance=0.1)
+
+    assert len(rows) == 6
+    assert [r["metric"] for r in regressions] == ["query_ms.p95"]
+    assert regressions[0]["ratio"] == 1.25
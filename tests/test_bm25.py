@@ -0,0 +1,110 @@
+import math
+from collections import Counter
+import numpy as np
+import pytest
+from rag.retriever import Retriever
+from rag.scoring import reciprocal_rank_fusion
+from rag.sparse import BM25Index, tokenize
+
+TEXTS = [
+    "the cat sat on the mat",
+    "the dog chased the cat around the yard",
+    "retrieval augmented generation answers questions",
+    "dense retrieval uses embeddings, sparse retrieval uses terms",
+    "",
+]
+
+
+def reference_bm25(texts, query, k1=1.5, b=0.75):
+    docs = [Counter(tokenize(t)) for t in texts]
+    lengths = [sum(d.values()) for d in docs]
+    average = sum(lengths) / len(docs)
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for term in tokenize(query):
+            df = sum(term in d for d in docs)
+            if not df or term not in doc:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            tf = doc[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+        scores.append(score)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["cat", "the cat", "retrieval uses terms", "Cat CAT yard"])
+def test_scores_match_reference(query):
+    index = BM25Index().build(TEXTS)
+    expected = reference_bm25(TEXTS, query)
+
+    indices, scores = index.search(query, top_k=len(TEXTS))
+
+    matching = [i for i, s in enumerate(expected) if s > 0]
+    assert sorted(indices.tolist()) == matching
+    for i, score in zip(indices, scores):
+        assert score == pytest.approx(expected[i], rel=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_only_matching_chunks_are_returned():
+    index = BM25Index().build(TEXTS)
+
+    indices, _ = index.search("embeddings", top_k=3)
+    assert indices.tolist() == [3]
+
+    indices, scores = index.search("unknown words", top_k=3)
+    assert len(indices) == 0 and len(scores) == 0
+
+
+def test_reciprocal_rank_fusion():
+    indices, scores = reciprocal_rank_fusion([[3, 1, 2], [1, 4]], top_k=3, k=60)
+
+    assert indices.tolist() == [1, 3, 4]
+    assert scores[0] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores.tolist()[1:] == pytest.approx([1 / 61, 1 / 62])
+
+
+def test_bm25_retrieval_without_embedder(pdf_reader, simple_docs, tmp_path):
+    retriever = Retriever(
+        embedder=None,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=50,
+        save=False,
+        storage_dir=str(tmp_path),
+        retrieval="bm25"
+    )
+
+    results = retriever.retrieve("second", top_k=10)
+
+    assert retriever.tfidf_matrix is None
+    assert results
+    assert all("Second" in doc["text"] for doc, _ in results)
+
+
+def test_hybrid_retrieval_fuses_dense_and_sparse(random_embedder, pdf_reader, simple_docs, tmp_path):
+    kwargs = dict(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=50,
+        storage_dir=str(tmp_path),
+    )
+    dense = Retriever(**kwargs)
+    hybrid = Retriever(retrieval="hybrid", **kwargs)
+    question = "second page content"
+
+    dense_ids = [d["metadata"]["chunk_id"] for d, _ in dense.retrieve(question, top_k=len(dense.documents))]
+    sparse_ids, _ = hybrid.bm25_index.search(question, len(dense.documents))
+    expected, expected_scores = reciprocal_rank_fusion([dense_ids, sparse_ids], top_k=3)
+
+    results = hybrid.retrieve(question, top_k=3)
+
+    assert [d["metadata"]["chunk_id"] for d, _ in results] == expected.tolist()
+    assert np.allclose([s for _, s in results], expected_scores)
+
+
+def test_unknown_retrieval_mode(pdf_reader, simple_docs):
+    with pytest.raises(ValueError):
+        Retriever(None, pdf_reader, simple_docs, save=False, retrieval="fuzzy")
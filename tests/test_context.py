@@ -0,0 +1,106 @@
+from rag import cli
+from rag.agent import Agent
+from rag.chunking import chunk_text, semantic_chunk_pages
+from rag.context import estimate_tokens, merge_chunks, pack_context, strip_overlap
+from tests.test_agent import FakeRetriever, fake_llm
+
+
+def chunk(text, chunk_id, file="a.pdf", page=1, page_end=None, section_path=()):
+    return {
+        "text": text,
+        "metadata": {
+            "file": file,
+            "page": page,
+            "page_end": page if page_end is None else page_end,
+            "section_path": list(section_path),
+            "chunk_id": chunk_id,
+        },
+    }
+
+
+def test_strip_overlap():
+    assert strip_overlap("the quick brown fox jumps over the lazy dog",
+                         "fox jumps over the lazy dog and runs") == " and runs"
+    assert strip_overlap("no shared text here", "something else entirely") == "something else entirely"
+    assert strip_overlap("abc", "") == ""
+
+
+def test_overlapping_basic_chunks_merge_into_the_original_text():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = list(chunk_text(text, chunk_size=300, step=255))
+    retrieved = [(chunk(c, i), 1.0 - i / 10) for i, c in reversed(list(enumerate(chunks)))]
+
+    [passage] = merge_chunks(retrieved)
+
+    assert passage["text"] == text
+    assert passage["chunk_ids"] == list(range(len(chunks)))
+    assert passage["score"] == 1.0
+
+
+def test_semantic_chunks_merge_without_repeated_headers():
+    pages = [(3, "I. Intro\nA. First\nfirst body\nB. Second\nsecond body")]
+    chunks = [
+        chunk(c["text"], i, page=c["page"], section_path=c["section_path"])
+        for i, c in enumerate(semantic_chunk_pages(pages))
+    ]
+
+    [passage] = merge_chunks([(chunks[0], 0.5), (chunks[1], 0.9)])
+
+    assert passage["text"] == "I. Intro\nA. First\n\nfirst body\nB. Second\n\nsecond body"
+    assert passage["text"].count("I. Intro") == 1
+    assert passage["score"] == 0.9
+
+
+def test_chunks_of_other_pages_or_files_stay_separate():
+    retrieved = [
+        (chunk("one", 0), 0.9),
+        (chunk("two", 1, page=2), 0.8),
+        (chunk("three", 2, file="b.pdf"), 0.7),
+        (chunk("four", 5), 0.6),
+    ]
+
+    passages = merge_chunks(retrieved)
+
+    assert [p["text"] for p in passages] == ["one", "two", "three", "four"]
+
+
+def test_budget_trims_least_relevant_passages_first():
+    retrieved = [
+        (chunk("best " * 100, 0), 0.9),
+        (chunk("middle " * 100, 10), 0.8),
+        (chunk("worst " * 100, 20), 0.7),
+    ]
+    best_tokens = estimate_tokens("best " * 100)
+
+    passages, trimmed = pack_context(retrieved, max_tokens=best_tokens + 50)
+
+    assert [p["chunk_ids"] for p in passages] == [[0], [10]]
+    assert passages[0]["text"] == "best " * 100
+    assert estimate_tokens(passages[1]["text"]) <= 50
+    assert passages[1]["text"].startswith("middle")
+    assert trimmed == 2
+
+    passages, trimmed = pack_context(retrieved, max_tokens=best_tokens + 10)
+    assert [p["chunk_ids"] for p in passages] == [[0]]
+    assert trimmed == 2
+
+
+def test_prompt_respects_the_context_budget():
+    retrieved = [(chunk(f"chunk {i} " + "x" * 2000, i * 10), 1 - i / 10) for i in range(5)]
+    unlimited, _ = Agent(FakeRetriever(), fake_llm)._create_prompt("Q?", retrieved)
+    prompt, sources = Agent(FakeRetriever(), fake_llm, context_tokens=800)._create_prompt("Q?", retrieved)
+
+    assert estimate_tokens(prompt) < 900 < estimate_tokens(unlimited)
+    assert [s["id"] for s in sources] == ["[1]", "[2]"]
+    assert "chunk 0" in prompt and "chunk 1" in prompt and "chunk 2" not in prompt
+
+
+def test_default_budget_fits_the_default_configuration():
+    # top_k 3 of 2000-character chunks from different pages
+    retrieved = [(chunk(f"chunk {i} " + "x" * 1992, i * 10), 1 - i / 10) for i in range(3)]
+    agent = Agent(FakeRetriever(), fake_llm, context_tokens=cli.DEFAULT_CONTEXT_TOKENS)
+
+    prompt, sources = agent._create_prompt("Q?", retrieved)
+
+    assert len(sources) == 3
+    assert all(("x" * 1992) in prompt.split(f"chunk {i} ")[1] for i in range(3))
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from rag.docstore import DocumentStore
+from rag.retriever import Retriever
+
+
+def make_chunks():
+    return [
+        {"text": "alpha", "metadata": {"file": "a.pdf", "page": 1, "section_path": ["I. Intro"]}},
+        {"text": "beta", "metadata": {"file": "a.pdf", "page": 1, "page_end": 2, "section_path": ["I. Intro"]}},
+        {"text": "", "metadata": {"file": "b.pdf", "page": 3, "section_path": []}},
+        {"text": "γάμμα", "metadata": {"file": "b.pdf", "page": 4}},
+    ]
+
+
+def test_store_materializes_chunk_dicts():
+    embeddings = np.eye(4, dtype=np.float32)
+    store = DocumentStore(make_chunks(), embeddings)
+
+    assert len(store) == 4
+    assert list(store.texts()) == ["alpha", "beta", "", "γάμμα"]
+    second = store[1]
+    assert second["text"] == "beta"
+    assert np.array_equal(second["embedding"], embeddings[1])
+    assert second["metadata"] == {
+        "file": "a.pdf", "page": 1, "page_end": 2, "section_path": ["I. Intro"], "chunk_id": 1,
+    }
+    assert store[-1]["metadata"] == {
+        "file": "b.pdf", "page": 4, "page_end": 4, "section_path": [], "chunk_id": 3,
+    }
+    assert [d["text"] for d in store[1:3]] == ["beta", ""]
+    assert store[np.int64(0)]["text"] == "alpha"
+
+    with pytest.raises(IndexError):
+        store[4]
+
+
+def test_store_interns_files_and_sections():
+    store = DocumentStore(make_chunks())
+
+    assert store.files == ["a.pdf", "b.pdf"]
+    assert store.sections == [("I. Intro",), ()]
+    assert store.file_ids.tolist() == [0, 0, 1, 1]
+    assert store.section_ids.tolist() == [0, 0, 1, 1]
+    assert store[0]["embedding"] is None
+
+
+def test_materialized_views_do_not_alias_the_store():
+    store = DocumentStore(make_chunks())
+
+    view = store[0]
+    view["metadata"]["section_path"].append("changed")
+    view["metadata"]["file"] = "other.pdf"
+
+    assert store[0]["metadata"]["section_path"] == ["I. Intro"]
+    assert store[1]["metadata"]["file"] == "a.pdf"
+
+
+def test_store_rejects_mismatched_embeddings():
+    with pytest.raises(ValueError):
+        DocumentStore(make_chunks(), np.zeros((3, 2), dtype=np.float32))
+
+
+def test_retriever_keeps_columns_and_embedding_rows(embedder, pdf_reader, simple_docs, tmp_path):
+    retriever = Retriever(
+        embedder=embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=50,
+        storage_dir=tmp_path / "storage"
+    )
+
+    store = retriever.documents
+    assert isinstance(store, DocumentStore)
+    assert store.embeddings is retriever.embedding_matrix
+    assert sorted(store.files) == sorted(simple_docs)
+
+    results = retriever.retrieve("first page", top_k=2)
+    for doc, _ in results:
+        chunk_id = doc["metadata"]["chunk_id"]
+        assert doc["text"] == store.text(chunk_id)
+        assert np.array_equal(doc["embedding"], retriever.embedding_matrix[chunk_id])
@@ -0,0 +1,78 @@
+import ollama
+import pytest
+from rag.embeddings import Embedder
+from rag.ollama_client import OllamaClient
+from rag.retriever import Retriever
+
+
+@pytest.fixture
+def stub_embedder(ollama_stub):
+    return Embedder(client=ollama.Client(host=ollama_stub.url))
+
+
+def retrying_embedder(ollama_stub, max_retries=3):
+    client = OllamaClient(host=ollama_stub.url, max_retries=max_retries, sleep=lambda delay: None)
+    return Embedder(client=client)
+
+
+def test_embed_many_batches_requests(stub_embedder, ollama_stub):
+    texts = [f"text {i}" for i in range(10)]
+
+    embeddings = stub_embedder.embed_many(texts, batch_size=4)
+
+    assert len(embeddings) == 10
+    assert len(ollama_stub.requests) == 3
+    assert [len(body["input"]) for _, body in ollama_stub.requests] == [4, 4, 2]
+    assert embeddings[7] == stub_embedder.embed("text 7")
+
+
+def test_embed_many_relies_on_client_retries(ollama_stub):
+    ollama_stub.fail_next = 2
+
+    embeddings = retrying_embedder(ollama_stub).embed_many(["a", "b", "c"], batch_size=2)
+
+    assert len(embeddings) == 3
+    # two failures on the first batch, then one request per batch
+    assert len(ollama_stub.requests) == 4
+
+
+def test_embed_many_gives_up_with_the_client(ollama_stub):
+    ollama_stub.fail_next = 5
+
+    with pytest.raises(ollama.ResponseError):
+        retrying_embedder(ollama_stub, max_retries=1).embed_many(["a", "b"])
+
+    assert len(ollama_stub.requests) == 2
+
+
+def test_embed_many_does_not_retry_client_errors(stub_embedder, ollama_stub):
+    ollama_stub.fail_next = 1
+    ollama_stub.fail_status = 404
+
+    with pytest.raises(ollama.ResponseError):
+        stub_embedder.embed_many(["a", "b"])
+
+    assert len(ollama_stub.requests) == 1
+
+
+def test_ingestion_embeds_across_documents_in_batches(stub_embedder, ollama_stub, pdf_reader, tmp_path):
+    docs = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_text("placeholder")
+        docs.append(str(path))
+
+    retriever = Retriever(
+        embedder=stub_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=docs,
+        chunk_size=20,
+        overlap_ratio=0.2,
+        save=False,
+        embed_batch_size=16
+    )
+
+    n_chunks = len(retriever.documents)
+    assert n_chunks > 16
+    assert len(ollama_stub.requests) == -(-n_chunks // 16)
+    assert all(d["embedding"] is not None for d in retriever.documents)
@@ -0,0 +1,113 @@
+from pathlib import Path
+import pytest
+from rag.cache import ChunkTextCache
+from rag.retriever import Retriever
+from rag.storage import ChunkIndex
+from tests.conftest import FakePdf
+
+
+def file_pdf_reader(path):
+    """Two pages whose text comes from the file itself."""
+    text = Path(path).read_text(encoding="utf-8")
+    return FakePdf([f"{text} first page.", f"{text} second page, ünïcode."])
+
+
+@pytest.fixture
+def text_docs(tmp_path):
+    docs = []
+    for i in range(3):
+        path = tmp_path / f"text{i}.pdf"
+        path.write_text(f"Document number {i} talks about topic {i}", encoding="utf-8")
+        docs.append(str(path))
+    return docs
+
+
+def make_retriever(embedder, docs, storage_dir, **kwargs):
+    return Retriever(
+        embedder=embedder,
+        pdf_reader=file_pdf_reader,
+        docs_paths=docs,
+        chunk_size=40,
+        storage_dir=storage_dir,
+        **kwargs
+    )
+
+
+def texts_of(retriever):
+    return [retriever.documents.text(i) for i in range(len(retriever.documents))]
+
+
+def test_text_file_reads_rows(tmp_path):
+    chunks = ["alpha", "", "γάμμα", "delta"]
+    group = {
+        "name": "doc", "file": "doc.pdf", "sha256": "0",
+        "chunks": [{"text": t, "metadata": {"file": "doc.pdf", "page": 1}} for t in chunks],
+        "embeddings": [[1.0, 0.0]] * len(chunks),
+    }
+    index = ChunkIndex(tmp_path / "index")
+    index.write([group])
+
+    texts = index.texts()
+    assert len(texts) == 4
+    assert [texts[i] for i in range(4)] == chunks
+    assert list(texts) == chunks
+    texts.close()
+
+    _, [loaded], _ = index.load(with_text=False)
+    assert all(c["text"] is None for c in loaded["chunks"])
+    assert (loaded["start"], loaded["end"]) == (0, 4)
+
+
+def test_chunk_text_cache_evicts_least_recently_used():
+    reads = []
+
+    class Source(list):
+        def __getitem__(self, row):
+            reads.append(row)
+            return super().__getitem__(row)
+
+    cache = ChunkTextCache(Source(["a", "b", "c"]), max_entries=2)
+
+    assert [cache[0], cache[1], cache[0], cache[2], cache[1]] == ["a", "b", "a", "c", "b"]
+    assert reads == [0, 1, 2, 1]
+    assert cache.stats() == {"hits": 1, "misses": 4, "size": 2}
+
+
+def test_lazy_retriever_matches_eager(random_embedder, text_docs, tmp_path):
+    storage_dir = tmp_path / "storage"
+    eager = make_retriever(random_embedder, text_docs, storage_dir)
+    lazy = make_retriever(random_embedder, text_docs, storage_dir, lazy_text=True, text_cache_size=4)
+
+    assert lazy.documents._buffer == ""
+    assert texts_of(lazy) == texts_of(eager)
+
+    question = "Document number 1 talks about topic 1"
+    results = lazy.retrieve(question, top_k=3)
+    assert [(d["text"], s) for d, s in results] == \
+        [(d["text"], s) for d, s in eager.retrieve(question, top_k=3)]
+
+    hits = lazy.cache_stats()["chunk_text"]["hits"]
+    lazy.retrieve(question, top_k=3)
+    assert lazy.cache_stats()["chunk_text"]["hits"] == hits + 3
+
+
+def test_lazy_retriever_keeps_cached_texts_when_corpus_changes(random_embedder, text_docs, tmp_path):
+    storage_dir = tmp_path / "storage"
+    make_retriever(random_embedder, text_docs, storage_dir, lazy_text=True)
+    Path(text_docs[1]).write_text("Edited document", encoding="utf-8")
+
+    lazy = make_retriever(random_embedder, text_docs, storage_dir, lazy_text=True)
+    fresh = make_retriever(random_embedder, text_docs, tmp_path / "fresh")
+
+    assert texts_of(lazy) == texts_of(fresh)
+    assert any("Edited document" in t for t in texts_of(lazy))
+
+
+def test_lazy_retriever_without_saving_keeps_texts_in_memory(random_embedder, text_docs, tmp_path):
+    storage_dir = tmp_path / "storage"
+    make_retriever(random_embedder, text_docs, storage_dir)
+
+    lazy = make_retriever(random_embedder, text_docs[:2], storage_dir, lazy_text=True, save=False)
+
+    assert lazy.text_cache is None
+    assert all(text for text in texts_of(lazy))
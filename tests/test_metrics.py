@@ -0,0 +1,117 @@
+import threading
+import pytest
+from rag.agent import Agent
+from rag.cache import AnswerCache
+from rag.metrics import (
+    CACHE_REQUESTS,
+    CHUNKS_SCORED,
+    LLM_SECONDS,
+    REQUEST_SECONDS,
+    RETRIEVAL_SECONDS,
+    MetricsRegistry,
+)
+from rag.retriever import Retriever
+from tests.test_agent import fake_llm
+
+
+def _count(histogram):
+    return histogram.snapshot()[2]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    cumulative, total, count = histogram.snapshot()
+    assert cumulative == [2, 3, 4]
+    assert total == pytest.approx(2.65)
+    assert count == 4
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(0.5)
+    counter = registry.counter("cache_requests_total", "Lookups", ("cache", "outcome"))
+    counter.inc(cache="answer", outcome="hit")
+    counter.inc(2, cache="answer", outcome="miss")
+
+    assert registry.render().splitlines() == [
+        "# HELP cache_requests_total Lookups",
+        "# TYPE cache_requests_total counter",
+        'cache_requests_total{cache="answer",outcome="hit"} 1',
+        'cache_requests_total{cache="answer",outcome="miss"} 2',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 0',
+        'latency_seconds_bucket{le="1.0"} 1',
+        'latency_seconds_bucket{le="+Inf"} 1',
+        "latency_seconds_sum 0.5",
+        "latency_seconds_count 1",
+    ]
+
+
+def test_registry_returns_existing_metrics():
+    registry = MetricsRegistry()
+
+    assert registry.counter("a_total", "A") is registry.counter("a_total", "A")
+    with pytest.raises(ValueError):
+        registry.histogram("a_total", "A")
+
+
+def test_concurrent_recording_loses_nothing():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("h", "H")
+    counter = registry.counter("c_total", "C")
+
+    def record():
+        for _ in range(10000):
+            histogram.observe(0.001)
+            counter.inc()
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert _count(histogram) == 80000
+    assert counter.value() == 80000
+
+
+def test_write_to_file(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("c_total", "C").inc()
+
+    registry.write(tmp_path / "metrics.prom")
+
+    assert "c_total 1" in (tmp_path / "metrics.prom").read_text()
+
+
+def test_agent_runs_record_metrics(random_embedder, pdf_reader, simple_docs, tmp_path):
+    retriever = Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        storage_dir=tmp_path / "storage",
+    )
+    agent = Agent(retriever, fake_llm, answer_cache=AnswerCache())
+    before = {
+        "request": _count(REQUEST_SECONDS),
+        "retrieval": _count(RETRIEVAL_SECONDS),
+        "llm": _count(LLM_SECONDS),
+        "scored": CHUNKS_SCORED.value(method="dense"),
+        "hits": CACHE_REQUESTS.value(cache="answer", outcome="exact"),
+    }
+
+    agent.run("What is on the first page?")
+    agent.run("What is on the first page?")
+
+    assert _count(REQUEST_SECONDS) - before["request"] == 2
+    assert _count(RETRIEVAL_SECONDS) - before["retrieval"] == 2
+    assert _count(LLM_SECONDS) - before["llm"] == 1
+    assert CHUNKS_SCORED.value(method="dense") - before["scored"] == 2 * len(retriever.documents)
+    assert CACHE_REQUESTS.value(cache="answer", outcome="exact") - before["hits"] == 1
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import httpx
+import ollama
+import pytest
+from rag import llm
+from rag.embeddings import Embedder
+from rag.ollama_client import OllamaClient, backoff_delay, configure_client
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+@pytest.fixture
+def client(ollama_stub, sleeps):
+    client = OllamaClient(host=ollama_stub.url, max_in_flight=2, backoff=0.5,
+                          sleep=sleeps.append, rng=lambda: 1.0)
+    yield client
+    client.close()
+
+
+def test_backoff_delay_grows_exponentially_with_jitter():
+    assert [backoff_delay(a, 0.5, 3.0, rng=lambda: 1.0) for a in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+    assert backoff_delay(3, 0.5, 3.0, rng=lambda: 0.25) == 0.75
+    assert all(0 <= backoff_delay(2, 1.0, 60.0) < 4.0 for _ in range(100))
+
+
+def test_requests_reuse_pooled_connections(client, ollama_stub):
+    for i in range(5):
+        response = client.embed(model="m", input=[f"text {i}", "other"])
+        assert len(response.embeddings) == 2
+
+    assert len(ollama_stub.requests) == 5
+    assert len(set(ollama_stub.clients)) == 1
+
+
+def test_transient_failures_are_retried_with_backoff(client, ollama_stub, sleeps):
+    ollama_stub.fail_next = 2
+
+    response = client.chat(model="phi3", messages=[{"role": "user", "content": "hi"}])
+
+    assert response.message.content == "echo: hi"
+    assert len(ollama_stub.requests) == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_client_errors_are_not_retried(client, ollama_stub, sleeps):
+    ollama_stub.fail_next = 1
+    ollama_stub.fail_status = 404
+
+    with pytest.raises(ollama.ResponseError) as excinfo:
+        client.embed(model="m", input="x")
+
+    assert excinfo.value.status_code == 404
+    assert len(ollama_stub.requests) == 1
+    assert sleeps == []
+
+
+def test_gives_up_after_max_retries(ollama_stub, sleeps):
+    client = OllamaClient(host=ollama_stub.url, max_retries=1, sleep=sleeps.append)
+    ollama_stub.fail_next = 5
+
+    with pytest.raises(ollama.ResponseError):
+        client.list()
+
+    assert len(ollama_stub.requests) == 2
+    assert len(sleeps) == 1
+
+
+def test_per_call_timeout(client, ollama_stub):
+    ollama_stub.delay = 0.3
+    client.max_retries = 0
+
+    with pytest.raises(httpx.TimeoutException):
+        client.embed(model="m", input="x", timeout=0.05)
+    assert client.embed(model="m", input="x").embeddings
+
+
+def test_generation_read_timeouts_are_not_retried(client, ollama_stub, sleeps):
+    ollama_stub.delay = 0.3
+    messages = [{"role": "user", "content": "hi"}]
+
+    with pytest.raises(httpx.ReadTimeout):
+        client.chat(model="phi3", messages=messages, timeout=0.05)
+    with pytest.raises(httpx.ReadTimeout):
+        list(client.chat(model="phi3", messages=messages, stream=True, timeout=0.05))
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client.achat(model="phi3", messages=messages, timeout=0.05))
+    assert len(ollama_stub.requests) == 3
+    assert sleeps == []
+
+    # Embedding requests are short, so a timeout there is still retried
+    with pytest.raises(httpx.ReadTimeout):
+        client.embed(model="m", input="x", timeout=0.05)
+    assert len(ollama_stub.requests) == 3 + client.max_retries + 1
+
+
+def test_semaphore_caps_requests_in_flight(client, ollama_stub):
+    ollama_stub.delay = 0.05
+    threads = [
+        threading.Thread(target=client.embed, kwargs={"model": "m", "input": str(i)})
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(ollama_stub.requests) == 8
+    assert ollama_stub.max_in_flight == 2
+
+
+def test_async_calls_are_capped_too(client, ollama_stub):
+    ollama_stub.delay = 0.05
+
+    async def main():
+        return await asyncio.gather(*[
+            client.achat(model="phi3", messages=[{"role": "user", "content": str(i)}])
+            for i in range(6)
+        ])
+
+    responses = asyncio.run(main())
+
+    assert [r.message.content for r in responses] == [f"echo: {i}" for i in range(6)]
+    assert ollama_stub.max_in_flight == 2
+
+
+def test_streamed_chat_yields_parts(client):
+    parts = list(client.chat(model="phi3", messages=[{"role": "user", "content": "a b"}], stream=True))
+
+    assert "".join(p.message.content for p in parts) == "echo: a b "
+    assert parts[-1].done
+
+
+def test_embedder_and_llm_use_the_shared_client(ollama_stub):
+    configure_client(host=ollama_stub.url, max_retries=0)
+    try:
+        embedder = Embedder(model="m")
+        assert len(embedder.embed("question")) == ollama_stub.dim
+        assert len(asyncio.run(embedder.aembed("question"))) == ollama_stub.dim
+        assert llm.run_llm("hello") == "echo: hello"
+        assert "".join(llm.stream_llm("hello")) == "echo: hello "
+        assert asyncio.run(llm.arun_llm("hello")) == "echo: hello"
+    finally:
+        configure_client()
+
+    assert [path for path, _ in ollama_stub.requests] == \
+        ["/api/embed", "/api/embed", "/api/chat", "/api/chat", "/api/chat"]
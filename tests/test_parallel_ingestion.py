@@ -0,0 +1,38 @@
+import pytest
+from rag.retriever import Retriever
+from tests.conftest import FakePdf
+
+PAGES = [
+    f"I. SECTION {i}\nBody of page {i} with some words to chunk.\nQ{i}: A question?\nAn answer."
+    for i in range(1, 12)
+] + [""]
+
+
+def multi_page_pdf_reader(path):
+    """Module-level so that worker processes can unpickle it"""
+    return FakePdf(PAGES)
+
+
+@pytest.mark.parametrize("strategy", ["basic", "semantic"])
+@pytest.mark.parametrize("pages_per_task", [1, 5])
+def test_parallel_ingestion_matches_serial(embedder, simple_docs, tmp_path, strategy, pages_per_task):
+    second = tmp_path / "doc1.pdf"
+    second.write_text("another document")
+    docs = simple_docs + [str(second)]
+
+    kwargs = dict(
+        embedder=embedder,
+        pdf_reader=multi_page_pdf_reader,
+        docs_paths=docs,
+        chunk_size=30,
+        chunking_strategy=strategy,
+        save=False,
+        storage_dir=tmp_path / "storage"
+    )
+    serial = Retriever(**kwargs)
+    parallel = Retriever(**kwargs, ingest_workers=2, pages_per_task=pages_per_task)
+
+    assert len(parallel.documents) == len(serial.documents)
+    for d1, d2 in zip(serial.documents, parallel.documents):
+        assert d1["text"] == d2["text"]
+        assert d1["metadata"] == d2["metadata"]
@@ -0,0 +1,122 @@
+import threading
+import time
+import pytest
+from rag.metrics import INGESTED_ITEMS
+from rag.pipeline import Pipeline, Stage
+from rag.retriever import Retriever
+
+
+def test_stages_run_in_order_and_report_throughput():
+    def double(items):
+        for x in items:
+            yield 2 * x
+
+    def pairs(items):
+        batch = []
+        for x in items:
+            batch.append(x)
+            if len(batch) == 2:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    before = INGESTED_ITEMS.value(stage="pairs")
+    pipeline = Pipeline([
+        Stage("double", double),
+        Stage("pairs", pairs, "numbers", size=len),
+    ], queue_size=1)
+
+    assert pipeline.run(range(5)) == [[0, 2], [4, 6], [8]]
+
+    stats = pipeline.stats()
+    assert stats["double"]["count"] == 5
+    assert stats["pairs"] == {**stats["pairs"], "count": 5, "unit": "numbers"}
+    assert stats["pairs"]["seconds"] >= stats["double"]["seconds"]
+    assert INGESTED_ITEMS.value(stage="pairs") - before == 5
+
+
+def test_full_queue_pauses_the_producer():
+    produced = []
+    release = threading.Event()
+
+    def produce(items):
+        for x in items:
+            produced.append(x)
+            yield x
+
+    def consume(items):
+        release.wait(5)
+        yield from items
+
+    pipeline = Pipeline([Stage("produce", produce), Stage("consume", consume)], queue_size=2)
+    runner = threading.Thread(target=pipeline.run, args=(range(100),))
+    runner.start()
+    time.sleep(0.2)
+
+    # Two items wait in the queue and a third one is blocked on `put`
+    assert len(produced) == 3
+    release.set()
+    runner.join(5)
+    assert len(produced) == 100
+
+
+def test_stage_errors_stop_the_pipeline():
+    seen = []
+
+    def source(items):
+        for x in items:
+            seen.append(x)
+            yield x
+
+    def fail(items):
+        for x in items:
+            if x == 3:
+                raise ValueError("bad item")
+            yield x
+
+    pipeline = Pipeline([Stage("source", source), Stage("fail", fail)], queue_size=1)
+
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run(range(10_000))
+    assert len(seen) < 10_000
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.batches = []
+
+    def embed_many(self, texts, batch_size=None):
+        self.batches.append(len(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_retriever_batches_across_documents_and_records_stage_stats(pdf_reader, tmp_path):
+    docs = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_text(f"document {i}")
+        docs.append(str(path))
+    embedder = CountingEmbedder()
+
+    retriever = Retriever(
+        embedder=embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=docs,
+        chunk_size=30,
+        embed_batch_size=4,
+        save=False,
+        storage_dir=tmp_path / "storage",
+        ingest_queue_size=1
+    )
+
+    n_chunks = len(retriever.documents)
+    assert sum(embedder.batches) == n_chunks
+    assert all(size % 4 == 0 for size in embedder.batches[:-1])
+    assert [d["metadata"]["file"] for d in retriever.documents] == \
+        sorted(d["metadata"]["file"] for d in retriever.documents)
+
+    stats = retriever.ingest_stats
+    assert list(stats) == ["extract", "chunk", "embed"]
+    assert stats["extract"]["count"] == 6  # two pages per document
+    assert stats["chunk"]["count"] == stats["embed"]["count"] == n_chunks
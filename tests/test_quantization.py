@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from rag.quantization import QuantizedMatrix, quantization_report
+from rag.retriever import Retriever
+from rag.scoring import normalize_rows
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(42)
+    return normalize_rows(rng.normal(size=(3000, 64)).astype(np.float32))
+
+
+@pytest.fixture
+def queries(matrix):
+    rng = np.random.default_rng(7)
+    noisy = matrix[:50] + 0.5 * rng.normal(size=(50, 64)).astype(np.float32)
+    return normalize_rows(noisy)
+
+
+@pytest.mark.parametrize("dtype, ratio", [("float16", 2), ("int8", 3.5)])
+def test_memory_footprint_and_recall(matrix, queries, dtype, ratio):
+    quantized = QuantizedMatrix.quantize(matrix, dtype)
+
+    report = quantization_report(matrix, quantized, queries, top_k=10, rescore=50)
+
+    assert report["float32_bytes"] == matrix.nbytes
+    assert report["float32_bytes"] / report["quantized_bytes"] >= ratio
+    assert report["recall_at_k"] >= 0.9
+    assert report["rescored_recall_at_k"] == 1.0
+
+
+def test_int8_scores_are_close_to_float32(matrix, queries):
+    quantized = QuantizedMatrix.quantize(matrix, "int8", block_size=1000)
+
+    assert np.allclose(quantized.scores(queries[0], block_size=700), matrix @ queries[0], atol=0.02)
+
+
+def test_rescoring_returns_full_precision_scores(matrix, queries):
+    quantized = QuantizedMatrix.quantize(matrix, "int8")
+
+    indices, scores = quantized.search(queries[0], 5, matrix, rescore=100)
+
+    exact = matrix @ queries[0]
+    assert list(indices) == list(np.argsort(-exact, kind="stable")[:5])
+    assert np.allclose(scores, exact[indices])
+
+
+def test_save_and_load(matrix, queries, tmp_path):
+    quantized = QuantizedMatrix.quantize(matrix, "int8")
+    quantized.fingerprint = "corpus"
+    quantized.save(tmp_path)
+
+    loaded = QuantizedMatrix.load(tmp_path, "int8")
+
+    assert loaded.fingerprint == "corpus"
+    assert isinstance(loaded.codes, np.memmap)
+    assert np.array_equal(loaded.scores(queries[0]), quantized.scores(queries[0]))
+    assert QuantizedMatrix.load(tmp_path, "float16") is None
+
+
+def test_failed_save_leaves_no_stale_manifest(matrix, tmp_path, monkeypatch):
+    quantized = QuantizedMatrix.quantize(matrix, "int8")
+    quantized.save(tmp_path)
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, "save", crash)
+    with pytest.raises(OSError):
+        quantized.save(tmp_path)
+
+    assert QuantizedMatrix.load(tmp_path, "int8") is None
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_retriever_with_quantized_embeddings(random_embedder, pdf_reader, simple_docs, tmp_path, dtype):
+    kwargs = dict(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        storage_dir=tmp_path / "storage",
+    )
+    exact = Retriever(**kwargs).retrieve("First page content", top_k=3)
+    retriever = Retriever(embedding_dtype=dtype, rescore=10, **kwargs)
+
+    results = retriever.retrieve("First page content", top_k=3)
+
+    assert retriever.quantized_matrix is not None
+    assert (retriever.index_dir / f"embeddings_{dtype}.npy").exists()
+    assert [d["metadata"]["chunk_id"] for d, _ in results] == \
+        [d["metadata"]["chunk_id"] for d, _ in exact]
+    assert [s for _, s in results] == pytest.approx([s for _, s in exact])
@@ -0,0 +1,105 @@
+import pytest
+from rag import cli
+from rag.agent import Agent
+from rag.cache import QueryEmbeddingCache
+from rag.retriever import Retriever
+
+
+class CountingEmbedder:
+    def __init__(self, embedder, model="test-model"):
+        self.embedder = embedder
+        self.model = model
+        self.calls = []
+
+    def embed(self, text):
+        self.calls.append(text)
+        return self.embedder.embed(text)
+
+    def embed_many(self, texts, batch_size=None):
+        return self.embedder.embed_many(texts)
+
+
+@pytest.fixture
+def counting(random_embedder):
+    return CountingEmbedder(random_embedder)
+
+
+def test_memory_tier_hits_and_misses(counting):
+    cache = QueryEmbeddingCache(counting)
+
+    first = cache.embed("What is RAG?")
+    second = cache.embed("  What   is RAG?\n")
+
+    assert first == second
+    assert counting.calls == ["What is RAG?"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_tier_evicts_least_recently_used(counting):
+    cache = QueryEmbeddingCache(counting, max_entries=2)
+
+    cache.embed("a question")
+    cache.embed("b question")
+    cache.embed("a question")
+    cache.embed("c question")  # evicts "b question"
+    cache.embed("b question")
+
+    assert counting.calls == ["a question", "b question", "c question", "b question"]
+    assert cache.stats()["size"] == 2
+
+
+def test_disk_tier_persists_across_instances(counting, tmp_path):
+    path = tmp_path / "cache" / "queries.sqlite3"
+    first = QueryEmbeddingCache(counting, path=path)
+    expected = first.embed("What is RAG?")
+    first.close()
+
+    second = QueryEmbeddingCache(counting, path=path)
+    embedding = second.embed("What is RAG?")
+
+    assert len(counting.calls) == 1
+    assert embedding == pytest.approx(expected, abs=1e-6)
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_is_keyed_by_model(random_embedder, tmp_path):
+    path = tmp_path / "queries.sqlite3"
+    QueryEmbeddingCache(CountingEmbedder(random_embedder, "model-a"), path=path).embed("question")
+
+    other = CountingEmbedder(random_embedder, "model-b")
+    QueryEmbeddingCache(other, path=path).embed("question")
+
+    assert other.calls == ["question"]
+
+
+def test_agent_log_reports_cache_counters(counting, pdf_reader, simple_docs, tmp_path):
+    cache = QueryEmbeddingCache(counting)
+    retriever = Retriever(
+        embedder=cache,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        save=False,
+        storage_dir=tmp_path / "storage"
+    )
+    agent = Agent(retriever, lambda prompt: "ANSWER")
+
+    agent.run("First page content")
+    _, log = agent.run("First page content")
+
+    assert log["cache"]["query_embedding"]["hits"] == 1
+    assert log["cache"]["query_embedding"]["misses"] == 1
+
+
+def test_unwritable_cache_path_keeps_the_cache_in_memory(embedder, tmp_path):
+    blocker = tmp_path / "storage"
+    blocker.write_text("a file where the storage directory should be")
+
+    cache = cli.query_embedding_cache(embedder, 8, str(blocker / "query_embeddings.sqlite3"))
+
+    assert cache.embedder is embedder
+    assert cache._db is None
+    cache.embed("question")
+    assert cache.embed("question") == cache.embed("question")
+    assert cache.stats()["hits"] == 2
@@ -1,4 +1,6 @@
+import numpy as np
 import pytest
+from sklearn.metrics.pairwise import cosine_similarity
 from rag.retriever import Retriever
 
 @pytest.fixture
@@ -54,3 +56,42 @@ def test_chunk_overlap(retriever):
 
     for i in range(1, len(texts)):
         assert texts[i-1][-overlap_len:] in texts[i]
+
+def _reference_retrieve(retriever, question, top_k):
+    """Per-chunk cosine similarity followed by a full sort"""
+    question_vector = retriever.embedder.embed(question)
+    scores = [
+        cosine_similarity([question_vector], [d["embedding"]])[0][0] for d in retriever.documents
+    ]
+    ranked = sorted(zip(retriever.documents, scores), key=lambda x: x[1], reverse=True)
+    return ranked[:top_k]
+
+@pytest.mark.parametrize("top_k", [1, 3, 100])
+def test_matrix_retrieve_matches_reference(random_embedder, pdf_reader, simple_docs, top_k):
+    r = Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        overlap_ratio=0.2,
+        save=False
+    )
+    for question in ["First page content", "Second page", "unrelated question"]:
+        expected = _reference_retrieve(r, question, top_k)
+        results = r.retrieve(question, top_k)
+
+        assert [d["metadata"]["chunk_id"] for d, _ in results] == \
+            [d["metadata"]["chunk_id"] for d, _ in expected]
+        for (_, score), (_, expected_score) in zip(results, expected):
+            assert score == pytest.approx(expected_score, abs=1e-5)
+
+def test_retrieve_ties_keep_document_order(retriever):
+    results = retriever.retrieve("First page content", top_k=3)
+    assert [d["metadata"]["chunk_id"] for d, _ in results] == [0, 1, 2]
+
+def test_embedding_matrix_is_normalized_float32(retriever):
+    matrix = retriever.embedding_matrix
+    assert matrix.dtype == np.float32
+    assert matrix.flags["C_CONTIGUOUS"]
+    assert matrix.shape == (len(retriever.documents), 8)
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
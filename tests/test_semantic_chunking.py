@@ -1,5 +1,7 @@
 import pytest
+from rag.chunking import semantic_chunk_pages, semantic_chunk_text
 from rag.retriever import Retriever
+from tests.conftest import FakePdf
 
 
 @pytest.fixture
@@ -102,4 +104,63 @@ def test_question_creates_new_chunk(semantic_retriever, semantic_text):
         c for c in chunks if any(h.startswith("Q") for h in c["section_path"])
     ]
 
-    assert len(question_chunks) == 2
\ No newline at end of file
+    assert len(question_chunks) == 2
+
+def test_section_continues_across_page_break():
+    pages = [
+        (1, "I. INTRODUCTION\nIntro starts here\nQ1: What is it?\nThe answer begins"),
+        (2, "and continues on page two.\nQ2: Next?\nShort answer."),
+        (3, ""),
+        (4, "II. METHODS\nMethods text."),
+    ]
+
+    chunks = list(semantic_chunk_pages(pages))
+
+    assert [c["section_path"] for c in chunks] == [
+        ["I. INTRODUCTION"],
+        ["I. INTRODUCTION", "Q1: What is it?"],
+        ["I. INTRODUCTION", "Q2: Next?"],
+        ["II. METHODS"],
+    ]
+    assert chunks[1]["text"].endswith("The answer begins\nand continues on page two.")
+    assert [(c["page"], c["page_end"]) for c in chunks] == [(1, 1), (1, 2), (2, 2), (4, 4)]
+
+
+def test_header_levels_are_classified_in_priority_order():
+    text = "C. Roman hundred\nB. Letter\n3. Numbered question\nQ4: Question\nA4: Answer"
+
+    chunks = semantic_chunk_text(text)
+
+    assert chunks == [{
+        "text": "C. Roman hundred\nB. Letter\nQ4: Question\n\nA4: Answer",
+        "section_path": ["C. Roman hundred", "B. Letter", "Q4: Question"],
+    }]
+
+
+def test_semantic_chunks_span_pages_in_the_index(embedder, tmp_path):
+    doc = tmp_path / "doc.pdf"
+    doc.write_text("doc")
+
+    def reader(path):
+        return FakePdf(["I. PART\nFirst half of a body", "second half of the body.\nII. NEXT\nMore."])
+
+    retriever = Retriever(
+        embedder=embedder,
+        pdf_reader=reader,
+        docs_paths=[str(doc)],
+        chunking_strategy="semantic",
+        storage_dir=tmp_path / "storage",
+    )
+    reloaded = Retriever(
+        embedder=embedder,
+        pdf_reader=reader,
+        docs_paths=[str(doc)],
+        chunking_strategy="semantic",
+        storage_dir=tmp_path / "storage",
+    )
+
+    for documents in (retriever.documents, reloaded.documents):
+        assert len(documents) == 2
+        assert documents[0]["metadata"]["page"] == 1
+        assert documents[0]["metadata"]["page_end"] == 2
+        assert documents[1]["metadata"]["section_path"] == ["II. NEXT"]
@@ -0,0 +1,106 @@
+import io
+import json
+import threading
+import urllib.request
+import pytest
+from rag.agent import Agent
+from rag.server import handle_request, make_http_server, serve_stdio
+from rag.utils.logs import structured_log
+from rag.utils.validator import QValidator
+from tests.test_agent import FakeRetriever, fake_llm
+
+
+@pytest.fixture
+def agent():
+    return Agent(FakeRetriever(), fake_llm)
+
+
+@pytest.fixture
+def http_server(agent):
+    server = make_http_server(agent, QValidator(), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://%s:%d" % server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+def _post(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), method="POST",
+        headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _without_run_fields(log):
+    log = dict(log)
+    for key in ("trace_id", "latency_ms"):
+        log.pop(key)
+    return log
+
+
+def test_handle_request_matches_cli_output(agent):
+    answer, log = agent.run("What is RAG?", 2)
+
+    response = handle_request(agent, QValidator(), {"question": "What is RAG?", "top_k": 2, "id": 7})
+
+    assert response["id"] == 7
+    assert response["error"] is None
+    assert response["answer"] == answer
+    assert _without_run_fields(response["log"]) == _without_run_fields(structured_log(log))
+
+
+def test_handle_request_reports_validation_errors(agent):
+    response = handle_request(agent, QValidator(), {"question": "?"})
+
+    assert response["error"] == "NO_SEMANTIC_CONTENT"
+    assert response["answer"] == QValidator().human_readable_message("NO_SEMANTIC_CONTENT")
+    assert response["log"] is None
+
+
+def test_stdio_protocol(agent):
+    stdin = io.StringIO(
+        '{"id": 1, "question": "What is RAG?"}\n'
+        "\n"
+        "not json\n"
+        '{"id": 2, "question": "Explain TF-IDF", "top_k": 1}\n'
+    )
+    stdout = io.StringIO()
+
+    serve_stdio(agent, QValidator(), stdin=stdin, stdout=stdout)
+
+    lines = [json.loads(l) for l in stdout.getvalue().splitlines()]
+    assert lines[0] == {"event": "ready"}
+    assert lines[1]["id"] == 1 and len(lines[1]["log"]["retrieval"]) == 3
+    assert lines[2]["error"] == "INVALID_JSON"
+    assert lines[3]["id"] == 2 and len(lines[3]["log"]["retrieval"]) == 1
+
+
+def test_http_health_and_ask(http_server):
+    with urllib.request.urlopen(http_server + "/health") as response:
+        assert json.loads(response.read()) == {"status": "ready"}
+
+    status, body = _post(http_server + "/ask", {"question": "What is RAG?"})
+    assert status == 200
+    assert body["answer"].startswith("ANSWER")
+    assert body["log"]["plan"] == ["retrieve", "draft", "cite"]
+
+    status, body = _post(http_server + "/ask", {"top_k": 2})
+    assert status == 400
+    assert body["error"] == "BAD_REQUEST"
+
+
+def test_http_metrics_endpoint(http_server):
+    _post(http_server + "/ask", {"question": "What is RAG?"})
+
+    with urllib.request.urlopen(http_server + "/metrics") as response:
+        text = response.read().decode("utf-8")
+
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert "# TYPE rag_request_seconds histogram" in text
+    assert 'rag_retrieval_seconds_bucket{le="+Inf"}' in text
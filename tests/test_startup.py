@@ -0,0 +1,84 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from rag import cli, ollama_client
+from rag.ollama_client import OllamaClient
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["numpy", "scipy", "sklearn", "PyPDF2", "ollama", "httpx", "pydantic"]
+
+# Generous bound: the CLI module itself imports in a few milliseconds,
+# while importing the retriever eagerly took well over a second
+MAX_IMPORT_SECONDS = 0.5
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def test_cli_import_skips_heavy_modules():
+    result = run_python("-c", "import json, sys, rag.cli; print(json.dumps(sorted(sys.modules)))")
+    loaded = {name.split(".")[0] for name in json.loads(result.stdout)}
+
+    assert loaded.isdisjoint(HEAVY_MODULES), sorted(loaded & set(HEAVY_MODULES))
+
+
+def test_cli_import_time():
+    result = run_python("-X", "importtime", "-c", "import rag.cli")
+    # Lines read "import time: self [us] | cumulative | module"
+    timings = {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[1].strip().isdigit()
+    }
+
+    assert timings["rag.cli"] / 1e6 < MAX_IMPORT_SECONDS
+
+
+def test_ensure_models_pulls_missing_models_and_writes_manifest(ollama_stub, tmp_path):
+    manifest = tmp_path / "storage" / "models.json"
+    client = OllamaClient(host=ollama_stub.url, max_retries=0)
+
+    cli.ensure_models(client, manifest_path=str(manifest))
+
+    assert [path for path, _ in ollama_stub.requests] == ["/api/tags", "/api/pull"]
+    assert ollama_stub.requests[1][1]["model"] == "embeddinggemma:latest"
+    assert cli.models_from_manifest(str(manifest))
+
+
+def test_models_from_manifest_requires_every_model(tmp_path):
+    manifest = tmp_path / "models.json"
+
+    assert not cli.models_from_manifest(str(manifest))
+    manifest.write_text(json.dumps({"models": ["phi3:latest"]}))
+    assert not cli.models_from_manifest(str(manifest))
+    manifest.write_text("not json")
+    assert not cli.models_from_manifest(str(manifest))
+
+
+def test_trusted_manifest_skips_the_server(tmp_path, monkeypatch):
+    manifest = tmp_path / "models.json"
+    manifest.write_text(json.dumps({"models": cli.REQUIRED_MODELS}))
+    monkeypatch.setattr(cli, "MODEL_MANIFEST", str(manifest))
+    # wait_for_models replaces the shared client: start from none, so that the
+    # current one is neither closed nor replaced for later tests
+    monkeypatch.setattr(ollama_client, "_shared", None)
+
+    checks = []
+    monkeypatch.setattr(cli, "ensure_models", lambda *args: checks.append(args))
+    args = argparse.Namespace(
+        ollama_timeout=1.0, ollama_parallel=1, ollama_retries=0, trust_model_cache=True
+    )
+
+    cli.wait_for_models(args)
+    assert checks == []
+
+    args.trust_model_cache = False
+    cli.wait_for_models(args)
+    assert len(checks) == 1
+    ollama_client._shared.close()
@@ -0,0 +1,269 @@
+import json
+import os
+import pickle
+from pathlib import Path
+import numpy as np
+import pytest
+from rag import storage
+from rag.retriever import Retriever
+from rag.storage import ChunkIndex, MANIFEST_FILE
+
+
+class CountingEmbedder:
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.calls = 0
+
+    def embed(self, text):
+        return self.embedder.embed(text)
+
+    def embed_many(self, texts, batch_size=None):
+        self.calls += len(texts)
+        return self.embedder.embed_many(texts)
+
+
+@pytest.fixture
+def storage_dir(tmp_path):
+    return tmp_path / "storage"
+
+
+def _index_dirs(storage_dir, strategy="basic"):
+    return sorted(storage_dir.glob(f"index_{strategy}_*"))
+
+
+@pytest.fixture
+def many_docs(tmp_path):
+    docs = []
+    for i in range(3):
+        path = tmp_path / f"many{i}.pdf"
+        path.write_text(f"document {i}")
+        docs.append(str(path))
+    return docs
+
+
+def test_index_caching(simple_docs, random_embedder, pdf_reader, storage_dir):
+    # First run: should create the index
+    retriever1 = Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        storage_dir=storage_dir
+    )
+
+    [index_dir] = _index_dirs(storage_dir)
+    assert (index_dir / MANIFEST_FILE).exists()
+    assert (index_dir / "embeddings.npy").exists()
+    assert (index_dir / "chunks.jsonl").exists()
+
+    # Second run: should load from the index without embedding anything
+    embedder = CountingEmbedder(random_embedder)
+    retriever2 = Retriever(
+        embedder=embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        storage_dir=storage_dir
+    )
+
+    assert embedder.calls == 0
+    assert isinstance(retriever2.embedding_matrix, np.memmap)
+    assert len(retriever1.documents) == len(retriever2.documents)
+    for d1, d2 in zip(retriever1.documents, retriever2.documents):
+        assert d1["text"] == d2["text"]
+        assert d1["metadata"] == d2["metadata"]
+        assert np.allclose(d1["embedding"], d2["embedding"])
+
+    assert retriever2.retrieve("First page")[0][0]["metadata"]["chunk_id"] == \
+        retriever1.retrieve("First page")[0][0]["metadata"]["chunk_id"]
+
+
+def _write_legacy_pickle(storage_dir, path, embedder, file=None):
+    storage_dir.mkdir(exist_ok=True)
+    legacy_docs = [
+        {
+            "text": f"legacy chunk {i}",
+            "embedding": embedder.embed(f"legacy chunk {i}"),
+            "metadata": {"file": file or path, "page": 1, "chunk_id": i, "section_path": []}
+        }
+        for i in range(3)
+    ]
+    pickle_file = storage_dir / f"{Path(path).stem}_basic.pkl"
+    with open(pickle_file, "wb") as f:
+        pickle.dump(legacy_docs, f)
+    return pickle_file, legacy_docs
+
+
+def test_legacy_pickle_is_migrated(simple_docs, random_embedder, pdf_reader, storage_dir):
+    pickle_file, legacy_docs = _write_legacy_pickle(
+        storage_dir, simple_docs[0], random_embedder, file="old/location.pdf"
+    )
+
+    embedder = CountingEmbedder(random_embedder)
+    retriever = Retriever(
+        embedder=embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        storage_dir=storage_dir
+    )
+
+    assert embedder.calls == 0
+    assert [d["text"] for d in retriever.documents] == [d["text"] for d in legacy_docs]
+    assert {d["metadata"]["file"] for d in retriever.documents} == {simple_docs[0]}
+    [index_dir] = _index_dirs(storage_dir)
+    assert ChunkIndex(index_dir).exists()
+    assert not pickle_file.exists()
+    assert pickle_file.with_name(pickle_file.name + ".migrated").exists()
+
+    results = retriever.retrieve("legacy chunk 1", top_k=1)
+    assert results[0][0]["text"] == "legacy chunk 1"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    # The migrated pickle no longer stands in for the document once it changes
+    Path(simple_docs[0]).write_text("edited document")
+    edited = Retriever(
+        embedder=embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        storage_dir=storage_dir
+    )
+    assert embedder.calls > 0
+    assert not any("legacy" in d["text"] for d in edited.documents)
+
+
+def test_stale_legacy_pickle_is_not_migrated(simple_docs, random_embedder, pdf_reader, storage_dir):
+    pickle_file, _ = _write_legacy_pickle(storage_dir, simple_docs[0], random_embedder)
+    kwargs = dict(embedder=random_embedder, pdf_reader=pdf_reader, docs_paths=simple_docs,
+                  storage_dir=storage_dir, save=False)
+
+    # Other chunking settings than the ones of earlier versions
+    retriever = Retriever(**kwargs, overlap_ratio=0.3)
+    assert not any("legacy" in d["text"] for d in retriever.documents)
+
+    # The PDF was edited after the pickle was written
+    Path(simple_docs[0]).write_text("edited document")
+    mtime = Path(simple_docs[0]).stat().st_mtime
+    os.utime(pickle_file, (mtime - 60, mtime - 60))
+    retriever = Retriever(**kwargs)
+    assert not any("legacy" in d["text"] for d in retriever.documents)
+
+
+def test_index_from_other_version_is_rebuilt(simple_docs, random_embedder, pdf_reader, storage_dir):
+    Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        storage_dir=storage_dir
+    )
+    manifest_file = _index_dirs(storage_dir)[0] / MANIFEST_FILE
+    manifest = json.loads(manifest_file.read_text())
+    manifest["version"] = -1
+    manifest_file.write_text(json.dumps(manifest))
+
+    embedder = CountingEmbedder(random_embedder)
+    retriever = Retriever(
+        embedder=embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        storage_dir=storage_dir
+    )
+
+    assert embedder.calls == len(retriever.documents)
+    assert json.loads(manifest_file.read_text())["version"] != -1
+
+
+def test_only_changed_documents_are_reembedded(many_docs, random_embedder, pdf_reader, storage_dir):
+    Retriever(random_embedder, pdf_reader, many_docs, chunk_size=20, storage_dir=storage_dir)
+    Path(many_docs[1]).write_text("document 1, edited")
+
+    embedder = CountingEmbedder(random_embedder)
+    retriever = Retriever(embedder, pdf_reader, many_docs, chunk_size=20, storage_dir=storage_dir)
+
+    per_doc = len(retriever.documents) // 3
+    assert embedder.calls == per_doc
+    assert [d["metadata"]["chunk_id"] for d in retriever.documents] == list(range(3 * per_doc))
+
+
+def test_removed_documents_are_evicted(many_docs, random_embedder, pdf_reader, storage_dir):
+    Retriever(random_embedder, pdf_reader, many_docs, chunk_size=20, storage_dir=storage_dir)
+
+    embedder = CountingEmbedder(random_embedder)
+    retriever = Retriever(embedder, pdf_reader, many_docs[:2], chunk_size=20, storage_dir=storage_dir)
+
+    assert embedder.calls == 0
+    manifest, groups, embeddings = ChunkIndex(_index_dirs(storage_dir)[0]).load()
+    assert [g["file"] for g in groups] == many_docs[:2]
+    assert embeddings.shape[0] == len(retriever.documents)
+
+
+def test_renamed_document_reuses_embeddings(many_docs, random_embedder, pdf_reader, storage_dir):
+    Retriever(random_embedder, pdf_reader, many_docs[:1], chunk_size=20, storage_dir=storage_dir)
+    renamed = str(Path(many_docs[0]).with_name("renamed.pdf"))
+    Path(many_docs[0]).rename(renamed)
+
+    embedder = CountingEmbedder(random_embedder)
+    retriever = Retriever(embedder, pdf_reader, [renamed], chunk_size=20, storage_dir=storage_dir)
+
+    assert embedder.calls == 0
+    assert all(d["metadata"]["file"] == renamed for d in retriever.documents)
+
+
+@pytest.mark.parametrize("params", [
+    {"chunk_size": 30},
+    {"overlap_ratio": 0.3},
+    {"chunking_strategy": "semantic"},
+])
+def test_ingestion_parameters_get_separate_indexes(many_docs, random_embedder, pdf_reader, storage_dir, params):
+    Retriever(random_embedder, pdf_reader, many_docs, chunk_size=20, storage_dir=storage_dir)
+
+    embedder = CountingEmbedder(random_embedder)
+    kwargs = {"chunk_size": 20, **params}
+    retriever = Retriever(embedder, pdf_reader, many_docs, storage_dir=storage_dir, **kwargs)
+
+    assert embedder.calls == len(retriever.documents)
+    assert len(list(storage_dir.glob("index_*"))) == 2
+
+
+def test_embedding_model_gets_separate_index(many_docs, random_embedder, pdf_reader, storage_dir):
+    Retriever(random_embedder, pdf_reader, many_docs, chunk_size=20, storage_dir=storage_dir)
+
+    embedder = CountingEmbedder(random_embedder)
+    embedder.model = "other-model"
+    Retriever(embedder, pdf_reader, many_docs, chunk_size=20, storage_dir=storage_dir)
+
+    assert embedder.calls > 0
+    assert len(_index_dirs(storage_dir)) == 2
+
+
+def _group(texts, embeddings):
+    return {
+        "name": "doc",
+        "file": "doc.pdf",
+        "sha256": "digest",
+        "chunks": [
+            {"text": text, "metadata": {"file": "doc.pdf", "page": 1, "section_path": []}}
+            for text in texts
+        ],
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def test_interrupted_write_leaves_no_index(tmp_path, monkeypatch):
+    index = ChunkIndex(tmp_path / "index")
+    index.write([_group(["old one", "old two"], [[1, 0], [0, 1]])])
+
+    atomic_path = storage.atomic_path
+    calls = []
+
+    def crash_on_second_file(target):
+        calls.append(target)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return atomic_path(target)
+
+    monkeypatch.setattr(storage, "atomic_path", crash_on_second_file)
+    with pytest.raises(OSError):
+        index.write([_group(["new one", "new two"], [[0, 1], [1, 0]])])
+
+    # The new embeddings are in place, but the old texts are not served with them
+    assert not index.exists()
+    with pytest.raises(OSError):
+        index.load()
@@ -1,4 +1,8 @@
+import pytest
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
 from rag.retriever import Retriever
+from rag.sparse import load_tfidf, save_tfidf
 
 def test_tfidf_fallback(pdf_reader, simple_docs):
     # Pass an embedder that will fail
@@ -18,3 +22,65 @@ def test_tfidf_fallback(pdf_reader, simple_docs):
     assert len(results) > 0
     # The score should be > 0 because 'page content' exists in texts
     assert all(score > 0 for _, score in results)
+
+
+def test_tfidf_model_is_persisted_and_reloaded(pdf_reader, simple_docs, tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    first = Retriever(None, pdf_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+    expected = [(d["metadata"]["chunk_id"], s) for d, s in first.retrieve("second page", top_k=5)]
+
+    def refit(*args, **kwargs):
+        raise AssertionError("TF-IDF model was refitted")
+
+    monkeypatch.setattr(TfidfVectorizer, "fit_transform", refit)
+    second = Retriever(None, pdf_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+
+    assert [(d["metadata"]["chunk_id"], s) for d, s in second.retrieve("second page", top_k=5)] \
+        == pytest.approx(expected)
+
+
+def test_second_start_does_not_read_the_pdfs(pdf_reader, simple_docs, tmp_path):
+    storage = tmp_path / "storage"
+    reads = []
+
+    def counting_reader(path):
+        reads.append(path)
+        return pdf_reader(path)
+
+    first = Retriever(None, counting_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+    assert reads
+    reads.clear()
+
+    second = Retriever(None, counting_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+
+    assert reads == []
+    assert list(second.documents.texts()) == list(first.documents.texts())
+    assert second.retrieve("second page")
+
+
+def test_tfidf_model_is_refitted_when_corpus_changes(pdf_reader, simple_docs, tmp_path):
+    storage = tmp_path / "storage"
+    Retriever(None, pdf_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+    with open(simple_docs[0], "a", encoding="utf-8") as f:
+        f.write("edited")
+
+    retriever = Retriever(None, pdf_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+
+    (directory,) = storage.glob("tfidf_*")
+    assert load_tfidf(directory, retriever.corpus_fingerprint) is not None
+    assert retriever.retrieve("second page")
+
+
+def test_interrupted_tfidf_save_leaves_no_model(pdf_reader, simple_docs, tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    retriever = Retriever(None, pdf_reader, simple_docs, chunk_size=50, storage_dir=str(storage))
+    (directory,) = storage.glob("tfidf_*")
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(sparse, "save_npz", crash)
+    with pytest.raises(OSError):
+        save_tfidf(directory, retriever.vectorizer, retriever.tfidf_matrix, "other corpus")
+
+    assert load_tfidf(directory, retriever.corpus_fingerprint) is None
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+from rag.agent import Agent
+from rag.retriever import Retriever
+from rag.tracing import Tracer, span
+from tests.test_agent import FakeRetriever, fake_llm
+
+
+def _by_name(records):
+    return {r["name"]: r for r in records}
+
+
+def test_spans_are_noops_without_active_trace():
+    first = span("score", chunks=3)
+    with first as s:
+        s.set("top_k", 3)
+
+    assert span("select") is first
+
+
+def test_nested_spans_record_parents_and_durations():
+    tracer = Tracer()
+
+    with tracer.trace("trace-1") as trace:
+        with span("outer", size=2) as outer:
+            with span("inner"):
+                pass
+            outer.set("done", True)
+        with span("sibling"):
+            pass
+
+    records = _by_name(trace.records())
+    assert records["outer"]["parent_id"] is None
+    assert records["inner"]["parent_id"] == records["outer"]["span_id"]
+    assert records["sibling"]["parent_id"] is None
+    assert records["outer"]["attributes"] == {"size": 2, "done": True}
+    assert records["outer"]["duration_ms"] >= records["inner"]["duration_ms"] >= 0
+    assert all(r["trace_id"] == "trace-1" for r in records.values())
+    assert tracer.last_trace is trace
+
+
+def test_spans_follow_threads_and_tasks():
+    tracer = Tracer()
+
+    def step(name):
+        with span(name):
+            pass
+
+    async def work():
+        with span("task"):
+            await asyncio.to_thread(step, "thread")
+
+    with tracer.trace("trace-2") as trace:
+        asyncio.run(work())
+        # Plain threads do not inherit the context, so they are not traced
+        other = threading.Thread(target=step, args=("untraced",))
+        other.start()
+        other.join()
+
+    names = [s.name for s in trace.spans]
+    assert names == ["task", "thread"]
+    assert trace.spans[1].parent_id == trace.spans[0].span_id
+
+
+def test_failed_span_records_error():
+    tracer = Tracer()
+
+    with tracer.trace("trace-3") as trace:
+        try:
+            with span("llm_chat"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+    assert "boom" in trace.records()[0]["attributes"]["error"]
+
+
+def test_agent_run_exports_pipeline_spans(random_embedder, pdf_reader, simple_docs, tmp_path):
+    retriever = Retriever(
+        embedder=random_embedder,
+        pdf_reader=pdf_reader,
+        docs_paths=simple_docs,
+        chunk_size=20,
+        storage_dir=tmp_path / "storage",
+    )
+    trace_file = tmp_path / "traces.jsonl"
+    agent = Agent(retriever, fake_llm, tracer=Tracer(trace_file))
+
+    _, log = agent.run("What is on the first page?")
+    stream, stream_log = agent.run_stream("And the second?")
+    "".join(stream)
+
+    records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    run = [r for r in records if r["trace_id"] == log["trace_id"]]
+    streamed = [r for r in records if r["trace_id"] == stream_log["trace_id"]]
+    spans = _by_name(run)
+
+    assert {"retrieve", "embed_query", "score", "select", "build_prompt", "generate", "cite"} <= set(spans)
+    assert spans["embed_query"]["parent_id"] == spans["retrieve"]["span_id"]
+    assert spans["score"]["parent_id"] == spans["retrieve"]["span_id"]
+    assert spans["score"]["attributes"]["chunks"] == len(retriever.documents)
+    assert {"retrieve", "generate"} <= {r["name"] for r in streamed}
+
+
+def test_async_runs_keep_separate_traces(tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    agent = Agent(FakeRetriever(), fake_llm, tracer=Tracer(trace_file))
+
+    results = agent.run_many(["One?", "Two?", "Three?"], max_concurrency=3)
+
+    records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    for _, log in results:
+        names = [r["name"] for r in records if r["trace_id"] == log["trace_id"]]
+        assert sorted(names) == sorted(["retrieve", "build_prompt", "generate", "cite"])